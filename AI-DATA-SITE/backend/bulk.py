@@ -0,0 +1,196 @@
+"""
+Bulk write layer for ocean_metrics, shared by both pipelines.
+
+Rows are upserted on the (date, latitude, longitude) key in chunks of
+OCEAN_METRICS_BATCH_SIZE:
+
+- Postgres: each chunk is COPY'd into a temporary staging table, then
+  merged with one set-based INSERT ... SELECT ... ON CONFLICT DO UPDATE
+- SQLite: executemany of INSERT ... ON CONFLICT DO UPDATE
+- anything else: plain executemany INSERT (no upsert)
+
+In the same transaction as the rows, the daily/regional rollups of the
+dates written are refreshed (backend/rollups.py) and the data-version
+stamp is bumped, which invalidates API response caches; readers never see
+new rows with stale rollups or an old stamp. Every call returns (and
+prints) the row count, elapsed time and rows/sec.
+"""
+import io
+import os
+import csv
+import math
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+import backend.database as db
+from backend import partitions, rollups, data_version, spatial
+
+try:
+    from monitoring.metrics import pipeline_rows_written, pipeline_write_rows_per_second
+    _metrics_available = True
+except ImportError:
+    _metrics_available = False
+    pipeline_rows_written = None
+    pipeline_write_rows_per_second = None
+
+BATCH_SIZE = int(os.getenv("OCEAN_METRICS_BATCH_SIZE", "50000"))
+
+TABLE = "ocean_metrics"
+STAGING_TABLE = "ocean_metrics_staging"
+KEY_COLUMNS = ["date", "latitude", "longitude"]
+COLUMNS = KEY_COLUMNS + ["sst", "dhw", "ph", "health_score", "anomaly", "forecast_ph", "cell"]
+FLOAT_COLUMNS = ["latitude", "longitude", "sst", "dhw", "ph", "health_score", "forecast_ph"]
+UPDATE_COLUMNS = [c for c in COLUMNS if c not in KEY_COLUMNS]
+
+
+# ===== RECORD PREPARATION =====
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+def prepare_rows(df):
+    """
+    Pipeline frame (lat/lon or latitude/longitude) -> list of tuples in
+    COLUMNS order with NaN as None. Later duplicates of a key win.
+    """
+    df = df.rename(columns={"lat": "latitude", "lon": "longitude"})
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df = df[COLUMNS].drop_duplicates(subset=KEY_COLUMNS, keep="last")
+
+    out = pd.DataFrame({"date": [_to_date(d) for d in df["date"]]}, index=df.index)
+    for col in FLOAT_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce").astype(float)
+        out[col] = values.astype(object).where(values.notna(), None)
+    out["anomaly"] = df["anomaly"].fillna(False).astype(bool)
+    located = out["latitude"].notna() & out["longitude"].notna()
+    cells = spatial.cell_ids(out["latitude"].where(located, 0.0), out["longitude"].where(located, 0.0))
+    out["cell"] = pd.Series(cells, index=out.index).astype(object).where(located, None)
+    return list(out[COLUMNS].itertuples(index=False, name=None))
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+# ===== BACKENDS =====
+def _upsert_sql(values_clause):
+    updates = ", ".join(f"{c} = excluded.{c}" for c in UPDATE_COLUMNS)
+    return (
+        f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) {values_clause} "
+        f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET {updates}"
+    )
+
+
+def _write_sqlite(engine, rows, batch_size, finish):
+    sql = _upsert_sql(f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+    with engine.begin() as conn:
+        for chunk in _chunks(rows, batch_size):
+            conn.exec_driver_sql(sql, chunk)
+        finish(conn)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    return value
+
+
+def _copy_csv(cur, sql, buf):
+    """COPY ... FROM STDIN on psycopg 3 (cursor.copy) or psycopg2 (copy_expert)."""
+    if hasattr(cur, "copy_expert"):
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+    else:
+        with cur.copy(sql) as copy:
+            copy.write(buf.getvalue())
+
+
+def _write_postgres(engine, rows, batch_size, finish):
+    # Monthly partitions for every date in the batch must exist first (own
+    # short transaction: creating one locks the parent table)
+    dates = [r[0] for r in rows]
+    with engine.begin() as conn:
+        partitions.ensure_partitions(conn, start=min(dates), end=max(dates))
+
+    cols = ", ".join(COLUMNS)
+    merge = _upsert_sql(f"SELECT {cols} FROM {STAGING_TABLE}")
+    with engine.begin() as conn:
+        # COPY needs the DBAPI cursor; it shares the connection's transaction
+        with conn.connection.cursor() as cur:
+            # Key + value columns only: no id, so no sequence values burnt
+            cur.execute(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP "
+                f"AS SELECT {cols} FROM {TABLE} WITH NO DATA"
+            )
+            for chunk in _chunks(rows, batch_size):
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for row in chunk:
+                    writer.writerow([_csv_value(v) for v in row])
+                _copy_csv(cur, f"COPY {STAGING_TABLE} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+                cur.execute(merge)
+                cur.execute(f"TRUNCATE {STAGING_TABLE}")
+        finish(conn)
+
+
+def _write_generic(engine, rows, batch_size, finish):
+    from sqlalchemy import insert
+    from backend.models import OceanMetrics
+    with engine.begin() as conn:
+        for chunk in _chunks(rows, batch_size):
+            conn.execute(insert(OceanMetrics), [dict(zip(COLUMNS, r)) for r in chunk])
+        finish(conn)
+
+
+# ===== ENTRY POINT =====
+def upsert_ocean_metrics(df, engine=None, batch_size=None, label="bulk"):
+    """
+    Upsert a pipeline frame into ocean_metrics. Returns a dict with rows,
+    seconds, rows_per_sec and the write method used.
+    """
+    engine = engine or db.engine
+    batch_size = batch_size or BATCH_SIZE
+    rows = prepare_rows(df)
+
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        method, writer = "copy+merge", _write_postgres
+    elif dialect == "sqlite":
+        method, writer = "executemany-upsert", _write_sqlite
+    else:
+        method, writer = "executemany-insert", _write_generic
+
+    written = {}
+
+    def finish(conn):
+        # Last statements of the write transaction, committed with the rows
+        written["at"] = time.perf_counter()
+        rollups.refresh(conn, {r[0] for r in rows})
+        data_version.bump(conn)
+
+    start = time.perf_counter()
+    if rows:
+        writer(engine, rows, batch_size, finish)
+    end = time.perf_counter()
+    seconds = written.get("at", end) - start
+    rollup_seconds = end - written.get("at", end)
+    rate = len(rows) / seconds if seconds > 0 else 0.0
+
+    if _metrics_available and pipeline_rows_written:
+        pipeline_rows_written.inc(len(rows))
+        pipeline_write_rows_per_second.set(rate)
+    print(f"[{label}] Upserted {len(rows)} rows via {method} in {seconds:.2f}s ({rate:,.0f} rows/sec); "
+          f"rollups refreshed in {rollup_seconds:.2f}s")
+    return {"rows": len(rows), "seconds": seconds, "rows_per_sec": rate, "method": method,
+            "rollup_seconds": rollup_seconds}
@@ -0,0 +1,41 @@
+"""
+Data-version stamp for ocean_metrics.
+
+One row in ``data_version`` holds a counter that writers bump in the same
+transaction as their change (bulk upserts, retention). Readers that cache
+derived data -- the API response cache -- compare stamps instead of
+re-querying. Living in the database, the stamp works across processes:
+the scheduler writes, the API workers read.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+TABLE = "data_version"
+
+
+def bump(conn):
+    """Increment the stamp (creating the row on first use); returns the new version."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    updated = conn.execute(
+        text(f"UPDATE {TABLE} SET version = version + 1, updated_at = :now WHERE id = 1"),
+        {"now": now},
+    ).rowcount
+    if not updated:
+        conn.execute(
+            text(f"INSERT INTO {TABLE} (id, version, updated_at) VALUES (1, 1, :now)"),
+            {"now": now},
+        )
+    return read(conn)
+
+
+def read(conn):
+    """Current stamp (0 before the first write)."""
+    row = conn.execute(text(f"SELECT version FROM {TABLE} WHERE id = 1")).first()
+    return int(row[0]) if row else 0
+
+
+async def aread(conn):
+    """``read`` for an AsyncConnection / AsyncSession."""
+    row = (await conn.execute(text(f"SELECT version FROM {TABLE} WHERE id = 1"))).first()
+    return int(row[0]) if row else 0
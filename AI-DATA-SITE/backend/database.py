@@ -11,7 +11,24 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine_kwargs = {}
+# Pool sizing (server databases only; shared by the sync and async engines)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+def _pool_kwargs(url):
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+engine_kwargs = _pool_kwargs(DATABASE_URL)
 if DATABASE_URL.startswith("sqlite"):
     engine_kwargs["connect_args"] = {"check_same_thread": False}
 
@@ -23,9 +40,14 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
-def init_db():
+def init_db(run_migrations=False):
     # Create tables
     Base.metadata.create_all(bind=engine)
+    # Schema migrations are a deploy step (python -m backend.migrations), not
+    # something every API worker or pipeline run does on start-up
+    if run_migrations:
+        from backend.migrations import migrate
+        migrate(engine, verbose=False)
 
 def get_db():
     db = SessionLocal()
@@ -33,3 +55,42 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# ===== ASYNC (API) =====
+# Same database through an asyncio driver: asyncpg for Postgres, aiosqlite
+# for SQLite. Created on first use so that sync-only processes (pipelines,
+# scheduler) never need the async drivers installed.
+def async_url(url=DATABASE_URL):
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    scheme, _, rest = url.partition("://")
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+ASYNC_DATABASE_URL = async_url()
+
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_kwargs(ASYNC_DATABASE_URL))
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessionmaker() as session:
+        yield session
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine, _async_sessionmaker = None, None
@@ -0,0 +1,195 @@
+"""
+Columnar response formats for the data endpoints.
+
+Clients pick a format with the Accept header or a ``format`` query
+parameter (the latter wins):
+
+  application/json                     (default)
+  application/vnd.apache.arrow.stream  Arrow IPC stream  (format=arrow)
+  application/vnd.apache.parquet       Parquet, zstd     (format=parquet)
+
+Arrow and Parquet bodies are built column-wise straight from the query
+rows (or the aggregated DataFrame), with a fixed schema per column, so no
+per-row dicts or float -> text -> float round trips. Decode with
+``pa.ipc.open_stream(body).read_pandas()`` or ``pd.read_parquet(BytesIO(body))``.
+
+pyarrow is imported lazily; without it only JSON is offered (406 otherwise).
+"""
+import io
+import importlib.util
+
+from starlette.responses import Response
+
+JSON, ARROW, PARQUET = "json", "arrow", "parquet"
+MEDIA_TYPES = {
+    JSON: "application/json",
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+_ACCEPT = {
+    "application/json": JSON,
+    "application/vnd.apache.arrow.stream": ARROW,
+    "application/vnd.apache.parquet": PARQUET,
+    "application/x-parquet": PARQUET,
+}
+PARQUET_COMPRESSION = "zstd"
+
+# Arrow type per column served in a columnar format
+_TYPES = {
+    "date": "date32",
+    "latitude": "float64",
+    "longitude": "float64",
+    "sst": "float64",
+    "dhw": "float64",
+    "ph": "float64",
+    "health_score": "float64",
+    "forecast_ph": "float64",
+    "anomaly": "bool_",
+    "n": "int64",
+    "anomaly_count": "int64",
+    "region": "string",
+}
+
+
+class FormatNotAvailable(Exception):
+    """Requested a columnar format but pyarrow is not installed (HTTP 406)."""
+
+
+def pyarrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def negotiate(request, default=JSON):
+    """Format name for ``request`` from ?format= or the Accept header."""
+    fmt = request.query_params.get("format")
+    if fmt in MEDIA_TYPES:
+        return fmt
+    accept = request.headers.get("accept", "")
+    ranked = []
+    for i, part in enumerate(accept.split(",")):
+        media, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            key, _, value = p.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media.strip() in _ACCEPT and q > 0:
+            ranked.append((-q, i, _ACCEPT[media.strip()]))
+    return min(ranked)[2] if ranked else default
+
+
+def _pa():
+    if not pyarrow_available():
+        raise FormatNotAvailable("pyarrow is not installed; only application/json is available")
+    import pyarrow as pa
+    return pa
+
+
+def schema(columns):
+    pa = _pa()
+    return pa.schema([(c, getattr(pa, _TYPES[c])()) for c in columns])
+
+
+def _array(values, type_):
+    pa = _pa()
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite returns dates as text and booleans as 0/1
+        return pa.array(values).cast(type_)
+
+
+def table_from_rows(columns, rows):
+    """Arrow table from DB row tuples, transposed once into columns."""
+    pa = _pa()
+    sch = schema(columns)
+    cols = list(zip(*rows)) if rows else [[] for _ in columns]
+    arrays = [_array(list(values), field.type) for values, field in zip(cols, sch)]
+    return pa.Table.from_arrays(arrays, names=list(columns))
+
+
+def table_from_frame(df):
+    """Arrow table from a DataFrame, typed columns coerced to their fixed types."""
+    pa = _pa()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if name in _TYPES:
+            target = getattr(pa, _TYPES[name])()
+            if table.schema.field(i).type != target:
+                table = table.set_column(i, name, table.column(i).cast(target))
+    return table
+
+
+def encode(table, fmt):
+    """Arrow table -> bytes in ``fmt`` (arrow or parquet)."""
+    pa = _pa()
+    sink = io.BytesIO()
+    if fmt == ARROW:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == PARQUET:
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink, compression=PARQUET_COMPRESSION)
+    else:
+        raise ValueError(f"not a columnar format: {fmt}")
+    return sink.getvalue()
+
+
+def response(table, fmt, headers=None):
+    return Response(encode(table, fmt), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class ChunkWriter:
+    """
+    Incremental Arrow IPC / Parquet encoder for streamed exports: each
+    ``write(rows)`` becomes one record batch / row group and returns the
+    bytes produced so far; ``close()`` returns the trailer (Parquet footer).
+    """
+
+    def __init__(self, columns, fmt):
+        pa = _pa()
+        self.columns = list(columns)
+        self.schema = schema(self.columns)
+        self.sink = _Drain()
+        if fmt == ARROW:
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+        elif fmt == PARQUET:
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.sink, self.schema, compression=PARQUET_COMPRESSION)
+        else:
+            raise ValueError(f"not a columnar format: {fmt}")
+
+    def write(self, rows):
+        self.writer.write_table(table_from_rows(self.columns, rows))
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
@@ -1,11 +1,19 @@
+from typing import Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal, init_db, get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
+from backend.database import init_db, get_async_db, get_async_engine, dispose_async_engine
 from backend.models import OceanMetrics
+from backend.response_cache import cache_middleware, cache
 from datetime import datetime, timedelta
 
+# timeseries, records, spatial and formats (and through them pandas / NumPy /
+# pyarrow) are imported inside the handlers that use them, so worker
+# start-up is FastAPI + SQLAlchemy (~0.9 s, close to the 1 s budget of
+# scripts/bench_import_time.py) rather than ~1.4 s.
+
 app = FastAPI(
     title="AI Ocean Data API",
     description="Real-time coral reef health monitoring",
@@ -19,8 +27,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# Response cache + ETag/304 for /stats and /data/*, invalidated when the
+# pipeline bumps the data-version stamp (backend/response_cache.py)
+app.middleware("http")(cache_middleware)
+
 @app.on_event("startup")
 def startup_event():
     """Initialize database on startup (skip if no PostgreSQL)"""
@@ -31,6 +44,10 @@ def startup_event():
         print("Running in demo mode without persistent storage")
         print("To enable full features, ensure PostgreSQL is running on localhost:5432")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await dispose_async_engine()
+
 @app.get("/")
 async def root():
     return {
@@ -41,12 +58,13 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "cache": cache.stats()}
 
 @app.get("/data/latest")
-async def get_latest_data(db: Session = Depends(get_db)):
+async def get_latest_data(db: AsyncSession = Depends(get_async_db)):
     """Get latest ocean metrics"""
-    latest = db.query(OceanMetrics).order_by(OceanMetrics.date.desc()).first()
+    result = await db.execute(select(OceanMetrics).order_by(OceanMetrics.date.desc()).limit(1))
+    latest = result.scalars().first()
     if latest:
         return {
             "date": latest.date,
@@ -61,34 +79,189 @@ async def get_latest_data(db: Session = Depends(get_db)):
         }
     return {"error": "No data available"}
 
+def _response_format(request: Request):
+    """JSON, Arrow or Parquet, from ?format= or Accept (backend/formats.py)"""
+    from backend import formats
+
+    fmt = formats.negotiate(request)
+    if fmt != formats.JSON and not formats.pyarrow_available():
+        raise HTTPException(status_code=406, detail="pyarrow is not installed; only application/json is available")
+    return fmt
+
+def _frame_response(df, fmt):
+    from backend import timeseries, formats
+
+    if fmt != formats.JSON:
+        return formats.response(formats.table_from_frame(df), fmt)
+    return timeseries.frame_records(df)
+
 @app.get("/data/timeseries")
-async def get_timeseries(days: int = 30, db: Session = Depends(get_db)):
-    """Get time-series data for the last N days"""
-    cutoff_date = datetime.now() - timedelta(days=days)
-    records = db.query(OceanMetrics).filter(
-        OceanMetrics.date >= cutoff_date
-    ).order_by(OceanMetrics.date).all()
+async def get_timeseries(
+    days: int = 30,
+    resolution: str = "raw",
+    agg: str = "mean",
+    bbox: Optional[str] = None,
+    group_by: str = "none",
+    max_points: int = Query(2000, ge=3, le=100000),
+    downsample_on: str = "sst",
+    fmt: str = Depends(_response_format),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Per-cell rows for the last N days (date, latitude, longitude, sst, ph,
+    health_score, anomaly), the newest max_points, optionally inside a bbox
+    ("min_lon,min_lat,max_lon,max_lat").
+    resolution=day|week aggregates instead (mean, min, max or p90),
+    optionally per region, thinned to max_points points with LTTB (at
+    least 3 per region).
+    """
+    from backend import timeseries, formats
 
-    return [
-        {
-            "date": r.date.isoformat(),
-            "latitude": r.latitude,
-            "longitude": r.longitude,
-            "sst": r.sst,
-            "ph": r.ph,
-            "health_score": r.health_score,
-            "anomaly": r.anomaly
-        }
-        for r in records
-    ]
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        box = timeseries.parse_bbox(bbox)
+        if resolution == "raw":
+            rows = await db.run_sync(
+                lambda session: timeseries.raw_rows(session.connection(), cutoff_date, bbox=box, max_points=max_points)
+            )
+            if fmt != formats.JSON:
+                return formats.response(formats.table_from_rows(timeseries.RAW_COLUMNS, rows), fmt)
+            return timeseries.raw_records(rows)
+        df = await db.run_sync(lambda session: timeseries.query_frame(
+            session.connection(), cutoff_date, resolution=resolution, agg=agg, bbox=box,
+            group_by=group_by, max_points=max_points, downsample_on=downsample_on,
+        ))
+        return _frame_response(df, fmt)
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/data/records")
+async def get_records(
+    days: int = 30,
+    bbox: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    fmt: str = Depends(_response_format),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Per-cell rows for the last N days, one page at a time in (date, id)
+    order. Pass the returned next_cursor back as cursor for the next page;
+    it is null on the last page. Arrow / Parquet pages carry it in the
+    X-Next-Cursor header instead (absent on the last page).
+    """
+    from backend import timeseries, records, formats
+
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        box = timeseries.parse_bbox(bbox)
+        rows, next_cursor = await db.run_sync(
+            lambda session: records.page_rows(session.connection(), cutoff_date, bbox=box, cursor=cursor, limit=limit)
+        )
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt != formats.JSON:
+        table = formats.table_from_rows(records.COLUMNS, [r[1:] for r in rows])
+        return formats.response(table, fmt, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+    return {"items": [records.to_record(r) for r in rows], "next_cursor": next_cursor}
+
+@app.get("/data/export")
+async def export_records(days: int = 30, format: str = "ndjson", bbox: Optional[str] = None):
+    """Stream every row of the last N days as NDJSON, CSV, Arrow IPC or Parquet"""
+    from backend import timeseries, records, formats
+
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        box = timeseries.parse_bbox(bbox)
+        media_type = records.FORMATS[format]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(records.FORMATS)}")
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format in (formats.ARROW, formats.PARQUET) and not formats.pyarrow_available():
+        raise HTTPException(status_code=406, detail="pyarrow is not installed")
+    filename = f"ocean_metrics_{cutoff_date.isoformat()}.{format}"
+    return StreamingResponse(
+        records.stream(get_async_engine(), cutoff_date, fmt=format, bbox=box),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/data/spatial/bbox")
+async def get_spatial_bbox(
+    bbox: str,
+    days: int = 7,
+    limit: int = Query(5000, ge=1, le=100000),
+    fmt: str = Depends(_response_format),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Rows of the last N days inside bbox ("min_lon,min_lat,max_lon,max_lat"), newest first"""
+    from backend import timeseries, spatial
+
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        box = timeseries.parse_bbox(bbox)
+        df = await db.run_sync(lambda session: spatial.in_bbox(session.connection(), box, cutoff_date, limit=limit))
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _frame_response(df, fmt)
+
+@app.get("/data/spatial/radius")
+async def get_spatial_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(50.0, gt=0),
+    days: int = 7,
+    limit: int = Query(5000, ge=1, le=100000),
+    fmt: str = Depends(_response_format),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Rows of the last N days within radius_km of (lat, lon), nearest first, with distance_km"""
+    from backend import timeseries, spatial
+
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        df = await db.run_sync(
+            lambda session: spatial.within_radius(session.connection(), lat, lon, radius_km, cutoff_date, limit=limit)
+        )
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _frame_response(df, fmt)
+
+@app.get("/data/spatial/nearest")
+async def get_spatial_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(1, ge=1, le=1000),
+    days: int = 7,
+    fmt: str = Depends(_response_format),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Latest row of each of the k locations nearest to (lat, lon), with distance_km"""
+    from backend import timeseries, spatial
+
+    cutoff_date = (datetime.now() - timedelta(days=days)).date()
+    try:
+        df = await db.run_sync(lambda session: spatial.nearest(session.connection(), lat, lon, cutoff_date, k=k))
+    except timeseries.TimeseriesQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _frame_response(df, fmt)
 
 @app.get("/data/anomalies")
-async def get_anomalies(db: Session = Depends(get_db)):
+async def get_anomalies(fmt: str = Depends(_response_format), db: AsyncSession = Depends(get_async_db)):
     """Get recent anomalies detected"""
-    anomalies = db.query(OceanMetrics).filter(
+    from backend import formats
+
+    columns = ["date", "latitude", "longitude", "sst", "health_score"]
+    result = await db.execute(select(
+        *(getattr(OceanMetrics, c) for c in columns)
+    ).where(
         OceanMetrics.anomaly == True
-    ).order_by(OceanMetrics.date.desc()).limit(50).all()
+    ).order_by(OceanMetrics.date.desc()).limit(50))
+    anomalies = result.all()
 
+    if fmt != formats.JSON:
+        return formats.response(formats.table_from_rows(columns, anomalies), fmt)
     return [
         {
             "date": a.date.isoformat(),
@@ -101,22 +274,17 @@ async def get_anomalies(db: Session = Depends(get_db)):
     ]
 
 @app.get("/stats")
-async def get_statistics(db: Session = Depends(get_db)):
-    """Get aggregate statistics"""
-    from sqlalchemy import func, case
+async def get_statistics(db: AsyncSession = Depends(get_async_db)):
+    """Get aggregate statistics (from the daily rollups, not a full scan)"""
+    from backend import rollups
 
-    stats = db.query(
-        func.avg(OceanMetrics.sst).label("avg_sst"),
-        func.avg(OceanMetrics.ph).label("avg_ph"),
-        func.avg(OceanMetrics.health_score).label("avg_health"),
-        func.sum(case((OceanMetrics.anomaly == True, 1), else_=0)).label("anomaly_count")
-    ).first()
+    stats = await db.run_sync(lambda session: rollups.summary(session.connection()))
 
     return {
-        "avg_sst": float(stats.avg_sst or 0),
-        "avg_ph": float(stats.avg_ph or 0),
-        "avg_health_score": float(stats.avg_health or 0),
-        "anomalies_detected": stats.anomaly_count or 0
+        "avg_sst": float(stats["sst"]["mean"] or 0),
+        "avg_ph": float(stats["ph"]["mean"] or 0),
+        "avg_health_score": float(stats["health_score"]["mean"] or 0),
+        "anomalies_detected": stats["anomaly_count"]
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+"""
+Minimal schema migrations for existing databases.
+
+``Base.metadata.create_all`` only creates missing tables; it never changes
+a table that already exists. Schema changes that must reach existing
+databases (indexes, partitioning, ...) are listed in MIGRATIONS and applied
+once each, in order, by ``migrate()``. Applied versions are recorded in
+the ``schema_migrations`` table.
+
+Each migration gives steps per dialect ("postgresql", "sqlite", or "*" for
+any); a step is a SQL string or a callable taking the connection.
+Migrations with ``transaction=False`` run in autocommit mode, which is
+required for ``CREATE INDEX CONCURRENTLY`` on Postgres.
+
+Migrating is an explicit deploy step (the CLI below, run once before the
+API / scheduler start); ``init_db()`` only creates missing tables. On
+Postgres ``migrate()`` holds an advisory lock, so two deploy jobs started
+at once apply each migration once instead of racing.
+
+Migrations marked ``manual`` are left pending by a plain ``migrate()`` and
+only run with ``--include-manual``, in a maintenance window. ``manual`` may
+also be a callable taking the connection: 0002, the monthly partitioning
+rebuild, is manual only while ocean_metrics holds rows (the rebuild locks
+it for writes while it copies them); on a fresh, empty table it runs
+straight away, so new installs start out partitioned.
+
+Usage:
+  python -m backend.migrations                    # apply pending migrations
+  python -m backend.migrations --include-manual   # ... including manual ones
+  python -m backend.migrations --status           # list applied / pending
+"""
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import text, inspect
+
+from backend import partitions, rollups, spatial
+
+MIGRATIONS_TABLE = "schema_migrations"
+# pg_advisory_lock key serializing concurrent migrate() runs
+LOCK_KEY = 0x6F6365616E  # "ocean"
+
+# Columns returned by /data/timeseries and /data/anomalies, carried in the
+# indexes so those endpoints are answered from the index alone
+TIMESERIES_COLS = "latitude, longitude, sst, ph, health_score, anomaly"
+ANOMALY_COLS = "latitude, longitude, sst, health_score"
+
+# Postgres read-path indexes: (name, definition). Built CONCURRENTLY on a
+# plain table (0001) and directly on the partitioned parent (0002), where
+# CONCURRENTLY is not supported.
+PG_INDEXES = [
+    # /data/latest: ORDER BY date DESC LIMIT 1
+    ("ix_ocean_metrics_date_desc", "ON ocean_metrics (date DESC)"),
+    # /data/anomalies: only the (few) anomalous rows, newest first
+    ("ix_ocean_metrics_anomaly_date", f"ON ocean_metrics (date DESC) INCLUDE ({ANOMALY_COLS}) WHERE anomaly"),
+    # /data/timeseries: date range scan, index-only
+    ("ix_ocean_metrics_timeseries", f"ON ocean_metrics (date) INCLUDE ({TIMESERIES_COLS})"),
+]
+# Added by later migrations (0004, 0007); rebuilt too when 0002 runs after them
+KEYSET_INDEX = ("ix_ocean_metrics_date_id", "ON ocean_metrics (date, id)")
+CELL_INDEX = (spatial.CELL_INDEX, "ON ocean_metrics (cell, date)")
+
+COLUMN_DDL = (
+    "date DATE NOT NULL, "
+    "latitude DOUBLE PRECISION, "
+    "longitude DOUBLE PRECISION, "
+    "sst DOUBLE PRECISION, "
+    "dhw DOUBLE PRECISION, "
+    "ph DOUBLE PRECISION, "
+    "health_score DOUBLE PRECISION, "
+    "anomaly BOOLEAN, "
+    "forecast_ph DOUBLE PRECISION, "
+    "cell BIGINT"
+)
+DATA_COLS = ["date", "latitude", "longitude", "sst", "dhw", "ph", "health_score", "anomaly", "forecast_ph", "cell"]
+
+
+def partition_ocean_metrics(conn):
+    """
+    Rebuild ocean_metrics as a table partitioned by month on ``date``.
+
+    The old heap is renamed, a partitioned parent with the same columns is
+    created (primary key and unique key both include ``date``, as
+    partitioning requires), monthly partitions are created for the
+    existing data plus PARTITION_MONTHS_AHEAD, rows are copied across and
+    the old table is dropped. Runs in one transaction: on a large table
+    writers wait for it, so run it in a maintenance window.
+    """
+    if partitions.is_partitioned(conn):
+        return
+    # cell exists only once 0006 has run (this may run before or after it)
+    present = {c["name"] for c in inspect(conn).get_columns("ocean_metrics")}
+    cols = ", ".join(c for c in DATA_COLS if c in present)
+    indexes = PG_INDEXES + [KEYSET_INDEX, CELL_INDEX]
+    oldest, newest = conn.execute(text("SELECT MIN(date), MAX(date) FROM ocean_metrics")).one()
+
+    old = "ocean_metrics_unpartitioned"
+    conn.execute(text(f"ALTER TABLE ocean_metrics RENAME TO {old}"))
+    # Index names are schema-wide: free them for the new parent
+    conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT uq_date_lat_lon TO uq_date_lat_lon_unpartitioned"))
+    for name, _ in indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text("CREATE SEQUENCE IF NOT EXISTS ocean_metrics_id_seq"))
+    conn.execute(text("ALTER SEQUENCE ocean_metrics_id_seq OWNED BY NONE"))
+
+    conn.execute(text(
+        "CREATE TABLE ocean_metrics ("
+        "id INTEGER NOT NULL DEFAULT nextval('ocean_metrics_id_seq'), "
+        f"{COLUMN_DDL}, "
+        "PRIMARY KEY (id, date), "
+        "CONSTRAINT uq_date_lat_lon UNIQUE (date, latitude, longitude)"
+        ") PARTITION BY RANGE (date)"
+    ))
+    partitions.ensure_partitions(conn, start=oldest, end=newest)
+    for name, definition in indexes:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} {definition}"))
+
+    conn.execute(text(
+        f"INSERT INTO ocean_metrics (id, {cols}) SELECT id, {cols} FROM {old} WHERE date IS NOT NULL"
+    ))
+    conn.execute(text("ALTER SEQUENCE ocean_metrics_id_seq OWNED BY ocean_metrics.id"))
+    conn.execute(text(f"DROP TABLE {old}"))
+    conn.execute(text("ANALYZE ocean_metrics"))
+
+
+def ocean_metrics_has_rows(conn):
+    return conn.execute(text("SELECT 1 FROM ocean_metrics LIMIT 1")).first() is not None
+
+
+def pg_index(name, definition):
+    """Migration step: CREATE INDEX, CONCURRENTLY unless ocean_metrics is partitioned (not supported there)."""
+    def step(conn):
+        concurrently = "" if partitions.is_partitioned(conn) else "CONCURRENTLY "
+        conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} {definition}"))
+    return step
+
+
+def add_cell_column(conn):
+    """Add ocean_metrics.cell where create_all did not, and fill it for existing rows."""
+    columns = {c["name"] for c in inspect(conn).get_columns("ocean_metrics")}
+    if "cell" not in columns:
+        conn.execute(text("ALTER TABLE ocean_metrics ADD COLUMN cell BIGINT"))
+    conn.execute(
+        text(
+            f"UPDATE ocean_metrics SET cell = {spatial.cell_sql(conn.dialect.name)} "
+            "WHERE cell IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+        ),
+        {"cell_deg": spatial.CELL_DEG, "n_cols": spatial.N_COLS},
+    )
+
+
+MIGRATIONS = [
+    {
+        "version": "0001_read_path_indexes",
+        "description": "Indexes for /data/latest, /data/timeseries and /data/anomalies",
+        "transaction": False,
+        "sql": {
+            "postgresql": [
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"
+                for name, definition in PG_INDEXES
+            ] + ["ANALYZE ocean_metrics"],
+            "sqlite": [
+                "CREATE INDEX IF NOT EXISTS ix_ocean_metrics_date_desc ON ocean_metrics (date DESC)",
+                "CREATE INDEX IF NOT EXISTS ix_ocean_metrics_anomaly_date "
+                f"ON ocean_metrics (date DESC, {ANOMALY_COLS}) WHERE anomaly = 1",
+                # No INCLUDE in SQLite: a composite key covers the same columns
+                "CREATE INDEX IF NOT EXISTS ix_ocean_metrics_timeseries "
+                f"ON ocean_metrics (date, {TIMESERIES_COLS})",
+                "ANALYZE ocean_metrics",
+            ],
+        },
+    },
+    {
+        "version": "0002_partition_by_month",
+        "description": "Monthly RANGE partitioning of ocean_metrics on date (Postgres only)",
+        # Immediate on an empty table; rebuilding a populated one waits for --include-manual
+        "manual": ocean_metrics_has_rows,
+        "sql": {
+            "postgresql": [partition_ocean_metrics],
+        },
+    },
+    {
+        "version": "0003_daily_rollups",
+        "description": "Backfill ocean_metrics_daily_rollup from existing rows",
+        "sql": {
+            "*": [rollups.refresh],
+        },
+    },
+    {
+        "version": "0004_keyset_index",
+        "description": "(date, id) index for keyset pagination and ordered export",
+        "transaction": False,
+        "sql": {
+            "postgresql": [pg_index(*KEYSET_INDEX)],
+            "sqlite": ["CREATE INDEX IF NOT EXISTS ix_ocean_metrics_date_id ON ocean_metrics (date, id)"],
+        },
+    },
+    {
+        "version": "0005_rebuild_rollup_bands",
+        "description": "Rebuild rollups with floored region bands (Postgres CAST rounded them)",
+        "sql": {
+            "postgresql": [rollups.refresh],
+        },
+    },
+    {
+        "version": "0006_spatial_cell",
+        "description": "ocean_metrics.cell grid cell id, backfilled from latitude/longitude",
+        "sql": {
+            "*": [add_cell_column],
+        },
+    },
+    {
+        "version": "0007_spatial_cell_index",
+        "description": "(cell, date) index for bbox / radius / nearest queries",
+        "transaction": False,
+        "sql": {
+            "postgresql": [pg_index(*CELL_INDEX), "ANALYZE ocean_metrics"],
+            "sqlite": [
+                "CREATE INDEX IF NOT EXISTS ix_ocean_metrics_cell_date ON ocean_metrics (cell, date)",
+                "ANALYZE ocean_metrics",
+            ],
+        },
+    },
+]
+
+
+def _ensure_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "version VARCHAR(128) PRIMARY KEY, "
+            "description TEXT, "
+            "applied_at VARCHAR(40))"
+        ))
+
+
+def applied_versions(engine):
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+
+def _statements(migration, dialect):
+    sql = migration["sql"]
+    return sql.get(dialect, sql.get("*", []))
+
+
+def _record(engine, migration):
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+            {"v": migration["version"], "d": migration["description"],
+             "t": datetime.now(timezone.utc).isoformat()},
+        )
+
+
+def _run(conn, statements):
+    for stmt in statements:
+        if callable(stmt):
+            stmt(conn)
+        else:
+            conn.execute(text(stmt))
+
+
+def apply_migration(engine, migration):
+    statements = _statements(migration, engine.dialect.name)
+    if migration.get("transaction", True):
+        with engine.begin() as conn:
+            _run(conn, statements)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            _run(conn, statements)
+    _record(engine, migration)
+
+
+@contextmanager
+def _migration_lock(engine):
+    """Postgres: session advisory lock held for the block (no-op elsewhere)."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    # Autocommit, so the waiting/holding session is never idle in a
+    # transaction (CREATE INDEX CONCURRENTLY would wait for it)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+
+
+def _is_manual(migration, engine):
+    """Manual and with something to do on the engine's dialect (else it is simply recorded)."""
+    manual = migration.get("manual", False)
+    if not manual or not _statements(migration, engine.dialect.name):
+        return False
+    if callable(manual):
+        with engine.connect() as conn:
+            return bool(manual(conn))
+    return True
+
+
+def migrate(engine, verbose=True, include_manual=False):
+    """
+    Apply every pending migration in order, skipping manual ones unless
+    ``include_manual``. Returns the versions applied.
+    """
+    with _migration_lock(engine):
+        # Read under the lock: another run may have just applied some
+        done = applied_versions(engine)
+        applied = []
+        for migration in MIGRATIONS:
+            if migration["version"] in done:
+                continue
+            if not include_manual and _is_manual(migration, engine):
+                if verbose:
+                    print(f"[migrations] Skipping {migration['version']} (manual; use --include-manual)")
+                continue
+            if verbose:
+                print(f"[migrations] Applying {migration['version']}: {migration['description']}")
+            apply_migration(engine, migration)
+            applied.append(migration["version"])
+    return applied
+
+
+def status(engine):
+    """[(version, applied, manual, description)] for every migration."""
+    done = applied_versions(engine)
+    return [
+        (m["version"], m["version"] in done, _is_manual(m, engine), m["description"])
+        for m in MIGRATIONS
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply ocean_metrics schema migrations")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    parser.add_argument("--include-manual", action="store_true",
+                        help="Also apply manual migrations (0002 partitioning of a populated table: "
+                             "blocks writes while it runs)")
+    args = parser.parse_args()
+
+    import backend.database as db
+    db.init_db(run_migrations=False)
+    if args.status:
+        for version, is_applied, manual, description in status(db.engine):
+            state = "applied" if is_applied else "manual" if manual else "pending"
+            print(f"{state:<8} {version}  {description}")
+        return
+    applied = migrate(db.engine, include_manual=args.include_manual)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
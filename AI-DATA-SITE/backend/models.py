@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, Float, Date, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, Float, Date, DateTime, Boolean, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 class OceanMetrics(Base):
+    # Read-path indexes (date DESC, partial anomaly, covering timeseries)
+    # are dialect-specific and live in backend/migrations.py
     __tablename__ = "ocean_metrics"
     __table_args__ = (
         UniqueConstraint('date', 'latitude', 'longitude', name='uq_date_lat_lon'),
@@ -18,3 +20,46 @@ class OceanMetrics(Base):
     health_score = Column(Float)
     anomaly = Column(Boolean)
     forecast_ph = Column(Float, nullable=True)
+    # Spatial grid cell id (backend/spatial.py), indexed with date
+    cell = Column(BigInteger, nullable=True)
+
+
+class OceanMetricsDailyRollup(Base):
+    # Per-day, per-region aggregates of ocean_metrics, refreshed by
+    # backend/rollups.py after every bulk write. Regions are
+    # ROLLUP_REGION_DEG x ROLLUP_REGION_DEG degree bands (lat_band, lon_band).
+    __tablename__ = "ocean_metrics_daily_rollup"
+    date = Column(Date, primary_key=True)
+    lat_band = Column(Integer, primary_key=True)
+    lon_band = Column(Integer, primary_key=True)
+    row_count = Column(BigInteger)
+    anomaly_count = Column(BigInteger)
+    sst_n = Column(BigInteger)
+    sst_sum = Column(Float)
+    sst_sumsq = Column(Float)
+    sst_min = Column(Float)
+    sst_max = Column(Float)
+    ph_n = Column(BigInteger)
+    ph_sum = Column(Float)
+    ph_sumsq = Column(Float)
+    ph_min = Column(Float)
+    ph_max = Column(Float)
+    dhw_n = Column(BigInteger)
+    dhw_sum = Column(Float)
+    dhw_sumsq = Column(Float)
+    dhw_min = Column(Float)
+    dhw_max = Column(Float)
+    health_score_n = Column(BigInteger)
+    health_score_sum = Column(Float)
+    health_score_sumsq = Column(Float)
+    health_score_min = Column(Float)
+    health_score_max = Column(Float)
+
+
+class DataVersion(Base):
+    # Single-row stamp bumped after every successful write to
+    # ocean_metrics; API response caches are keyed on it (backend/data_version.py)
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
@@ -0,0 +1,104 @@
+"""
+Monthly range partitioning of ocean_metrics on Postgres.
+
+The table is partitioned by RANGE (date) into one partition per month,
+named ``ocean_metrics_pYYYY_MM``. Partitions are created ahead of time
+(PARTITION_MONTHS_AHEAD) by the migration that converts the table (0002,
+manual: ``python -m backend.migrations --include-manual``), by every bulk
+write for the months it touches, and by the scheduler's daily maintenance
+job. Retention detaches and drops whole partitions instead of
+DELETEing rows.
+
+Every function is a no-op on other dialects or on a table that has not been
+partitioned, so callers do not need to check first.
+"""
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+PARENT = "ocean_metrics"
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+_BOUND = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, n):
+    months = d.year * 12 + d.month - 1 + n
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"
+    ), {"t": PARENT}).first() is not None
+
+
+def list_partitions(conn):
+    """[(name, from_date, to_date)] of the attached partitions, oldest first."""
+    if not is_partitioned(conn):
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": PARENT}).fetchall()
+    out = []
+    for name, bound in rows:
+        m = _BOUND.search(bound or "")
+        if m:
+            out.append((name, date.fromisoformat(m.group(1)), date.fromisoformat(m.group(2))))
+    return sorted(out, key=lambda p: p[1])
+
+
+def ensure_partitions(conn, start=None, end=None, months_ahead=None):
+    """
+    Create missing monthly partitions covering ``start`` .. ``end`` plus
+    ``months_ahead`` further months (defaults: today, PARTITION_MONTHS_AHEAD).
+    Only missing ones are created, so the common case takes no DDL lock.
+    Returns the names created.
+    """
+    if not is_partitioned(conn):
+        return []
+    months_ahead = MONTHS_AHEAD if months_ahead is None else months_ahead
+    today = date.today()
+    first = month_start(min(start or today, today))
+    last = add_months(month_start(max(end or today, today)), months_ahead)
+
+    existing = {name for name, _, _ in list_partitions(conn)}
+    created = []
+    month = first
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    if created:
+        print(f"[partitions] Created {', '.join(created)}")
+    return created
+
+
+def expired_partitions(conn, cutoff):
+    """Partitions whose whole range lies before ``cutoff``."""
+    return [p for p in list_partitions(conn) if p[2] <= cutoff]
+
+
+def drop_partition(conn, name):
+    """Detach ``name`` from ocean_metrics and drop it."""
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
@@ -0,0 +1,132 @@
+"""
+Row-level access to ocean_metrics without materializing the result set.
+
+- ``page_rows()``: keyset pagination on (date, id). The client gets an opaque
+  ``next_cursor`` holding the last (date, id) it saw; the next page is
+  ``WHERE (date, id) > cursor ORDER BY date, id LIMIT n``, which is an
+  index range scan no matter how deep the client has paged (OFFSET would
+  re-read every skipped row).
+- ``stream()``: NDJSON, CSV, Arrow IPC or Parquet export. Rows are read
+  through a server-side cursor EXPORT_CHUNK_ROWS at a time and each chunk
+  is encoded and yielded before the next is fetched, so server memory
+  stays flat for any export size.
+"""
+import io
+import os
+import csv
+import json
+import base64
+from datetime import date
+
+from sqlalchemy import text
+
+from backend import formats
+from backend.timeseries import TimeseriesQueryError, bbox_sql
+
+COLUMNS = ["date", "latitude", "longitude", "sst", "dhw", "ph", "health_score", "anomaly", "forecast_ph"]
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    formats.ARROW: formats.MEDIA_TYPES[formats.ARROW],
+    formats.PARQUET: formats.MEDIA_TYPES[formats.PARQUET],
+}
+
+
+# ===== CURSORS =====
+def encode_cursor(day, row_id):
+    raw = f"{day.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Opaque cursor -> (date, id); raises TimeseriesQueryError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return date.fromisoformat(day), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise TimeseriesQueryError("invalid cursor")
+
+
+# ===== QUERIES =====
+def _select(cutoff, bbox, after=None, limit=None):
+    params = {"cutoff": cutoff}
+    sql = f"SELECT id, {', '.join(COLUMNS)} FROM ocean_metrics WHERE date >= :cutoff{bbox_sql(bbox, params)}"
+    if after is not None:
+        sql += " AND (date, id) > (:after_date, :after_id)"
+        params.update(after_date=after[0], after_id=after[1])
+    sql += " ORDER BY date, id"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = int(limit)
+    return text(sql), params
+
+
+def to_record(row):
+    """Row -> JSON-ready dict of COLUMNS."""
+    row = row._mapping if hasattr(row, "_mapping") else row
+    out = {c: row[c] for c in COLUMNS}
+    out["date"] = _iso(row["date"])
+    out["anomaly"] = None if row["anomaly"] is None else bool(row["anomaly"])
+    return out
+
+
+def _iso(value):
+    # SQLite hands back strings for text() queries, Postgres hands back dates
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)[:10]
+
+
+def page_rows(conn, cutoff, bbox=None, cursor=None, limit=1000):
+    """One page of (id, *COLUMNS) rows since ``cutoff`` and the next cursor (None on the last page)."""
+    after = decode_cursor(cursor) if cursor else None
+    stmt, params = _select(cutoff, bbox, after=after, limit=limit + 1)
+    rows = conn.execute(stmt, params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(date.fromisoformat(_iso(last.date)), last.id)
+    return rows, next_cursor
+
+
+# ===== EXPORT =====
+def _encode_ndjson(rows):
+    return "".join(json.dumps(to_record(r)) + "\n" for r in rows).encode()
+
+
+def _encode_csv(rows, header=False):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(COLUMNS)
+    for r in rows:
+        rec = to_record(r)
+        writer.writerow(["" if rec[c] is None else rec[c] for c in COLUMNS])
+    return buf.getvalue().encode()
+
+
+async def stream(engine, cutoff, fmt="ndjson", bbox=None, chunk_rows=None):
+    """
+    Async generator of encoded chunks for an export since ``cutoff``. Opens
+    its own connection, which stays checked out for the whole export.
+    Arrow / Parquet exports write one record batch / row group per chunk.
+    """
+    if fmt not in FORMATS:
+        raise TimeseriesQueryError(f"format must be one of {', '.join(FORMATS)}")
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    stmt, params = _select(cutoff, bbox)
+    columnar = formats.ChunkWriter(COLUMNS, fmt) if fmt in (formats.ARROW, formats.PARQUET) else None
+    if fmt == "csv":
+        yield _encode_csv([], header=True)
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=chunk_rows), params)
+        async for rows in result.partitions(chunk_rows):
+            if columnar is not None:
+                yield columnar.write([r[1:] for r in rows])  # drop id
+            elif fmt == "ndjson":
+                yield _encode_ndjson(rows)
+            else:
+                yield _encode_csv(rows)
+    if columnar is not None:
+        yield columnar.close()
@@ -0,0 +1,157 @@
+"""
+In-process response cache for the hot read endpoints.
+
+Responses to GET requests on CACHED_PREFIXES are kept in a size-bounded
+LRU with a TTL, keyed by path + query string and tagged with the
+data-version stamp (backend/data_version.py) they were computed under.
+When the pipeline writes, the stamp moves and every older entry is stale.
+
+The stamp itself is re-read from the database at most every
+API_DATA_VERSION_POLL_SECONDS, so between polls a request is answered
+without touching the database:
+
+- a client presenting the current ETag (If-None-Match) gets 304
+- otherwise a cached body for the same stamp is returned as-is
+- otherwise the endpoint runs and its body is cached
+
+ETags are ``W/"<stamp>-<hash of path+query+format>"``, so they stay valid for as
+long as the data does, and Cache-Control tells browsers/proxies how long
+they may reuse a response before revalidating.
+"""
+import os
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+from backend import data_version, formats
+
+MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "256"))
+MAX_BYTES = int(os.getenv("API_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", "3600"))
+VERSION_POLL_SECONDS = float(os.getenv("API_DATA_VERSION_POLL_SECONDS", "5"))
+CLIENT_MAX_AGE = int(os.getenv("API_CACHE_CLIENT_MAX_AGE", "30"))
+
+CACHED_PREFIXES = ("/stats", "/data/")
+# Streamed responses: buffering them would defeat the streaming
+UNCACHED_PREFIXES = ("/data/export",)
+
+
+class LRUCache:
+    """TTL + LRU map bounded by entry count and total body bytes."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        entry = self._data.get(key)
+        if entry is None or entry["version"] != version or time.monotonic() - entry["stored"] > self.ttl:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, version, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = {"version": version, "body": body, "headers": headers, "stored": time.monotonic()}
+        self._bytes += len(body)
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= len(entry["body"])
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+cache = LRUCache()
+
+_version = {"value": None, "checked": 0.0}
+_version_lock = asyncio.Lock()
+
+
+async def current_version():
+    """Data-version stamp, re-read at most every VERSION_POLL_SECONDS."""
+    if time.monotonic() - _version["checked"] < VERSION_POLL_SECONDS and _version["value"] is not None:
+        return _version["value"]
+    async with _version_lock:
+        if time.monotonic() - _version["checked"] >= VERSION_POLL_SECONDS or _version["value"] is None:
+            from backend.database import get_async_engine
+            try:
+                async with get_async_engine().connect() as conn:
+                    value = await data_version.aread(conn)
+            except Exception:
+                # Table missing (fresh DB) or DB down: never serve stale data
+                value = None
+            if value != _version["value"]:
+                cache.clear()
+            _version.update(value=value, checked=time.monotonic())
+    return _version["value"]
+
+
+def _etag(version, key):
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def _cache_headers(etag):
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={CLIENT_MAX_AGE}, must-revalidate",
+        "Vary": "Accept",
+    }
+
+
+def _is_cacheable(request):
+    path = request.url.path
+    return request.method == "GET" and path.startswith(CACHED_PREFIXES) and not path.startswith(UNCACHED_PREFIXES)
+
+
+async def cache_middleware(request, call_next):
+    """HTTP middleware: ETag/304, then the LRU, then the endpoint."""
+    if not _is_cacheable(request):
+        return await call_next(request)
+
+    version = await current_version()
+    if version is None:
+        return await call_next(request)
+
+    # Same URL, different Accept (JSON / Arrow / Parquet) -> different entry
+    key = f"{request.url.path}?{request.url.query}#{formats.negotiate(request)}"
+    etag = _etag(version, key)
+    headers = _cache_headers(etag)
+
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    entry = cache.get(key, version)
+    if entry is not None:
+        return Response(entry["body"], headers={**entry["headers"], **headers, "X-Cache": "HIT"})
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    keep = {k: v for k, v in response.headers.items() if k.lower() in ("content-type", "x-next-cursor")}
+    cache.put(key, version, body, keep)
+    return Response(body, status_code=200, headers={**keep, **headers, "X-Cache": "MISS"})
@@ -0,0 +1,151 @@
+"""
+Daily / regional rollups of ocean_metrics.
+
+``ocean_metrics_daily_rollup`` holds, per (date, lat_band, lon_band), the
+row and anomaly counts and, for sst / ph / dhw / health_score, the count,
+sum, sum of squares, min and max. Means and standard deviations of any
+set of days and regions are then sums over rollup rows: O(days x regions)
+instead of O(rows).
+
+Refresh is incremental by date: after a bulk write, the rollup rows of
+the dates it touched are recomputed from ocean_metrics. Because writes are
+upserts, recomputing a date (rather than adding the batch's sums) keeps a
+re-run of the same day from double counting. Changing ROLLUP_REGION_DEG
+requires ``refresh(conn)`` over all dates.
+"""
+import os
+
+from sqlalchemy import text, bindparam
+
+TABLE = "ocean_metrics_daily_rollup"
+REGION_DEG = float(os.getenv("ROLLUP_REGION_DEG", "10"))
+METRICS = ["sst", "ph", "dhw", "health_score"]
+
+
+def band_columns(dialect):
+    """
+    SQL "lat_band, lon_band" select list (bound to :deg). Bands count from
+    0 upwards: lat + 90 / lon + 180 are never negative, so on SQLite (no
+    FLOOR) the truncating CAST is a floor. Postgres rounds on CAST, so it
+    floors first.
+    """
+    if dialect == "postgresql":
+        band = "CAST(FLOOR(({col} + {off}) / :deg) AS INTEGER)"
+    else:
+        band = "CAST(({col} + {off}) / :deg AS INTEGER)"
+    return (
+        f"{band.format(col='latitude', off=90)} AS lat_band, "
+        f"{band.format(col='longitude', off=180)} AS lon_band"
+    )
+
+
+def _aggregates():
+    parts = [
+        "COUNT(*) AS row_count",
+        "SUM(CASE WHEN anomaly THEN 1 ELSE 0 END) AS anomaly_count",
+    ]
+    for m in METRICS:
+        parts += [
+            f"COUNT({m}) AS {m}_n",
+            f"SUM({m}) AS {m}_sum",
+            f"SUM({m} * {m}) AS {m}_sumsq",
+            f"MIN({m}) AS {m}_min",
+            f"MAX({m}) AS {m}_max",
+        ]
+    return ", ".join(parts)
+
+
+def _columns():
+    cols = ["date", "lat_band", "lon_band", "row_count", "anomaly_count"]
+    for m in METRICS:
+        cols += [f"{m}_n", f"{m}_sum", f"{m}_sumsq", f"{m}_min", f"{m}_max"]
+    return ", ".join(cols)
+
+
+def refresh(conn, dates=None):
+    """
+    Recompute the rollup rows of ``dates`` (all dates when None) from
+    ocean_metrics. Runs inside the caller's transaction.
+    """
+    select = (
+        f"SELECT date, {band_columns(conn.dialect.name)}, {_aggregates()} "
+        "FROM ocean_metrics WHERE date IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+    )
+    insert = f"INSERT INTO {TABLE} ({_columns()}) "
+    group = " GROUP BY date, lat_band, lon_band"
+
+    if dates is None:
+        conn.execute(text(f"DELETE FROM {TABLE}"))
+        conn.execute(text(insert + select + group), {"deg": REGION_DEG})
+        return
+
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    delete = text(f"DELETE FROM {TABLE} WHERE date IN :dates").bindparams(bindparam("dates", expanding=True))
+    rebuild = text(insert + select + " AND date IN :dates" + group).bindparams(bindparam("dates", expanding=True))
+    conn.execute(delete, {"dates": dates})
+    conn.execute(rebuild, {"dates": dates, "deg": REGION_DEG})
+
+
+def drop_before(conn, cutoff):
+    """Remove rollup rows for dates before ``cutoff`` (retention)."""
+    return conn.execute(text(f"DELETE FROM {TABLE} WHERE date < :cutoff"), {"cutoff": cutoff}).rowcount
+
+
+def _summary_columns():
+    parts = ["SUM(row_count) AS row_count", "SUM(anomaly_count) AS anomaly_count"]
+    for m in METRICS:
+        parts += [
+            f"SUM({m}_n) AS {m}_n",
+            f"SUM({m}_sum) AS {m}_sum",
+            f"SUM({m}_sumsq) AS {m}_sumsq",
+            f"MIN({m}_min) AS {m}_min",
+            f"MAX({m}_max) AS {m}_max",
+        ]
+    return ", ".join(parts)
+
+
+def _finish(row):
+    """Summed rollup row -> counts plus mean / std / min / max per metric."""
+    out = {"row_count": int(row["row_count"] or 0), "anomaly_count": int(row["anomaly_count"] or 0)}
+    for m in METRICS:
+        n = row[f"{m}_n"] or 0
+        if n:
+            mean = row[f"{m}_sum"] / n
+            var = max(row[f"{m}_sumsq"] / n - mean * mean, 0.0)
+            out[m] = {"n": int(n), "mean": mean, "std": var ** 0.5,
+                      "min": row[f"{m}_min"], "max": row[f"{m}_max"]}
+        else:
+            out[m] = {"n": 0, "mean": None, "std": None, "min": None, "max": None}
+    return out
+
+
+def summary(conn, start=None, end=None):
+    """Aggregates over all regions for dates in [start, end] (open bounds when None)."""
+    where, params = [], {}
+    if start is not None:
+        where.append("date >= :start")
+        params["start"] = start
+    if end is not None:
+        where.append("date <= :end")
+        params["end"] = end
+    sql = f"SELECT {_summary_columns()} FROM {TABLE}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return _finish(conn.execute(text(sql), params).mappings().one())
+
+
+def daily(conn, limit=None):
+    """Per-day aggregates over all regions, newest first."""
+    sql = f"SELECT date, {_summary_columns()} FROM {TABLE} GROUP BY date ORDER BY date DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return [dict(_finish(r), date=r["date"]) for r in conn.execute(text(sql)).mappings()]
+
+
+def region_bounds(lat_band, lon_band):
+    """(min_lon, min_lat, max_lon, max_lat) of a rollup region."""
+    min_lat = lat_band * REGION_DEG - 90
+    min_lon = lon_band * REGION_DEG - 180
+    return (min_lon, min_lat, min_lon + REGION_DEG, min_lat + REGION_DEG)
@@ -0,0 +1,328 @@
+"""
+Spatial queries on ocean_metrics: bbox, radius and k-nearest cells.
+
+Every row carries ``cell``, an integer id of the SPATIAL_CELL_DEG grid
+square it falls in (row-major from the south-west corner, the same layout
+as pipeline.grid_reader.cell_keys), written by backend/bulk.py and
+indexed together with ``date``. Plain B-tree, so it works on SQLite and
+Postgres alike without PostGIS.
+
+A bbox becomes one ``cell BETWEEN lo AND hi`` range per grid row it spans
+(one range in total when it spans every column), so the index narrows the
+scan to the covering cells; the exact lat/lon test then drops the few
+rows outside the bbox edges. Radius queries search the bbox around the
+circle and filter on haversine distance. Nearest-neighbour queries search
+square rings of cells outward from the query cell and stop as soon as k
+locations are closer than anything outside the rings searched so far.
+
+Every query is bounded: at most SPATIAL_MAX_ROWS rows are read per
+statement (radius queries over more rows are rejected), and a nearest
+search gives up after SPATIAL_NEAREST_MAX_STEPS rings.
+"""
+import os
+import math
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from backend.timeseries import TimeseriesQueryError, bbox_sql
+
+CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "1.0"))
+N_COLS = int(math.ceil(360.0 / CELL_DEG)) + 1
+N_ROWS = int(math.ceil(180.0 / CELL_DEG)) + 1
+EARTH_RADIUS_KM = 6371.0088
+# Half the equator: a radius this large covers the globe
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+MAX_ROWS = int(os.getenv("SPATIAL_MAX_ROWS", "200000"))
+# Ring widths double each step (1, 2, 4, ... cells), so 12 steps reach
+# 2048 cells out: the whole globe at the default 1 degree cells
+NEAREST_MAX_STEPS = int(os.getenv("SPATIAL_NEAREST_MAX_STEPS", "12"))
+# Final lookup of the chosen locations, per statement (bind parameter limits)
+_LOOKUP_BATCH = 200
+
+COLUMNS = ["date", "latitude", "longitude", "sst", "dhw", "ph", "health_score", "anomaly", "forecast_ph"]
+
+# Keeps points on a cell edge in the same cell despite float error
+_EPS = 1e-6
+
+
+# ===== CELL IDS =====
+def cell_ids(lat, lon, deg=CELL_DEG):
+    """Integer cell id of each lat/lon (NumPy, vectorized)."""
+    n_cols = int(math.ceil(360.0 / deg)) + 1
+    rows = np.floor((np.asarray(lat, dtype=float) + 90.0) / deg + _EPS).astype(np.int64)
+    cols = np.floor((np.asarray(lon, dtype=float) + 180.0) / deg + _EPS).astype(np.int64)
+    return rows * n_cols + cols
+
+
+def cell_sql(dialect):
+    """SQL expression for ``cell`` (binds :cell_deg, :n_cols), for backfills."""
+    if dialect == "postgresql":
+        part = "CAST(FLOOR(({col} + {off}) / :cell_deg + 1e-6) AS BIGINT)"
+    else:
+        # Never negative, so SQLite's truncating CAST is a floor
+        part = "CAST(({col} + {off}) / :cell_deg + 1e-6 AS INTEGER)"
+    return f"{part.format(col='latitude', off=90)} * :n_cols + {part.format(col='longitude', off=180)}"
+
+
+def _row_col(lat, lon):
+    row = int(math.floor((lat + 90.0) / CELL_DEG + _EPS))
+    col = int(math.floor((lon + 180.0) / CELL_DEG + _EPS))
+    return min(max(row, 0), N_ROWS - 1), min(max(col, 0), N_COLS - 1)
+
+
+def cell_ranges(bbox):
+    """Inclusive (lo, hi) cell id ranges covering ``bbox``, merged where contiguous."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    r0, c0 = _row_col(min_lat, min_lon)
+    r1, c1 = _row_col(max_lat, max_lon)
+    if min_lon <= max_lon:
+        spans = [(c0, c1)]
+    else:
+        # Crosses the antimeridian: [0, c1] and [c0, last column], in id order
+        spans = [(0, c1), (c0, N_COLS - 1)]
+
+    ranges = []
+    for row in range(r0, r1 + 1):
+        for lo, hi in spans:
+            lo, hi = row * N_COLS + lo, row * N_COLS + hi
+            if ranges and ranges[-1][1] + 1 >= lo:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], hi))
+            else:
+                ranges.append((lo, hi))
+    return ranges
+
+
+def _subtract(ranges, covered):
+    """Cell ranges in ``ranges`` but not in ``covered`` (both sorted, non-overlapping)."""
+    out = []
+    for lo, hi in ranges:
+        for c_lo, c_hi in covered:
+            if c_hi < lo or c_lo > hi:
+                continue
+            if c_lo > lo:
+                out.append((lo, c_lo - 1))
+            lo = c_hi + 1
+            if lo > hi:
+                break
+        if lo <= hi:
+            out.append((lo, hi))
+    return out
+
+
+def _cells_sql(ranges, params):
+    parts = []
+    for i, (lo, hi) in enumerate(ranges):
+        params[f"cell_lo_{i}"], params[f"cell_hi_{i}"] = lo, hi
+        parts.append(f"cell BETWEEN :cell_lo_{i} AND :cell_hi_{i}")
+    return "(" + " OR ".join(parts) + ")"
+
+
+# ===== GEOMETRY =====
+def haversine_km(lat, lon, lat0, lon0):
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    lat0, lon0 = math.radians(lat0), math.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * math.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _meridian_km(lat, dlon):
+    """Distance from latitude ``lat`` to the half meridian ``dlon`` degrees of longitude away."""
+    if dlon >= 90.0:
+        # Nearest point on it is the nearer pole
+        return math.radians(90.0 - abs(lat)) * EARTH_RADIUS_KM
+    return math.asin(math.cos(math.radians(lat)) * math.sin(math.radians(dlon))) * EARTH_RADIUS_KM
+
+
+def outside_km(lat, lon, bbox):
+    """Lower bound on the distance from (lat, lon), inside ``bbox``, to any point outside it."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    bounds = []
+    if min_lat > -90.0:
+        bounds.append(math.radians(max(lat - min_lat, 0.0)) * EARTH_RADIUS_KM)
+    if max_lat < 90.0:
+        bounds.append(math.radians(max(max_lat - lat, 0.0)) * EARTH_RADIUS_KM)
+    if (min_lon, max_lon) != (-180.0, 180.0):
+        # Leaving the longitude span means crossing one of its edge meridians
+        for edge in (min_lon, max_lon):
+            bounds.append(_meridian_km(lat, abs((edge - lon + 180.0) % 360.0 - 180.0)))
+    return min(bounds) if bounds else math.inf
+
+
+def cell_square(lat, lon, d):
+    """(min_lon, min_lat, max_lon, max_lat) of the cells at most ``d`` rows / columns from the cell of (lat, lon)."""
+    row, col = _row_col(lat, lon)
+    min_lat = max((row - d) * CELL_DEG - 90.0, -90.0)
+    max_lat = min((row + d + 1) * CELL_DEG - 90.0, 90.0)
+    if (2 * d + 1) * CELL_DEG >= 360.0:
+        return -180.0, min_lat, 180.0, max_lat
+    min_lon = (col - d) * CELL_DEG - 180.0
+    max_lon = (col + d + 1) * CELL_DEG - 180.0
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def radius_bbox(lat, lon, radius_km):
+    """Smallest (min_lon, min_lat, max_lon, max_lat) bbox containing the circle (whole longitude band near the poles)."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return -180.0, min_lat, 180.0, max_lat
+    # Widest longitude extent of the circle, reached at its tangent latitude
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return -180.0, min_lat, 180.0, max_lat
+    dlon = math.degrees(math.asin(ratio))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# ===== QUERIES =====
+def _frame(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    if not df.empty:
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+        # Nullable, as records.to_record: an unscored row stays NULL, not False
+        df["anomaly"] = df["anomaly"].astype("boolean")
+    return df
+
+
+CELL_INDEX = "ix_ocean_metrics_cell_date"
+
+
+def _has_cell_index(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {"name": CELL_INDEX}
+    ).first() is not None
+
+
+def _from_clause(conn, ranges):
+    """
+    SQLite's planner prefers a skip-scan of the unique (date, latitude,
+    longitude) index, which reads a full longitude band per date; point it
+    at the cell index unless the bbox covers much of the globe anyway (or
+    migration 0007 has not created the index yet: INDEXED BY would fail).
+    """
+    covered = sum(hi - lo + 1 for lo, hi in ranges)
+    if conn.dialect.name == "sqlite" and covered <= N_ROWS * N_COLS // 4 and _has_cell_index(conn):
+        return f"ocean_metrics INDEXED BY {CELL_INDEX}"
+    return "ocean_metrics"
+
+
+def _fetch(conn, bbox, cutoff, limit=None, order=True):
+    params = {"cutoff": cutoff}
+    ranges = cell_ranges(bbox)
+    sql = (
+        f"SELECT {', '.join(COLUMNS)} FROM {_from_clause(conn, ranges)} "
+        f"WHERE {_cells_sql(ranges, params)} AND date >= :cutoff{bbox_sql(bbox, params)}"
+    )
+    if order:
+        sql += " ORDER BY date DESC, latitude, longitude"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = int(limit)
+    return _frame(conn.execute(text(sql), params).all())
+
+
+def in_bbox(conn, bbox, cutoff, limit=5000):
+    """Rows since ``cutoff`` inside ``bbox``, newest first, at most ``limit``."""
+    return _fetch(conn, bbox, cutoff, limit=limit)
+
+
+def within_radius(conn, lat, lon, radius_km, cutoff, limit=5000):
+    """
+    Rows since ``cutoff`` within ``radius_km`` of (lat, lon), nearest first,
+    with distance_km. Raises TimeseriesQueryError when the bbox around the
+    circle holds more than MAX_ROWS rows (the nearest ones could not be
+    picked without reading them all).
+    """
+    if radius_km <= 0:
+        raise TimeseriesQueryError("radius_km must be positive")
+    df = _fetch(conn, radius_bbox(lat, lon, min(radius_km, MAX_RADIUS_KM)), cutoff, limit=MAX_ROWS + 1, order=False)
+    if len(df) > MAX_ROWS:
+        raise TimeseriesQueryError(
+            f"more than {MAX_ROWS} rows around the radius; use a smaller radius_km or fewer days"
+        )
+    if df.empty:
+        return df.assign(distance_km=pd.Series(dtype=float))
+    df["distance_km"] = haversine_km(df["latitude"], df["longitude"], lat, lon)
+    df = df[df["distance_km"] <= radius_km]
+    df = df.sort_values(["distance_km", "date"], ascending=[True, False], kind="stable")
+    return df if limit is None else df.head(limit)
+
+
+def _ring_locations(conn, ranges, cutoff):
+    """(latitude, longitude, latest date) of the locations in ``ranges`` since ``cutoff``, at most MAX_ROWS + 1."""
+    params = {"cutoff": cutoff, "limit": MAX_ROWS + 1}
+    sql = (
+        f"SELECT latitude, longitude, MAX(date) AS date FROM {_from_clause(conn, ranges)} "
+        f"WHERE {_cells_sql(ranges, params)} AND date >= :cutoff "
+        "GROUP BY latitude, longitude LIMIT :limit"
+    )
+    return pd.DataFrame(conn.execute(text(sql), params).all(), columns=["latitude", "longitude", "date"])
+
+
+def _latest_rows(conn, locations):
+    """Full rows for (latitude, longitude, date) triples, looked up on the unique key."""
+    rows = []
+    for start in range(0, len(locations), _LOOKUP_BATCH):
+        params, keys = {}, []
+        for i, loc in enumerate(locations[start:start + _LOOKUP_BATCH].itertuples(index=False)):
+            params.update({f"d{i}": loc.date, f"lat{i}": loc.latitude, f"lon{i}": loc.longitude})
+            keys.append(f"(date = :d{i} AND latitude = :lat{i} AND longitude = :lon{i})")
+        sql = f"SELECT {', '.join(COLUMNS)} FROM ocean_metrics WHERE {' OR '.join(keys)}"
+        rows.extend(conn.execute(text(sql), params).all())
+    return _frame(rows)
+
+
+def nearest(conn, lat, lon, cutoff, k=1):
+    """
+    Latest row since ``cutoff`` of each of the ``k`` locations nearest to
+    (lat, lon), nearest first, with distance_km.
+
+    Searches square rings of cells around the query cell, each step twice
+    as wide as the last, reading only the cells the previous steps did not
+    (at most MAX_ROWS locations each). It stops once the k-th nearest
+    location seen is closer than the nearest point outside the searched
+    square, so those k are the true nearest. Fewer than k come back when
+    there are fewer locations, or when NEAREST_MAX_STEPS or MAX_ROWS cut the
+    search short: then only the locations proven nearest are returned.
+    """
+    if k < 1:
+        raise TimeseriesQueryError("k must be >= 1")
+    seen, kth = [], []
+    covered, bound, width = [], 0.0, 0
+    for _ in range(NEAREST_MAX_STEPS):
+        square = cell_square(lat, lon, width)
+        ranges = cell_ranges(square)
+        ring = _subtract(ranges, covered)
+        found = _ring_locations(conn, ring, cutoff) if ring else None
+        if found is not None and not found.empty:
+            found["distance_km"] = haversine_km(found["latitude"], found["longitude"], lat, lon)
+            seen.append(found.iloc[:MAX_ROWS])
+            kth = np.sort(np.concatenate([kth, found["distance_km"].to_numpy()]))[:k]
+        if found is not None and len(found) > MAX_ROWS:
+            # Ring only partly read: the bound stays at the last complete square
+            break
+        covered, bound = ranges, outside_km(lat, lon, square)
+        if bound == math.inf or (len(kth) == k and kth[-1] <= bound):
+            break
+        width = max(1, width * 2)
+
+    if not seen:
+        return _frame([]).assign(distance_km=pd.Series(dtype=float))
+    candidates = pd.concat(seen, ignore_index=True)
+    chosen = candidates[candidates["distance_km"] <= bound].nsmallest(k, "distance_km")
+    df = _latest_rows(conn, chosen)
+    if df.empty:
+        return df.assign(distance_km=pd.Series(dtype=float))
+    df["distance_km"] = haversine_km(df["latitude"], df["longitude"], lat, lon)
+    return df.sort_values(["distance_km", "latitude", "longitude"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,277 @@
+"""
+Aggregated, bounded time series for /data/timeseries.
+
+Rows are reduced in the database to one point per time bucket (day or
+ISO week) and, optionally, per region, so the payload depends on days x
+groups rather than on the number of grid cells:
+
+- mean / min / max with no bbox come straight from the daily rollups
+  (backend/rollups.py), O(days x regions)
+- with a bbox they are a GROUP BY over ocean_metrics
+- p90 uses percentile_cont on Postgres; SQLite has no percentile
+  aggregate, so the bucketed values are reduced with NumPy instead, which
+  reads every matching row: above TIMESERIES_P90_MAX_ROWS it is refused
+
+Each resulting series is then thinned to ``max_points`` with LTTB
+(Largest-Triangle-Three-Buckets), which keeps peaks and troughs that plain
+striding would drop.
+
+"Region" groups are the rollup cells (ROLLUP_REGION_DEG degrees);
+ocean_metrics stores no reef id, so these stand in for per-reef grouping.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from backend import rollups
+
+METRICS = ["sst", "ph", "dhw", "health_score"]
+RESOLUTIONS = ("day", "week")
+AGGS = ("mean", "min", "max", "p90")
+GROUPS = ("none", "region")
+RAW_COLUMNS = ["date", "latitude", "longitude", "sst", "ph", "health_score", "anomaly"]
+# Rows the NumPy p90 path may load
+P90_MAX_ROWS = int(os.getenv("TIMESERIES_P90_MAX_ROWS", "500000"))
+
+
+class TimeseriesQueryError(ValueError):
+    """Invalid query parameters (mapped to HTTP 400 by the API)."""
+
+
+# ===== PARAMETERS =====
+def parse_bbox(value):
+    """
+    "min_lon,min_lat,max_lon,max_lat" -> tuple of floats (None if empty),
+    lon-first like NOAA_ROI_BBOX and ALLEN_WFS_BBOX. min_lon > max_lon
+    crosses the antimeridian.
+    """
+    if not value:
+        return None
+    try:
+        parts = [float(v) for v in value.split(",")]
+    except ValueError:
+        raise TimeseriesQueryError(f"bbox must be four numbers, got {value!r}")
+    if len(parts) != 4:
+        raise TimeseriesQueryError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lat > max_lat:
+        raise TimeseriesQueryError("bbox min_lat must be <= max_lat")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def bbox_sql(bbox, params):
+    """SQL "AND ..." filter for ``bbox`` (empty when None); binds into ``params``."""
+    if bbox is None:
+        return ""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    params.update(min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon)
+    lat = " AND latitude BETWEEN :min_lat AND :max_lat"
+    if min_lon <= max_lon:
+        return lat + " AND longitude BETWEEN :min_lon AND :max_lon"
+    # Crosses the antimeridian
+    return lat + " AND (longitude >= :min_lon OR longitude <= :max_lon)"
+
+
+def _bucket_sql(dialect, resolution):
+    if resolution == "day":
+        return "date"
+    if dialect == "postgresql":
+        return "CAST(date_trunc('week', date) AS DATE)"
+    # SQLite: back to the Monday of the week
+    return "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')"
+
+
+# ===== AGGREGATION =====
+def _from_rollups(conn, cutoff, resolution, agg, group_by):
+    bucket = _bucket_sql(conn.dialect.name, resolution)
+    group_cols = ", lat_band, lon_band" if group_by == "region" else ""
+    cols = ["SUM(row_count) AS n", "SUM(anomaly_count) AS anomaly_count"]
+    for m in METRICS:
+        if agg == "mean":
+            cols.append(f"SUM({m}_sum) / NULLIF(SUM({m}_n), 0) AS {m}")
+        else:
+            cols.append(f"{agg.upper()}({m}_{agg}) AS {m}")
+    sql = (
+        f"SELECT {bucket} AS bucket{group_cols}, {', '.join(cols)} "
+        f"FROM {rollups.TABLE} WHERE date >= :cutoff "
+        f"GROUP BY bucket{group_cols} ORDER BY bucket"
+    )
+    return pd.DataFrame(conn.execute(text(sql), {"cutoff": cutoff}).mappings().all())
+
+
+def _band_sql(dialect):
+    return f", {rollups.band_columns(dialect)}"
+
+
+def _from_table_sql(conn, cutoff, resolution, agg, group_by, bbox):
+    """mean/min/max (any dialect) or p90 (Postgres) as one GROUP BY."""
+    params = {"cutoff": cutoff, "deg": rollups.REGION_DEG}
+    bucket = _bucket_sql(conn.dialect.name, resolution)
+    bands = _band_sql(conn.dialect.name) if group_by == "region" else ""
+    group_cols = ", lat_band, lon_band" if group_by == "region" else ""
+    cols = ["COUNT(*) AS n", "SUM(CASE WHEN anomaly THEN 1 ELSE 0 END) AS anomaly_count"]
+    for m in METRICS:
+        if agg == "p90":
+            cols.append(f"percentile_cont(0.9) WITHIN GROUP (ORDER BY {m}) AS {m}")
+        else:
+            cols.append(f"{'AVG' if agg == 'mean' else agg.upper()}({m}) AS {m}")
+    sql = (
+        f"SELECT {bucket} AS bucket{bands}, {', '.join(cols)} FROM ocean_metrics "
+        f"WHERE date >= :cutoff{bbox_sql(bbox, params)} "
+        f"GROUP BY bucket{group_cols} ORDER BY bucket"
+    )
+    return pd.DataFrame(conn.execute(text(sql), params).mappings().all())
+
+
+def _from_table_numpy(conn, cutoff, resolution, group_by, bbox):
+    """
+    p90 where the database has no percentile aggregate. Raises
+    TimeseriesQueryError when more than P90_MAX_ROWS rows match.
+    """
+    params = {"cutoff": cutoff, "deg": rollups.REGION_DEG, "limit": P90_MAX_ROWS + 1}
+    bucket = _bucket_sql(conn.dialect.name, resolution)
+    bands = _band_sql(conn.dialect.name) if group_by == "region" else ""
+    sql = (
+        f"SELECT {bucket} AS bucket{bands}, anomaly, {', '.join(METRICS)} FROM ocean_metrics "
+        f"WHERE date >= :cutoff{bbox_sql(bbox, params)} LIMIT :limit"
+    )
+    df = pd.DataFrame(conn.execute(text(sql), params).mappings().all())
+    if len(df) > P90_MAX_ROWS:
+        raise TimeseriesQueryError(
+            f"p90 over more than {P90_MAX_ROWS} rows; use a smaller bbox, fewer days or agg=max"
+        )
+    if df.empty:
+        return df
+    keys = ["bucket"] + (["lat_band", "lon_band"] if group_by == "region" else [])
+    grouped = df.groupby(keys, sort=True)
+    out = grouped[METRICS].quantile(0.9)
+    out["n"] = grouped.size()
+    out["anomaly_count"] = grouped["anomaly"].sum()
+    return out.reset_index()
+
+
+# ===== DOWNSAMPLING =====
+def lttb(x, y, n_out):
+    """
+    Indices of the ``n_out`` points chosen by Largest-Triangle-Three-Buckets
+    from the series (x, y), first and last point always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if np.isnan(y).any():
+        y = np.where(np.isnan(y), np.nanmean(y) if (~np.isnan(y)).any() else 0.0, y)
+
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(int)
+    chosen = np.empty(n_out, dtype=int)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], max(edges[i + 2], edges[i + 1] + 1))
+        else:
+            nxt = slice(n - 1, n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def _downsample(df, max_points, group_keys, on):
+    if not max_points or len(df) <= max_points:
+        return df
+    if not group_keys:
+        x = pd.to_datetime(df["bucket"]).map(pd.Timestamp.toordinal).to_numpy()
+        return df.iloc[lttb(x, df[on].to_numpy(dtype=float), max_points)]
+    groups = list(df.groupby(group_keys, sort=False))
+    per_group = max(3, max_points // max(len(groups), 1))
+    return pd.concat([_downsample(g, per_group, [], on) for _, g in groups])
+
+
+# ===== ENTRY POINTS =====
+def query_frame(conn, cutoff, resolution="day", agg="mean", bbox=None, group_by="none",
+                max_points=2000, downsample_on="sst"):
+    """
+    Aggregated series since ``cutoff`` as a DataFrame: date, n,
+    anomaly_count, region and region_bbox (group_by=region only) and one
+    column per metric.
+    """
+    if resolution not in RESOLUTIONS:
+        raise TimeseriesQueryError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if agg not in AGGS:
+        raise TimeseriesQueryError(f"agg must be one of {', '.join(AGGS)}")
+    if group_by not in GROUPS:
+        raise TimeseriesQueryError(f"group_by must be one of {', '.join(GROUPS)}")
+    if downsample_on not in METRICS:
+        raise TimeseriesQueryError(f"downsample_on must be one of {', '.join(METRICS)}")
+
+    region = ["region", "region_bbox"] if group_by == "region" else []
+    if bbox is None and agg != "p90":
+        df = _from_rollups(conn, cutoff, resolution, agg, group_by)
+    elif agg != "p90" or conn.dialect.name == "postgresql":
+        df = _from_table_sql(conn, cutoff, resolution, agg, group_by, bbox)
+    else:
+        df = _from_table_numpy(conn, cutoff, resolution, group_by, bbox)
+    if df.empty:
+        return pd.DataFrame(columns=["date", "n", "anomaly_count"] + region + METRICS)
+
+    group_keys = ["lat_band", "lon_band"] if group_by == "region" else []
+    df = df.sort_values(group_keys + ["bucket"])
+    df = _downsample(df, max_points, group_keys, downsample_on)
+
+    out = pd.DataFrame({
+        "date": pd.to_datetime(df["bucket"]).dt.date,
+        "n": df["n"].fillna(0).astype("int64"),
+        "anomaly_count": df["anomaly_count"].fillna(0).astype("int64"),
+    })
+    if group_by == "region":
+        bands = list(zip(df["lat_band"].astype(int), df["lon_band"].astype(int)))
+        out["region"] = [f"r{lat_band}_{lon_band}" for lat_band, lon_band in bands]
+        out["region_bbox"] = [list(rollups.region_bounds(*b)) for b in bands]
+    for m in METRICS:
+        out[m] = pd.to_numeric(df[m], errors="coerce").astype("float64")
+    return out.reset_index(drop=True)
+
+
+def frame_records(df):
+    """Frame with a ``date`` column of dates (e.g. ``query_frame`` output) as JSON-ready dicts, NaN -> None."""
+    df = df.copy()
+    df["date"] = df["date"].map(lambda d: d.isoformat())
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def raw_rows(conn, cutoff, bbox=None, max_points=2000):
+    """
+    Per-cell RAW_COLUMNS tuples (the original payload, e.g. for maps), the
+    newest ``max_points`` rows, returned in date order.
+    """
+    params = {"cutoff": cutoff, "limit": int(max_points)}
+    sql = (
+        f"SELECT {', '.join(RAW_COLUMNS)} FROM ocean_metrics "
+        f"WHERE date >= :cutoff{bbox_sql(bbox, params)} ORDER BY date DESC LIMIT :limit"
+    )
+    rows = conn.execute(text(sql), params).all()
+    rows.reverse()
+    return rows
+
+
+def raw_records(rows):
+    """``raw_rows`` output as a list of JSON-ready dicts."""
+    return [
+        {
+            "date": str(r.date)[:10],
+            "latitude": r.latitude,
+            "longitude": r.longitude,
+            "sst": r.sst,
+            "ph": r.ph,
+            "health_score": r.health_score,
+            "anomaly": bool(r.anomaly),
+        }
+        for r in rows
+    ]
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import io
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
@@ -18,11 +19,22 @@ st.markdown("Real-time AI-powered ocean health monitoring")
 
 # API Base URL
 API_URL = "http://localhost:8000"
+PARQUET = "application/vnd.apache.parquet"
+
+
+def fetch_frame(path, params=None):
+    """GET a data endpoint as a DataFrame, as Parquet when the API offers it"""
+    r = requests.get(f"{API_URL}{path}", params=params, headers={"Accept": f"{PARQUET}, application/json;q=0.5"})
+    if r.headers.get("content-type", "").startswith(PARQUET):
+        return pd.read_parquet(io.BytesIO(r.content))
+    data = r.json()
+    return pd.DataFrame(data) if isinstance(data, list) else pd.DataFrame()
 
 # Sidebar
 with st.sidebar:
     st.header("Settings")
     time_range = st.slider("Days to display", 1, 90, 30)
+    map_bbox = st.text_input("Map area (min_lon,min_lat,max_lon,max_lat)", "-180,-90,180,90")
     refresh_interval = st.selectbox("Refresh interval", ["5s", "30s", "1m", "5m"])
 
 # Main dashboard
@@ -67,11 +79,14 @@ with tabs[0]:
 # TAB 2: Map View
 with tabs[1]:
     try:
-        # Fetch latest data
-        data = requests.get(f"{API_URL}/data/timeseries?days={time_range}").json()
+        # Cells inside the map area only (spatial index), newest rows first
+        df = fetch_frame(
+            "/data/spatial/bbox",
+            params={"bbox": map_bbox, "days": time_range, "limit": 20000},
+        )
 
-        if isinstance(data, list) and data:
-            df = pd.DataFrame(data)
+        if not df.empty:
+            df["date"] = df["date"].astype(str)  # pydeck serializes rows as JSON
 
             # Create pydeck map
             st.pydeck_chart(
@@ -106,10 +121,13 @@ with tabs[1]:
 # TAB 3: Analytics
 with tabs[2]:
     try:
-        data = requests.get(f"{API_URL}/data/timeseries?days={time_range}").json()
+        # Daily means aggregated server-side
+        df = fetch_frame(
+            "/data/timeseries",
+            params={"days": time_range, "resolution": "day", "agg": "mean"},
+        )
 
-        if isinstance(data, list) and data:
-            df = pd.DataFrame(data)
+        if not df.empty:
             df["date"] = pd.to_datetime(df["date"])
 
             col1, col2 = st.columns(2)
@@ -133,10 +151,10 @@ with tabs[2]:
 
             with col2:
                 # Anomaly Distribution
-                anomaly_counts = df["anomaly"].value_counts()
+                anomalies = int(df["anomaly_count"].sum())
                 fig_anomaly = px.pie(
-                    values=anomaly_counts.values,
-                    names=[("Anomaly" if x else "Normal") for x in anomaly_counts.index],
+                    values=[int(df["n"].sum()) - anomalies, anomalies],
+                    names=["Normal", "Anomaly"],
                     title="Data Distribution",
                 )
                 st.plotly_chart(fig_anomaly, use_container_width=True)
@@ -0,0 +1,217 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from ml import registry
+
+# ===== CONFIG =====
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.getenv("ANOMALY_MODEL_DIR", os.path.join(BASE_DIR, "models", "anomaly"))
+FEATURES = [f.strip() for f in os.getenv("ANOMALY_FEATURES", "sst").split(",") if f.strip()]
+# ocean_metrics columns a model may be trained on (names go into SQL)
+FEATURE_COLUMNS = ("sst", "dhw", "ph", "health_score", "forecast_ph")
+TRAIN_DAYS = int(os.getenv("ANOMALY_TRAIN_DAYS", "90"))
+MIN_TRAIN_ROWS = int(os.getenv("ANOMALY_MIN_TRAIN_ROWS", "100"))
+CONTAMINATION = float(os.getenv("ANOMALY_CONTAMINATION", "0.1"))
+CHUNK_SIZE = int(os.getenv("ANOMALY_CHUNK_SIZE", "200000"))
+N_JOBS = int(os.getenv("ANOMALY_N_JOBS", "-1"))
+# Population Stability Index above which a feature counts as drifted
+DRIFT_PSI = float(os.getenv("ANOMALY_DRIFT_PSI", "0.2"))
+DRIFT_DAYS = int(os.getenv("ANOMALY_DRIFT_DAYS", "7"))
+KEEP_VERSIONS = int(os.getenv("ANOMALY_KEEP_VERSIONS", "5"))
+HIST_BINS = 10
+
+# pandas / SQLAlchemy / joblib / scikit-learn are imported inside the
+# functions that need them so that importing this module (scheduler, light
+# pipeline) stays cheap
+
+
+# ===== PERSISTENCE =====
+# Versioned isoforest_vNNNN.joblib + .json pairs, via ml/registry.py
+PREFIX = "isoforest_v"
+SUFFIX = ".joblib"
+
+
+def load_model(version=None):
+    """
+    Latest (or the given) persisted model as a dict with ``model`` and
+    ``meta``; None when nothing has been trained yet.
+    """
+    found = registry.load_version(MODEL_DIR, SUFFIX, version, prefix=PREFIX)
+    if found is None:
+        return None
+    import joblib
+    path, meta = found
+    return {"model": joblib.load(path), "meta": meta}
+
+
+def _save_model(model, meta):
+    """Persist ``model`` as the next version; returns the saved metadata."""
+    import joblib
+    return registry.save_version(
+        MODEL_DIR, lambda path: joblib.dump(model, path), meta, SUFFIX, KEEP_VERSIONS, prefix=PREFIX
+    )
+
+
+# ===== TRAINING =====
+def check_features(features):
+    """Raise ValueError unless every name is one of FEATURE_COLUMNS."""
+    unknown = [f for f in features if f not in FEATURE_COLUMNS]
+    if unknown or not features:
+        raise ValueError(
+            f"anomaly features must be among {', '.join(FEATURE_COLUMNS)}; got {', '.join(features) or 'none'}"
+        )
+
+
+def load_history(engine, days, features=FEATURES):
+    """Rows of ``features`` from ocean_metrics for the last ``days`` days."""
+    check_features(features)
+    cutoff = datetime.now().date() - timedelta(days=days)
+    cols = ", ".join(features)
+    where = " AND ".join(f"{c} IS NOT NULL" for c in features)
+    import pandas as pd
+    from sqlalchemy import text
+    return pd.read_sql(
+        text(f"SELECT {cols} FROM ocean_metrics WHERE date >= :cutoff AND {where}"),
+        engine,
+        params={"cutoff": cutoff},
+    )
+
+
+def _histograms(X, features):
+    """Per-feature bin edges and proportions, kept with the model for drift checks."""
+    hists = {}
+    for i, name in enumerate(features):
+        edges = np.unique(np.quantile(X[:, i], np.linspace(0, 1, HIST_BINS + 1)))
+        counts, _ = np.histogram(X[:, i], bins=edges)
+        hists[name] = {"edges": edges.tolist(), "props": (counts / max(counts.sum(), 1)).tolist()}
+    return hists
+
+
+def fit_model(X, features=FEATURES, source="history"):
+    """Fit, persist and return a model bundle for the feature matrix ``X``."""
+    from sklearn.ensemble import IsolationForest
+    model = IsolationForest(contamination=CONTAMINATION, random_state=42, n_jobs=N_JOBS)
+    model.fit(X)
+    meta = {
+        "features": list(features),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "rows": int(len(X)),
+        "source": source,
+        "contamination": CONTAMINATION,
+        "histograms": _histograms(X, features),
+    }
+    meta = _save_model(model, meta)
+    print(f"[anomaly] Trained IsolationForest v{meta['version']} on {len(X)} rows ({source})")
+    return {"model": model, "meta": meta}
+
+
+def train_from_history(engine, days=TRAIN_DAYS, features=FEATURES):
+    """Fit on the last ``days`` of ocean_metrics; None if there is too little."""
+    hist = load_history(engine, days, features)
+    if len(hist) < MIN_TRAIN_ROWS:
+        print(f"[anomaly] Only {len(hist)} history rows (< {MIN_TRAIN_ROWS}); not training")
+        return None
+    return fit_model(hist[features].to_numpy(dtype=float), features, source=f"ocean_metrics:{days}d")
+
+
+# ===== DRIFT =====
+def population_stability(expected_props, edges, values):
+    """PSI between the training distribution and ``values`` on the same bins."""
+    edges = np.asarray(edges, dtype=float)
+    if edges.size < 2 or len(values) == 0:
+        return 0.0
+    clipped = np.clip(values, edges[0], edges[-1])
+    counts, _ = np.histogram(clipped, bins=edges)
+    actual = counts / max(counts.sum(), 1)
+    expected = np.asarray(expected_props, dtype=float)
+    eps = 1e-6
+    actual = np.clip(actual, eps, None)
+    expected = np.clip(expected, eps, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def detect_drift(bundle, df):
+    """{feature: psi} for features whose PSI exceeds ANOMALY_DRIFT_PSI."""
+    drifted = {}
+    for name, hist in bundle["meta"].get("histograms", {}).items():
+        if name not in df.columns:
+            continue
+        values = df[name].dropna().to_numpy(dtype=float)
+        psi = population_stability(hist["props"], hist["edges"], values)
+        if psi > DRIFT_PSI:
+            drifted[name] = psi
+    return drifted
+
+
+def refit_if_drifted(engine, days=DRIFT_DAYS):
+    """
+    Scheduled check: compare the last ``days`` of ocean_metrics with the
+    current model's training distribution and retrain only on drift (or if
+    no model exists). Returns the new version, or None when unchanged.
+    """
+    bundle = load_model()
+    if bundle is None or bundle["meta"].get("source") == "batch":
+        # No model yet, or only a stopgap fitted on a single batch
+        bundle = train_from_history(engine)
+        return bundle["meta"]["version"] if bundle else None
+
+    recent = load_history(engine, days, bundle["meta"]["features"])
+    drifted = detect_drift(bundle, recent)
+    if not drifted:
+        print(f"[anomaly] No drift vs v{bundle['meta']['version']}; keeping model")
+        return None
+    print(f"[anomaly] Drift detected ({', '.join(f'{k}: PSI {v:.2f}' for k, v in drifted.items())}); refitting")
+    new = train_from_history(engine, features=bundle["meta"]["features"])
+    return new["meta"]["version"] if new else None
+
+
+# ===== SCORING =====
+def _predict(model, X):
+    return model.predict(X) == -1
+
+
+def score(bundle, df):
+    """
+    Boolean anomaly flag per row of ``df`` using a persisted model. Rows
+    are scored in CHUNK_SIZE chunks spread over N_JOBS processes; rows with
+    a missing feature are never flagged.
+    """
+    features = bundle["meta"]["features"]
+    X = df[features].to_numpy(dtype=float)
+    valid = ~np.isnan(X).any(axis=1)
+    flags = np.zeros(len(df), dtype=bool)
+    Xv = X[valid]
+    if not len(Xv):
+        return flags
+
+    if len(Xv) <= CHUNK_SIZE:
+        flags[valid] = _predict(bundle["model"], Xv)
+        return flags
+
+    from joblib import Parallel, delayed
+    chunks = [Xv[i:i + CHUNK_SIZE] for i in range(0, len(Xv), CHUNK_SIZE)]
+    parts = Parallel(n_jobs=N_JOBS)(delayed(_predict)(bundle["model"], c) for c in chunks)
+    flags[valid] = np.concatenate(parts)
+    return flags
+
+
+def detect_anomalies(df, engine=None):
+    """
+    Train-once / score-many entry point for the pipelines. Uses the latest
+    persisted model; if there is none, trains from ocean_metrics history
+    (or, lacking history, from this batch) and persists that.
+    """
+    bundle = load_model()
+    if bundle is None and engine is not None:
+        try:
+            bundle = train_from_history(engine)
+        except Exception as e:
+            print(f"[anomaly] History unavailable ({type(e).__name__}); training on this batch")
+    if bundle is None:
+        X = df[FEATURES].dropna().to_numpy(dtype=float)
+        if len(X) < 2:
+            return np.zeros(len(df), dtype=bool)
+        bundle = fit_model(X, FEATURES, source="batch")
+    return score(bundle, df)
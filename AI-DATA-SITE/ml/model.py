@@ -1,10 +1,37 @@
+import os
+import importlib.util
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import datetime, timedelta
+
+from ml.scoring import health_scores
+from ml import registry
+
+# pandas and SQLAlchemy (like TensorFlow and scikit-learn below) are
+# imported inside the functions that use them: the scheduler imports this
+# module just for tensorflow_available()
+
+# ===== CONFIG =====
+FORECAST_EPOCHS = int(os.getenv("FORECAST_EPOCHS", "10"))
+FORECAST_FINETUNE_EPOCHS = int(os.getenv("FORECAST_FINETUNE_EPOCHS", "2"))
+# A registry model younger than this is used without any retraining
+FORECAST_MODEL_MAX_AGE_HOURS = float(os.getenv("FORECAST_MODEL_MAX_AGE_HOURS", "24"))
+FORECAST_VAL_DAYS = int(os.getenv("FORECAST_VAL_DAYS", "7"))
+# lstm | naive | seasonal_naive | holt | ar
+FORECAST_BACKEND = os.getenv("FORECAST_BACKEND", "lstm")
+FORECAST_FALLBACK_BACKEND = os.getenv("FORECAST_FALLBACK_BACKEND", "ar")
+FORECAST_AR_ORDER = int(os.getenv("FORECAST_AR_ORDER", "7"))
+FORECAST_SEASON = int(os.getenv("FORECAST_SEASON", "7"))
+# Days of history pivoted into the forecast matrix (the newest ones)
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "120"))
+
+def tensorflow_available():
+    """True when TensorFlow is installed, checked without importing it."""
+    return importlib.util.find_spec("tensorflow") is not None
 
 # ===== ANOMALY DETECTION =====
 def health_score(row):
+    """Row-wise reference; pipelines use the vectorized health_scores."""
     baseline = row.get("reef_health_baseline", 80)
     dhw = row.get("dhw", 0)
     score = baseline - (row["sst"] * 1.5 + dhw * 5)
@@ -13,6 +40,7 @@ def health_score(row):
 def detect_anomaly(series):
     if len(series) < 2:
         return np.array([False] * len(series))
+    from sklearn.ensemble import IsolationForest
     model = IsolationForest(contamination=0.1)
     preds = model.fit_predict(series.values.reshape(-1, 1))
     return preds == -1
@@ -22,6 +50,11 @@ def build_lstm(input_shape=(30, 1)):
     """
     Build LSTM model for time-series forecasting (SST, pH)
     """
+    # Imported here so that importing ml.model (scheduler, API, light
+    # pipeline) never pays TensorFlow's startup time and memory
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+
     model = Sequential([
         LSTM(64, return_sequences=True, input_shape=input_shape),
         LSTM(32),
@@ -30,35 +63,336 @@ def build_lstm(input_shape=(30, 1)):
     model.compile(optimizer="adam", loss="mse")
     return model
 
-def create_sequences(series, window=30):
+def create_sequences(series, window=30, target=0):
+    """
+    Create sequences for LSTM training as strided views (no copy).
+
+    series: (T,), (T, F) or (S, T, F) -- one or many series, one or many
+    features. Returns X / y of shape (T-window, window) / (T-window,),
+    (T-window, window, F) / (T-window,) or (S, T-window, window, F) /
+    (S, T-window,). y is feature ``target`` one step after each window.
+    X shares memory with ``series``: copy before writing to it.
+    """
+    arr = np.asarray(series)
+    if arr.ndim == 1:
+        if len(arr) <= window:
+            return np.empty((0, window), dtype=arr.dtype), np.empty(0, dtype=arr.dtype)
+        return sliding_window_view(arr[:-1], window), arr[window:]
+
+    time_axis = arr.ndim - 2
+    if arr.shape[time_axis] <= window:
+        lead = arr.shape[:time_axis]
+        return (np.empty(lead + (0, window, arr.shape[-1]), dtype=arr.dtype),
+                np.empty(lead + (0,), dtype=arr.dtype))
+    X = sliding_window_view(arr[..., :-1, :], window, axis=time_axis)
+    # (..., n, F, window) -> (..., n, window, F), still a view
+    X = np.swapaxes(X, -1, -2)
+    y = arr[..., window:, target]
+    return X, y
+
+def iter_sequence_batches(series, window=30, batch_size=256, target=0, shuffle=True, seed=None):
+    """
+    Yield (X, y) training batches drawn from the strided windows of
+    ``series`` ((T,), (T, F) or (S, T, F)). Only one batch is materialized
+    at a time; windows with NaN in inputs or target are skipped.
+    X batches are (b, window, F) float32.
+    """
+    arr = np.asarray(series, dtype="float32")
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    if arr.ndim == 2:
+        arr = arr[None]
+    X, y = create_sequences(arr, window, target)
+    n_series, n_windows = y.shape
+    order = np.arange(n_series * n_windows)
+    if shuffle:
+        np.random.default_rng(seed).shuffle(order)
+
+    for start in range(0, len(order), batch_size):
+        s_idx, w_idx = np.divmod(order[start:start + batch_size], n_windows)
+        Xb, yb = X[s_idx, w_idx], y[s_idx, w_idx]
+        ok = ~(np.isnan(Xb).any(axis=(1, 2)) | np.isnan(yb))
+        if ok.any():
+            yield Xb[ok], yb[ok]
+
+def fit_sequences(model, series, window=30, epochs=10, batch_size=256, target=0, seed=None):
     """
-    Create sequences for LSTM training
+    Fit ``model`` epoch by epoch on batches from iter_sequence_batches,
+    so the full window tensor is never built. Returns the model.
     """
-    X, y = [], []
-    for i in range(len(series) - window):
-        X.append(series[i:i+window])
-        y.append(series[i+window])
-    return np.array(X), np.array(y)
+    for epoch in range(epochs):
+        for Xb, yb in iter_sequence_batches(series, window, batch_size, target, seed=None if seed is None else seed + epoch):
+            model.train_on_batch(Xb, yb)
+    return model
 
 def train_lstm(series, window=30, epochs=10, batch_size=16):
     """
     Train LSTM model on time-series data
     """
-    X, y = create_sequences(series, window=window)
     model = build_lstm(input_shape=(window, 1))
-    model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
-    return model
+    return fit_sequences(model, np.asarray(series, dtype="float32"), window, epochs, batch_size)
 
 def forecast_lstm(model, last_n_values, steps_ahead=7):
     """
     Forecast future values using trained LSTM
     """
-    forecasts = []
-    current_sequence = last_n_values[-30:].reshape(1, 30, 1)
-    
-    for _ in range(steps_ahead):
-        pred = model.predict(current_sequence, verbose=0)
-        forecasts.append(pred[0, 0])
-        current_sequence = np.append(current_sequence[:, 1:, :], [[[pred[0, 0]]]], axis=1)
-    
-    return np.array(forecasts)
+    window = model.input_shape[1]
+    return forecast_batch(model, np.asarray(last_n_values)[-window:][None, :], steps_ahead)[0]
+
+def forecast_batch(model, last_windows, steps_ahead=7, batch_size=4096):
+    """
+    Recursive multi-step forecast for many series at once.
+    last_windows: (n_series, window). Returns (n_series, steps_ahead).
+    One batched forward pass per step instead of one per series per step.
+    """
+    current = np.asarray(last_windows, dtype="float32")
+    out = np.empty((current.shape[0], steps_ahead), dtype="float32")
+    for step in range(steps_ahead):
+        pred = model.predict(current[..., None], batch_size=batch_size, verbose=0)[:, 0]
+        out[:, step] = pred
+        current = np.concatenate([current[:, 1:], pred[:, None]], axis=1)
+    return out
+
+# ===== PER-LOCATION FORECASTING =====
+def load_location_history(engine, variable="ph", days=120):
+    """
+    Per-(lat, lon) daily history of ``variable`` from ocean_metrics.
+    Returns a long DataFrame with date, lat, lon and the variable.
+    """
+    import pandas as pd
+    from sqlalchemy import text
+
+    cutoff = datetime.now().date() - timedelta(days=days)
+    return pd.read_sql(
+        text(
+            f"SELECT date, latitude AS lat, longitude AS lon, {variable} "
+            f"FROM ocean_metrics WHERE date >= :cutoff AND {variable} IS NOT NULL"
+        ),
+        engine,
+        params={"cutoff": cutoff},
+    )
+
+def location_matrix(history, variable="ph", max_days=FORECAST_HISTORY_DAYS):
+    """
+    Pivot long history into a (locations x days) matrix on a complete daily
+    index; short gaps are forward-filled. Only the newest ``max_days`` days
+    are kept, so the matrix stays bounded however far back ``history``
+    goes. Returns (matrix, locations frame).
+    """
+    import pandas as pd
+
+    history = history.assign(date=pd.to_datetime(history["date"]))
+    if max_days:
+        history = history[history["date"] > history["date"].max() - pd.Timedelta(days=max_days)]
+    wide = history.pivot_table(index=["lat", "lon"], columns="date", values=variable, aggfunc="mean")
+    full_days = pd.date_range(wide.columns.min(), wide.columns.max(), freq="D")
+    wide = wide.reindex(columns=full_days).ffill(axis=1, limit=3)
+    return wide.to_numpy(dtype="float32"), wide.index.to_frame(index=False)
+
+def _validation_metrics(model, scaled, window, val_days, mean, std, batch_size):
+    """
+    One-step RMSE/MAE (original units) on windows whose target falls in
+    the last ``val_days`` days, next to a persistence baseline.
+    """
+    X, y = create_sequences(scaled[:, -(window + val_days):], window)
+    X, y = X.reshape(-1, window, scaled.shape[-1]), y.reshape(-1)
+    ok = ~(np.isnan(X).any(axis=(1, 2)) | np.isnan(y))
+    if not ok.any():
+        return {}
+    X, y = X[ok], y[ok]
+    pred = model.predict(X, batch_size=batch_size, verbose=0)[:, 0]
+    err = (pred - y) * std
+    naive = (X[:, -1, 0] - y) * std
+    return {
+        "val_windows": int(len(y)),
+        "val_rmse": float(np.sqrt(np.mean(err ** 2))),
+        "val_mae": float(np.mean(np.abs(err))),
+        "naive_rmse": float(np.sqrt(np.mean(naive ** 2))),
+    }
+
+def lstm_forecast(matrix, horizon, window=30, variable="ph", region="global",
+                  epochs=FORECAST_EPOCHS, batch_size=256, retrain=None, **_):
+    """
+    LSTM backend: one model shared by all locations.
+
+    The model comes from the registry (ml/registry.py) keyed by variable,
+    region and window: a version younger than FORECAST_MODEL_MAX_AGE_HOURS
+    is used as-is (inference only); an older one is warm-started and
+    fine-tuned for FORECAST_FINETUNE_EPOCHS; with none, a model is trained
+    from scratch for ``epochs``. ``retrain=True`` forces training.
+    """
+    out = np.full((matrix.shape[0], horizon), np.nan, dtype="float32")
+    if matrix.shape[1] < window:
+        return out
+
+    key = registry.model_key(variable, region, window)
+    model = build_lstm(input_shape=(window, 1))
+    meta = registry.load_weights(key, model)
+    fresh = registry.is_fresh(meta, FORECAST_MODEL_MAX_AGE_HOURS)
+
+    if meta is not None:
+        # Keep the parent's scaling so warm-started weights stay meaningful
+        mean, std = meta["mean"], meta["std"]
+    else:
+        mean, std = float(np.nanmean(matrix)), float(np.nanstd(matrix)) or 1.0
+    # Windows are strided views over this one (locations x days x 1) array
+    scaled = ((matrix - mean) / std)[:, :, None]
+
+    if retrain or not fresh:
+        if matrix.shape[1] <= window:
+            if meta is None:
+                return out
+        else:
+            n_epochs = epochs if meta is None else FORECAST_FINETUNE_EPOCHS
+            val_days = min(FORECAST_VAL_DAYS, max(matrix.shape[1] - window - 1, 0))
+            train = scaled[:, :scaled.shape[1] - val_days]
+            fit_sequences(model, train, window, epochs=n_epochs, batch_size=batch_size, seed=42)
+            metrics = _validation_metrics(model, scaled, window, val_days, mean, std, batch_size) if val_days else {}
+            version = registry.save(key, model, {
+                "variable": variable,
+                "region": region,
+                "window": window,
+                "mean": mean,
+                "std": std,
+                "epochs": n_epochs,
+                "mode": "full" if meta is None else "finetune",
+                "parent": meta["version"] if meta else None,
+                "locations": int(matrix.shape[0]),
+                "days": int(matrix.shape[1]),
+                "metrics": metrics,
+            })
+            print(f"[forecast] Saved {key} v{version} ({'full' if meta is None else 'fine-tune'}): {metrics}")
+    else:
+        print(f"[forecast] {key} v{meta['version']} is fresh; inference only")
+
+    last = matrix[:, -window:]
+    ready = ~np.isnan(last).any(axis=1)
+    if ready.any():
+        out[ready] = forecast_batch(model, (last[ready] - mean) / std, steps_ahead=horizon) * std + mean
+    return out
+
+# ===== NUMPY FORECASTING =====
+# Closed-form / recursive models vectorized across locations: every
+# backend maps a (locations x days) matrix to (locations x horizon), NaN
+# where a location cannot be forecast. No TensorFlow, milliseconds per
+# thousand cells.
+def naive_forecast(matrix, horizon, **_):
+    """Last observed value carried forward."""
+    return np.repeat(matrix[:, -1:], horizon, axis=1)
+
+def seasonal_naive_forecast(matrix, horizon, season=FORECAST_SEASON, **_):
+    """Value from one season earlier (weekly by default)."""
+    if matrix.shape[1] < season:
+        return naive_forecast(matrix, horizon)
+    return matrix[:, -season:][:, np.arange(horizon) % season]
+
+def holt_forecast(matrix, horizon, alpha=0.5, beta=0.1, phi=0.98, **_):
+    """
+    Damped-trend Holt smoothing. One pass over days, vectorized across
+    locations; missing days advance the state without an update.
+    """
+    n_locations, n_days = matrix.shape
+    observed = ~np.isnan(matrix)
+    first = observed.argmax(axis=1)
+    level = matrix[np.arange(n_locations), first].astype("float64")
+    trend = np.zeros(n_locations)
+    for t in range(n_days):
+        x = matrix[:, t]
+        predicted = level + phi * trend
+        new_level = alpha * x + (1 - alpha) * predicted
+        new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        obs = observed[:, t]
+        level = np.where(obs, new_level, predicted)
+        trend = np.where(obs, new_trend, phi * trend)
+    steps = np.cumsum(phi ** np.arange(1, horizon + 1))
+    return level[:, None] + trend[:, None] * steps[None, :]
+
+def ar_forecast(matrix, horizon, order=FORECAST_AR_ORDER, ridge=1e-3, **_):
+    """
+    AR(p) per location, fitted in closed form: the normal equations of all
+    locations are built with einsum and solved as one batched linear solve
+    (small ridge for stability). Series are centred on their mean.
+    """
+    n_locations, n_days = matrix.shape
+    out = np.full((n_locations, horizon), np.nan)
+    if n_days <= order:
+        return out
+    mu = np.nanmean(np.where(np.isnan(matrix).all(axis=1, keepdims=True), 0, matrix), axis=1)
+    centred = matrix - mu[:, None]
+
+    X, y = create_sequences(centred[:, :, None], order)
+    X = X[..., 0]
+    ok = ~(np.isnan(X).any(axis=2) | np.isnan(y))
+    X = np.where(ok[..., None], X, 0.0)
+    y = np.where(ok, y, 0.0)
+    n_ok = ok.sum(axis=1)
+
+    A = np.einsum("lnp,lnq->lpq", X, X) + ridge * (1 + n_ok)[:, None, None] * np.eye(order)
+    b = np.einsum("lnp,ln->lp", X, y)
+    coef = np.linalg.solve(A, b[..., None])[..., 0]
+
+    hist = centred[:, -order:].astype("float64")
+    for step in range(horizon):
+        nxt = np.einsum("lp,lp->l", hist, coef)
+        out[:, step] = nxt
+        hist = np.concatenate([hist[:, 1:], nxt[:, None]], axis=1)
+    out += mu[:, None]
+    # Too few complete windows for a stable fit
+    out[n_ok <= 2 * order] = np.nan
+    return out
+
+FORECASTERS = {
+    "lstm": lstm_forecast,
+    "naive": naive_forecast,
+    "seasonal_naive": seasonal_naive_forecast,
+    "holt": holt_forecast,
+    "ar": ar_forecast,
+}
+
+def resolve_backend(name=None, allow_lstm=True):
+    """
+    Forecaster name from ``name`` or FORECAST_BACKEND. "lstm" falls back to
+    FORECAST_FALLBACK_BACKEND when TensorFlow is missing or not allowed.
+    """
+    name = (name or FORECAST_BACKEND).lower()
+    if name not in FORECASTERS:
+        raise ValueError(f"Unknown forecast backend {name!r}; choose from {', '.join(FORECASTERS)}")
+    if name == "lstm" and not (allow_lstm and tensorflow_available()):
+        return FORECAST_FALLBACK_BACKEND
+    return name
+
+def forecast_locations(history, variable="ph", window=30, horizon=1, backend=None, region="global", **kwargs):
+    """
+    Forecast ``horizon`` days ahead for every location in ``history`` with
+    the selected backend (see FORECASTERS). Extra keyword arguments go to
+    the backend. Returns a DataFrame with lat, lon and forecast_<variable>.
+    """
+    import pandas as pd
+
+    column = f"forecast_{variable}"
+    empty = pd.DataFrame(columns=["lat", "lon", column])
+    if history.empty:
+        return empty
+
+    matrix, locations = location_matrix(history, variable)
+    if np.isnan(matrix).all():
+        return empty
+
+    backend = resolve_backend(backend)
+    preds = FORECASTERS[backend](matrix, horizon, window=window, variable=variable, region=region, **kwargs)
+    ready = ~np.isnan(preds[:, -1])
+    result = locations[ready].reset_index(drop=True)
+    result[column] = preds[ready, -1]
+    return result
+
+def join_forecasts(frame, forecasts, column="forecast_ph"):
+    """
+    Left-join ``column`` of ``forecasts`` onto ``frame`` on exact (lat, lon).
+    Forecast locations come from the same rows (DB history plus this run),
+    so the coordinates match exactly; a grid join would instead spread each
+    forecast over every cell of the coarser grid it infers from the sparse
+    forecast frame. Rows without a forecast get NaN.
+    """
+    right = forecasts[["lat", "lon", column]].drop_duplicates(subset=["lat", "lon"], keep="last")
+    out = frame.drop(columns=[column], errors="ignore")
+    return out.merge(right, on=["lat", "lon"], how="left")
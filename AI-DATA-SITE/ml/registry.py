@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import glob
+from datetime import datetime, timezone
+
+# ===== CONFIG =====
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGISTRY_DIR = os.getenv("FORECAST_MODEL_DIR", os.path.join(BASE_DIR, "models", "forecast"))
+KEEP_VERSIONS = int(os.getenv("FORECAST_KEEP_VERSIONS", "5"))
+
+
+# ===== KEYS =====
+def model_key(variable, region="global", window=30):
+    """Registry key for one forecasting model: variable / region / window."""
+    safe_region = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(region)) or "global"
+    return os.path.join(variable, safe_region, f"w{int(window)}")
+
+
+def _dir(key):
+    return os.path.join(REGISTRY_DIR, key)
+
+
+# ===== VERSIONED FILES =====
+# Shared with ml/anomaly.py: each version is an artifact file plus a JSON
+# metadata file, <prefix><version:04d><suffix> and <prefix><version:04d>.json
+def version_paths(directory, version, suffix, prefix="v"):
+    """(artifact path, metadata path) of ``version`` in ``directory``."""
+    stem = os.path.join(directory, f"{prefix}{version:04d}")
+    return stem + suffix, stem + ".json"
+
+
+def list_versions(directory, prefix="v"):
+    """Saved version numbers in ``directory``, oldest first."""
+    found = []
+    for p in glob.glob(os.path.join(directory, f"{prefix}*.json")):
+        try:
+            found.append(int(os.path.basename(p)[len(prefix):-len(".json")]))
+        except ValueError:
+            continue
+    return sorted(found)
+
+
+def load_version(directory, suffix, version=None, prefix="v"):
+    """
+    (artifact path, metadata) of ``version`` (default: the newest); None
+    when there is no such version or its artifact is missing.
+    """
+    if version is None:
+        found = list_versions(directory, prefix)
+        if not found:
+            return None
+        version = found[-1]
+    artifact, meta_path = version_paths(directory, version, suffix, prefix)
+    if not os.path.exists(artifact) or not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return artifact, json.load(f)
+
+
+def save_version(directory, write, meta, suffix, keep, prefix="v"):
+    """
+    Save the next version: ``write(path)`` persists the artifact, then
+    ``meta`` (plus version and trained_at) is written next to it. Versions
+    beyond the ``keep`` newest are deleted. Returns the saved metadata.
+    """
+    os.makedirs(directory, exist_ok=True)
+    found = list_versions(directory, prefix)
+    version = (found[-1] + 1) if found else 1
+    meta = dict(meta, version=version)
+    meta.setdefault("trained_at", datetime.now(timezone.utc).isoformat())
+    artifact, meta_path = version_paths(directory, version, suffix, prefix)
+    write(artifact)
+    # metadata last: a version only counts once its JSON exists
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=1)
+
+    for old in found[:-keep + 1] if keep > 1 else found:
+        for p in version_paths(directory, old, suffix, prefix):
+            if os.path.exists(p):
+                os.remove(p)
+    return meta
+
+
+# ===== FORECAST MODELS =====
+# Keras 3 insists on the .weights.h5 suffix for save_weights
+WEIGHTS_SUFFIX = ".weights.h5"
+
+
+def _weights_path(key, version):
+    return version_paths(_dir(key), version, WEIGHTS_SUFFIX)[0]
+
+
+def versions(key):
+    return list_versions(_dir(key))
+
+
+# ===== READ =====
+def latest(key):
+    """Metadata of the newest saved version of ``key``; None if there is none."""
+    found = load_version(_dir(key), WEIGHTS_SUFFIX)
+    return found[1] if found else None
+
+
+def load_meta(key, version):
+    found = load_version(_dir(key), WEIGHTS_SUFFIX, version)
+    return found[1] if found else None
+
+
+def load_weights(key, model, version=None):
+    """
+    Load saved weights into ``model`` (built with the same architecture).
+    Returns the version's metadata, or None when nothing is saved.
+    """
+    meta = latest(key) if version is None else load_meta(key, version)
+    if meta is None:
+        return None
+    model.load_weights(_weights_path(key, meta["version"]))
+    return meta
+
+
+def age_hours(meta):
+    trained_at = datetime.fromisoformat(meta["trained_at"])
+    return (datetime.now(timezone.utc) - trained_at).total_seconds() / 3600
+
+
+def is_fresh(meta, max_age_hours):
+    """True when ``meta`` was trained less than ``max_age_hours`` ago."""
+    return meta is not None and age_hours(meta) < max_age_hours
+
+
+# ===== WRITE =====
+def save(key, model, meta):
+    """
+    Persist ``model`` weights with ``meta`` as the next version of ``key``
+    and prune old versions. Returns the new version number.
+    """
+    saved = save_version(_dir(key), model.save_weights, dict(meta, key=key), WEIGHTS_SUFFIX, KEEP_VERSIONS)
+    return saved["version"]
@@ -0,0 +1,34 @@
+import numpy as np
+
+# ===== HEALTH SCORE =====
+DEFAULT_BASELINE = 80
+DEFAULT_DHW = 0
+
+
+def health_scores(df):
+    """
+    Vectorized reef health score for every row of ``df``:
+    baseline - (sst * 1.5 + dhw * 5), floored at 0.
+
+    Same semantics as the row-wise ``ml.model.health_score``: a missing
+    ``reef_health_baseline`` column means 80, a missing ``dhw`` column
+    means 0, and NaN inputs give NaN.
+    """
+    if "reef_health_baseline" in df.columns:
+        baseline = df["reef_health_baseline"].to_numpy(dtype=float)
+    else:
+        baseline = DEFAULT_BASELINE
+    if "dhw" in df.columns:
+        dhw = df["dhw"].to_numpy(dtype=float)
+    else:
+        dhw = DEFAULT_DHW
+    if "sst" in df.columns:
+        sst = df["sst"].to_numpy(dtype=float)
+    else:
+        sst = 0.0
+
+    score = baseline - (sst * 1.5 + dhw * 5)
+    # np.fmax would turn NaN into 0; keep NaN like max(nan, 0) does
+    score = np.where(score < 0, 0.0, score)
+    import pandas as pd
+    return pd.Series(score, index=df.index, name="health_score")
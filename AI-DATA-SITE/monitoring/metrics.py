@@ -13,6 +13,10 @@ pipeline_fetch_retries = Counter('ai_pipeline_fetch_retries_total', 'Total retri
 pipeline_fetch_failures = Counter('ai_pipeline_fetch_failures_total', 'Total fetch failures (all retries exhausted)', ['source'])
 pipeline_fetch_success_rate = Gauge('ai_pipeline_fetch_success_rate', 'Success rate of fetches (0-100)', ['source'])
 
+# Write metrics
+pipeline_rows_written = Counter('ai_pipeline_rows_written_total', 'Rows upserted into ocean_metrics')
+pipeline_write_rows_per_second = Gauge('ai_pipeline_write_rows_per_second', 'Throughput of the last ocean_metrics bulk upsert')
+
 def configure_from_env():
     # placeholder for future config
     return {
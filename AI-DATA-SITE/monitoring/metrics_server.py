@@ -2,7 +2,6 @@ import time
 import os
 import sys
 from prometheus_client import start_http_server, Gauge, Info
-import sqlite3
 from datetime import datetime, timedelta
 
 # ensure project root is on path for imports
@@ -23,54 +22,25 @@ ph_last_day = Gauge('ocean_ph_last_day', 'pH last day', ['day'])
 health_last_day = Gauge('ocean_health_last_day', 'Health score last day', ['day'])
 
 def update_ocean_metrics():
-    """Query DB and update Prometheus gauges with ocean data and trends"""
+    """Update Prometheus gauges with ocean data and trends from the daily rollups"""
     try:
-        db_path = 'ocean_demo.db'
-        if not os.path.exists(db_path):
-            return
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get latest averages (global)
-        cursor.execute('''
-            SELECT 
-                AVG(sst) as avg_sst,
-                AVG(ph) as avg_ph,
-                AVG(health_score) as avg_health,
-                COUNT(*) as total_records
-            FROM ocean_metrics
-        ''')
-        
-        row = cursor.fetchone()
-        if row:
-            avg_sst, avg_ph, avg_health, total = row
-            avg_sst_gauge.set(avg_sst if avg_sst else 0)
-            avg_ph_gauge.set(avg_ph if avg_ph else 0)
-            avg_health_gauge.set(avg_health if avg_health else 0)
-            record_count_gauge.set(total if total else 0)
-        
-        # Get last 3 days of data (daily averages)
-        cursor.execute('''
-            SELECT 
-                date,
-                AVG(sst) as daily_sst,
-                AVG(ph) as daily_ph,
-                AVG(health_score) as daily_health
-            FROM ocean_metrics
-            GROUP BY date
-            ORDER BY date DESC
-            LIMIT 3
-        ''')
-        
-        days_data = cursor.fetchall()
-        for row in days_data:
-            date_str, daily_sst, daily_ph, daily_health = row
-            sst_last_day.labels(day=date_str).set(daily_sst if daily_sst else 0)
-            ph_last_day.labels(day=date_str).set(daily_ph if daily_ph else 0)
-            health_last_day.labels(day=date_str).set(daily_health if daily_health else 0)
-        
-        conn.close()
+        import backend.database as db
+        from backend import rollups
+
+        with db.engine.connect() as conn:
+            # Global averages
+            stats = rollups.summary(conn)
+            avg_sst_gauge.set(stats["sst"]["mean"] or 0)
+            avg_ph_gauge.set(stats["ph"]["mean"] or 0)
+            avg_health_gauge.set(stats["health_score"]["mean"] or 0)
+            record_count_gauge.set(stats["row_count"])
+
+            # Last 3 days of data (daily averages)
+            for day in rollups.daily(conn, limit=3):
+                date_str = str(day["date"])
+                sst_last_day.labels(day=date_str).set(day["sst"]["mean"] or 0)
+                ph_last_day.labels(day=date_str).set(day["ph"]["mean"] or 0)
+                health_last_day.labels(day=date_str).set(day["health_score"]["mean"] or 0)
     except Exception as e:
         print(f"Error updating metrics: {e}")
 
@@ -0,0 +1,237 @@
+"""
+Download manager for large raw inputs (NOAA CRW NetCDF files).
+
+- bodies are streamed to ``<path>.part`` and atomically renamed, so a
+  finished ``path`` is always complete
+- an interrupted transfer resumes from the ``.part`` file with HTTP Range,
+  made conditional with If-Range on the ETag / Last-Modified saved next to
+  it (``<path>.part.json``): if the remote file changed, the server sends
+  it whole (200) and the download starts over instead of splicing two
+  versions together
+- size (Content-Length / Content-Range) and optional checksum are validated
+  before the rename
+- connections, backoff, Retry-After and per-host limits come from the
+  shared client in pipeline/http_client.py
+- ``download_many`` / ``adownload_file`` run several files concurrently
+"""
+import os
+import json
+import asyncio
+import hashlib
+import time
+
+from pipeline.http_client import (
+    RETRY_STATUSES,
+    get_session,
+    host_slot,
+    backoff_delay,
+    parse_retry_after,
+    retry_reason,
+    record_fetch,
+    record_retry,
+    record_failure,
+    gather,
+    run,
+)
+
+CHUNK_SIZE = 1 << 20
+
+
+class DownloadError(Exception):
+    """Raised when a transfer cannot be completed or fails validation."""
+
+    def __init__(self, message, retry=True, reason="validation", retry_after=None):
+        super().__init__(message)
+        self.retry = retry
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _file_digest(path, algo):
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def verify_file(path, expected_size=None, checksum=None):
+    """
+    Check ``path`` against an expected byte size and/or a checksum given as
+    ``"<algo>:<hexdigest>"`` (e.g. ``"sha256:ab12..."``). Raises DownloadError.
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and size != expected_size:
+        raise DownloadError(f"{path}: size {size} != expected {expected_size}")
+    if checksum:
+        algo, _, expected = checksum.partition(":")
+        actual = _file_digest(path, algo)
+        if actual.lower() != expected.lower():
+            raise DownloadError(f"{path}: {algo} {actual} != expected {expected}")
+
+
+def _total_size(resp, offset):
+    """Full size of the remote file from Content-Range / Content-Length."""
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length) + (offset if resp.status_code == 206 else 0)
+    return None
+
+
+def _validators_path(part):
+    return f"{part}.json"
+
+
+def _load_validators(part):
+    try:
+        with open(_validators_path(part)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_validators(part, resp):
+    with open(_validators_path(part), "w") as f:
+        json.dump({"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}, f)
+
+
+def _discard_part(part):
+    for p in (part, _validators_path(part)):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def _if_range(validators):
+    """If-Range value: a strong ETag, else Last-Modified (weak ETags are not allowed)."""
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def _transfer(url, part, timeout, params=None, headers=None, meta=None):
+    """
+    One attempt: stream ``url`` into ``part``, resuming from its current
+    size. Returns the expected total size (None if the server did not say).
+    ``headers`` (e.g. conditional If-None-Match) are only sent on a fresh
+    start; response validators are recorded in ``meta``.
+
+    A resume sends Range with If-Range set to the validator saved when the
+    ``.part`` was started. A ``.part`` without one cannot be resumed safely
+    and is started over.
+    """
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if_range = _if_range(_load_validators(part)) if offset else None
+    if offset and not if_range:
+        _discard_part(part)
+        offset = 0
+    if offset:
+        req_headers = {"Range": f"bytes={offset}-", "If-Range": if_range}
+    else:
+        req_headers = dict(headers or {})
+
+    with host_slot(url), get_session().get(url, params=params, headers=req_headers, stream=True, timeout=timeout) as r:
+        if meta is not None:
+            meta["etag"] = r.headers.get("ETag")
+            meta["last_modified"] = r.headers.get("Last-Modified")
+        if r.status_code == 304 and meta is not None:
+            meta["not_modified"] = True
+            return None
+        if r.status_code == 416 and offset:
+            # The range starts at or past the end of the remote file. A .part
+            # that long cannot be resumed nor shown to match it: start over
+            total = _total_size(r, 0)
+            if total is None or offset >= total:
+                _discard_part(part)
+                raise DownloadError(f"HTTP 416 with {offset} bytes on disk", reason="http_416")
+            return total
+        if r.status_code not in (200, 206):
+            raise DownloadError(
+                f"HTTP {r.status_code}",
+                retry=r.status_code in RETRY_STATUSES,
+                reason=retry_reason(status=r.status_code),
+                retry_after=parse_retry_after(r.headers.get("Retry-After")),
+            )
+
+        # 200 means the server ignored Range or If-Range failed (the file
+        # changed): start over, remembering the new validators
+        mode = "ab" if r.status_code == 206 else "wb"
+        if r.status_code == 200:
+            _save_validators(part, r)
+        total = _total_size(r, offset)
+        with open(part, mode) as f:
+            for block in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(block)
+    return total
+
+
+def download_file(url, path, expected_size=None, checksum=None, timeout=60,
+                  max_retries=3, source="noaa", params=None, headers=None, meta=None):
+    """
+    Download ``url`` to ``path`` (streamed, resumable, validated, atomic).
+    Returns True on success, False once retries are exhausted. An existing
+    ``path`` is trusted: only validated transfers are ever renamed into it.
+
+    With conditional ``headers`` and a ``meta`` dict, a 304 answer returns
+    True with ``meta["not_modified"]`` set and nothing written.
+    """
+    if os.path.exists(path):
+        return True
+
+    record_fetch(source)
+
+    part = f"{path}.part"
+    for attempt in range(max_retries):
+        retry_after = None
+        total = None
+        try:
+            total = _transfer(url, part, timeout, params=params, headers=headers, meta=meta)
+            if meta is not None and meta.get("not_modified"):
+                return True
+            verify_file(part, expected_size=expected_size or total, checksum=checksum)
+            os.replace(part, path)
+            _discard_part(part)
+            return True
+        except DownloadError as e:
+            reason = e.reason
+            retry_after = e.retry_after
+            print(f"[downloads] {url}: {e}")
+            if not e.retry:
+                break
+            # A short .part is resumed on the next attempt; a checksum
+            # mismatch or a file longer than the expected size (or the
+            # server's total) cannot be, so start over.
+            limit = expected_size or total
+            if os.path.exists(part) and (checksum or (limit and os.path.getsize(part) > limit)):
+                _discard_part(part)
+        except Exception as e:
+            # Dropped mid-body: the .part file keeps what arrived
+            reason = retry_reason(exc=e)
+            print(f"[downloads] {url}: {type(e).__name__}: {e}")
+
+        if attempt < max_retries - 1:
+            record_retry(source, reason)
+            wait_time = backoff_delay(attempt, retry_after)
+            print(f"[downloads] {reason}, resuming in {wait_time:.1f}s...")
+            time.sleep(wait_time)
+
+    record_failure(source)
+    return False
+
+
+async def adownload_file(url, path, **kwargs):
+    """asyncio wrapper: the transfer runs on a worker thread."""
+    return await asyncio.to_thread(download_file, url, path, **kwargs)
+
+
+def download_many(jobs):
+    """
+    Run blocking callables concurrently and return their results keyed like
+    ``jobs`` ({name: zero-arg callable}). A job that raises maps to None.
+    """
+    return run(gather({name: asyncio.to_thread(fn) for name, fn in jobs.items()}))
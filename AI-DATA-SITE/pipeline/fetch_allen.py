@@ -1,76 +1,39 @@
 import os
-import requests
+import re
+import time
+import hashlib
+import asyncio
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import shapely.geometry as geom
 from pathlib import Path
 from dotenv import load_dotenv
-import time
 
-# Try to import metrics; if not available, create no-op stubs
-try:
-    from monitoring.metrics import pipeline_fetches_total, pipeline_fetch_retries, pipeline_fetch_failures
-    _metrics_available = True
-except ImportError:
-    _metrics_available = False
-    pipeline_fetches_total = None
-    pipeline_fetch_retries = None
-    pipeline_fetch_failures = None
-
-def _retry_get(url, params=None, headers=None, timeout=60, max_retries=3, backoff_factor=2, source="allen"):
-    """HTTP GET with exponential backoff retry logic and metrics."""
-    if _metrics_available and pipeline_fetches_total:
-        pipeline_fetches_total.labels(source=source).inc()
-    
-    for attempt in range(max_retries):
-        try:
-            r = requests.get(url, params=params, headers=headers, timeout=timeout)
-            if r.status_code == 200:
-                return r
-            elif r.status_code in (429, 503):  # Too Many Requests, Service Unavailable
-                if attempt < max_retries - 1:
-                    if _metrics_available and pipeline_fetch_retries:
-                        pipeline_fetch_retries.labels(source=source, reason=f"http_{r.status_code}").inc()
-                    wait_time = backoff_factor ** attempt
-                    print(f"[fetch] HTTP {r.status_code}, retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-            return None
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason="timeout").inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch] Timeout, retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-        except requests.exceptions.ConnectionError:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason="connection_error").inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch] Connection error, retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-        except Exception as e:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason=type(e).__name__).inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch] Error ({type(e).__name__}), retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-    
-    # All retries exhausted
-    if _metrics_available and pipeline_fetch_failures:
-        pipeline_fetch_failures.labels(source=source).inc()
-    return None
+from pipeline import http_client
+from pipeline.geojson_stream import iter_features, iter_feature_batches
 
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Reef polygons change rarely: a cached tile is reused for this long before
+# asking the server again
+ALLEN_CACHE_SECONDS = float(os.getenv("ALLEN_CACHE_SECONDS", str(7 * 86400)))
+ALLEN_CACHE_DIR = os.getenv("ALLEN_CACHE_DIR", os.path.join(BASE_DIR, "cache", "allen"))
+# Tiles sit on a fixed grid so cache keys are stable between runs
+ALLEN_TILE_DEG = float(os.getenv("ALLEN_TILE_DEG", "1.0"))
+ALLEN_MAX_TILES = int(os.getenv("ALLEN_MAX_TILES", "256"))
+# Features per WFS page (startIndex/maxFeatures); 0 disables paging
+ALLEN_PAGE_SIZE = int(os.getenv("ALLEN_WFS_PAGE_SIZE", "1000"))
+# Hard stop for servers that never return a short page
+ALLEN_MAX_PAGES = int(os.getenv("ALLEN_WFS_MAX_PAGES", "200"))
+# WFS 1.0.0 has no standard ordering, so startIndex pages are only stable
+# when the server sorts them (GeoServer accepts sortBy as a vendor
+# parameter). Without it a page may repeat or skip features; repeats are
+# dropped by fid, skipped ones are lost until the tile is refetched.
+ALLEN_SORT_BY = os.getenv("ALLEN_WFS_SORT_BY", "").strip()
+
 def _parse_bbox(bbox_str):
     try:
         parts = [float(x) for x in bbox_str.split(",")]
@@ -80,15 +43,6 @@ def _parse_bbox(bbox_str):
         pass
     return None
 
-def _compute_bbox_from_noaa(noaa_df, pad=0.1):
-    if noaa_df is None or noaa_df.empty:
-        return None
-    minx = float(noaa_df["lon"].min()) - pad
-    maxx = float(noaa_df["lon"].max()) + pad
-    miny = float(noaa_df["lat"].min()) - pad
-    maxy = float(noaa_df["lat"].max()) + pad
-    return [minx, miny, maxx, maxy]
-
 def _fallback_gdf():
     return gpd.GeoDataFrame(
         pd.DataFrame({
@@ -99,19 +53,79 @@ def _fallback_gdf():
         crs="EPSG:4326"
     )
 
-def fetch_allen_coral_atlas(noaa_df=None):
+# ===== TILING =====
+def _tiles_for_bbox(bbox, tile_deg):
+    minx, miny, maxx, maxy = bbox
+    xs = np.arange(np.floor(minx / tile_deg), np.ceil(maxx / tile_deg))
+    ys = np.arange(np.floor(miny / tile_deg), np.ceil(maxy / tile_deg))
+    return {(int(i), int(j)) for i in xs for j in ys}
+
+
+def _tiles_for_points(noaa_df, tile_deg, pad):
+    """Only tiles that hold NOAA cells (with a ``pad`` halo) are requested."""
+    # NOAA repeats each cell once per day: shift the distinct cells only
+    points = np.unique(noaa_df[["lon", "lat"]].to_numpy(dtype=float), axis=0)
+    tiles = set()
+    for dx in (-pad, 0.0, pad):
+        for dy in (-pad, 0.0, pad):
+            i = np.floor((points[:, 0] + dx) / tile_deg).astype(int)
+            j = np.floor((points[:, 1] + dy) / tile_deg).astype(int)
+            tiles.update(zip(i.tolist(), j.tolist()))
+    return tiles
+
+
+def plan_tiles(bbox=None, noaa_df=None, pad=0.1):
     """
-    Fetch Allen Coral Atlas reef polygons via WFS (GeoJSON).
-    Returns a GeoDataFrame with reef polygons and attributes.
+    Grid-aligned tiles (i, j) to fetch plus their edge in degrees. The tile
+    edge doubles until at most ALLEN_MAX_TILES remain; point tiles are
+    computed once and merged (floor(i / 2) is the tile twice as wide).
     """
-    wfs_url = os.getenv("ALLEN_WFS_URL", "").strip()
-    layer = os.getenv("ALLEN_WFS_LAYER", "").strip()
-    bbox_env = os.getenv("ALLEN_WFS_BBOX", "").strip()
+    tile_deg = ALLEN_TILE_DEG
+    tiles = None
+    while True:
+        if bbox:
+            tiles = _tiles_for_bbox(bbox, tile_deg)
+        elif tiles is None:
+            tiles = _tiles_for_points(noaa_df, tile_deg, pad)
+        else:
+            tiles = {(i // 2, j // 2) for i, j in tiles}
+        if len(tiles) <= ALLEN_MAX_TILES or tile_deg >= 180:
+            return sorted(tiles), tile_deg
+        tile_deg *= 2
 
-    if not wfs_url or not layer:
-        return _fallback_gdf()
 
-    bbox = _parse_bbox(bbox_env) or _compute_bbox_from_noaa(noaa_df)
+def _tile_bbox(tile, tile_deg):
+    i, j = tile
+    return [i * tile_deg, j * tile_deg, (i + 1) * tile_deg, (j + 1) * tile_deg]
+
+
+# ===== TILE CACHE =====
+def _tile_path(layer, tile, tile_deg):
+    safe_layer = re.sub(r"[^A-Za-z0-9_.-]", "_", layer)
+    key = "global" if tile is None else f"{tile_deg:g}_{tile[0]}_{tile[1]}"
+    return os.path.join(ALLEN_CACHE_DIR, safe_layer, f"{key}.parquet")
+
+
+def _read_cached_tile(path):
+    """Cached tile if fresh (None when missing or older than ALLEN_CACHE_SECONDS)."""
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > ALLEN_CACHE_SECONDS:
+        return None
+    try:
+        return gpd.read_parquet(path)
+    except Exception as e:
+        print(f"[fetch_allen] Unreadable tile cache {path}: {type(e).__name__}")
+        return None
+
+
+def _write_cached_tile(path, gdf):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    gdf.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+# ===== WFS =====
+def _wfs_params(layer, bbox):
     params = {
         "service": "WFS",
         "version": "1.0.0",
@@ -122,24 +136,126 @@ def fetch_allen_coral_atlas(noaa_df=None):
     }
     if bbox:
         params["bbox"] = f"{bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]}"
+    if ALLEN_SORT_BY:
+        params["sortBy"] = ALLEN_SORT_BY
+    return params
+
+
+def _parse_page(r):
+    """
+    Stream one WFS response into GeoDataFrame batches (feature ids kept
+    in ``fid`` so polygons spanning several tiles dedupe). Returns
+    (batches, feature_count, ids, sha256 of the body). Runs on a worker
+    thread.
+    """
+    batches, ids, count = [], set(), 0
+    digest = hashlib.sha256()
+
+    def chunks():
+        for chunk in r.iter_content(chunk_size=1 << 16):
+            digest.update(chunk)
+            yield chunk
+
+    with r:
+        for batch in iter_feature_batches(iter_features(chunks())):
+            batches.append(batch)
+            count += len(batch)
+            ids.update(batch["fid"].dropna())
+    return batches, count, ids, digest.hexdigest()
+
+
+async def _afetch_tile(wfs_url, layer, bbox):
+    """
+    All features of ``layer`` inside ``bbox``, paged with startIndex /
+    maxFeatures (ordered by ALLEN_SORT_BY when set). Stops on a short page,
+    when the server ignores paging and repeats a page (same body as the
+    previous one, or only ids already seen), or after ALLEN_MAX_PAGES
+    pages. Returns None if any page fails.
+    """
+    params = _wfs_params(layer, bbox)
+    frames = []
+    seen = set()
+    previous = None
+    start = 0
+    for _ in range(ALLEN_MAX_PAGES):
+        if ALLEN_PAGE_SIZE:
+            params.update(startIndex=start, maxFeatures=ALLEN_PAGE_SIZE)
+        r = await http_client.aget(wfs_url, params=params, timeout=60, max_retries=3, source="allen", stream=True)
+        if r is None:
+            return None
+        batches, count, ids, digest = await asyncio.to_thread(_parse_page, r)
+        if digest == previous or (count and ids and ids <= seen):
+            break
+        previous = digest
+        seen |= ids
+        frames.extend(batches)
+        if not ALLEN_PAGE_SIZE or count < ALLEN_PAGE_SIZE:
+            break
+        start += ALLEN_PAGE_SIZE
+    else:
+        print(f"[fetch_allen] Stopped paging {layer} {bbox} after {ALLEN_MAX_PAGES} pages")
+
+    if not frames:
+        return gpd.GeoDataFrame({"fid": []}, geometry=[], crs="EPSG:4326")
+    return pd.concat(frames, ignore_index=True)
+
+
+async def _aload_tile(wfs_url, layer, tile, tile_deg):
+    path = _tile_path(layer, tile, tile_deg)
+    # Parquet I/O blocks: keep it off the event loop the other tiles share
+    gdf = await asyncio.to_thread(_read_cached_tile, path)
+    if gdf is not None:
+        return gdf
+    bbox = None if tile is None else _tile_bbox(tile, tile_deg)
+    gdf = await _afetch_tile(wfs_url, layer, bbox)
+    if gdf is not None:
+        await asyncio.to_thread(_write_cached_tile, path, gdf)
+    return gdf
+
+
+def _dedupe(gdf):
+    if "fid" in gdf.columns and gdf["fid"].notna().all():
+        return gdf.drop_duplicates(subset="fid").reset_index(drop=True)
+    return gdf.loc[~gdf.geometry.to_wkb().duplicated()].reset_index(drop=True)
+
+
+def fetch_allen_coral_atlas(noaa_df=None):
+    """
+    Fetch Allen Coral Atlas reef polygons via WFS (GeoJSON).
+    Returns a GeoDataFrame with reef polygons and attributes.
+
+    The area is split into grid-aligned tiles fetched concurrently (each
+    paged with startIndex/maxFeatures) and every tile is cached as
+    GeoParquet, so repeat runs within ALLEN_CACHE_SECONDS stay offline.
+    """
+    wfs_url = os.getenv("ALLEN_WFS_URL", "").strip()
+    layer = os.getenv("ALLEN_WFS_LAYER", "").strip()
+    bbox_env = os.getenv("ALLEN_WFS_BBOX", "").strip()
+
+    if not wfs_url or not layer:
+        return _fallback_gdf()
+
+    bbox = _parse_bbox(bbox_env)
+    if bbox or (noaa_df is not None and not noaa_df.empty):
+        tiles, tile_deg = plan_tiles(bbox=bbox, noaa_df=noaa_df)
+    else:
+        tiles, tile_deg = [None], None
 
     try:
-        r = _retry_get(
-            wfs_url,
-            params=params,
-            headers={"User-Agent": "AI-Ocean-Data-Site/1.0"},
-            timeout=60,
-            max_retries=3
-        )
-        if r is None or r.status_code != 200:
-            if r:
-                print("Allen WFS status:", r.status_code)
-                print("Allen WFS response:", r.text[:300])
+        results = http_client.run(http_client.gather({
+            tile: _aload_tile(wfs_url, layer, tile, tile_deg) for tile in tiles
+        }))
+        failed = sum(1 for g in results.values() if g is None)
+        if failed:
+            print(f"[fetch_allen] {failed}/{len(tiles)} tiles failed")
+        if failed == len(tiles):
             return _fallback_gdf()
 
-        data = r.json()
-        gdf = gpd.GeoDataFrame.from_features(data["features"], crs="EPSG:4326")
-        return gdf
+        frames = [g for g in results.values() if g is not None and not g.empty]
+        if not frames:
+            return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+        gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+        return _dedupe(gdf)
     except Exception as e:
         print(f"WARNING: Allen Coral Atlas WFS failed: {type(e).__name__}")
         return _fallback_gdf()
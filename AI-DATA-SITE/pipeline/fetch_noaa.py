@@ -1,73 +1,21 @@
 import os
-import requests
-import xarray as xr
 import pandas as pd
 from datetime import date, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
-import time
-
-# Try to import metrics; if not available, create no-op stubs
-try:
-    from monitoring.metrics import pipeline_fetches_total, pipeline_fetch_retries, pipeline_fetch_failures
-    _metrics_available = True
-except ImportError:
-    _metrics_available = False
-    pipeline_fetches_total = None
-    pipeline_fetch_retries = None
-    pipeline_fetch_failures = None
-
-def _retry_get(url, timeout=60, max_retries=3, backoff_factor=2, source="noaa"):
-    """Download URL with exponential backoff retry logic and metrics."""
-    if _metrics_available and pipeline_fetches_total:
-        pipeline_fetches_total.labels(source=source).inc()
-    
-    for attempt in range(max_retries):
-        try:
-            r = requests.get(url, timeout=timeout)
-            if r.status_code == 200:
-                return r
-            elif r.status_code in (429, 503):  # Too Many Requests, Service Unavailable
-                if attempt < max_retries - 1:
-                    if _metrics_available and pipeline_fetch_retries:
-                        pipeline_fetch_retries.labels(source=source, reason=f"http_{r.status_code}").inc()
-                    wait_time = backoff_factor ** attempt
-                    print(f"[fetch_noaa] HTTP {r.status_code}, retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-            return None
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason="timeout").inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch_noaa] Timeout, retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-        except requests.exceptions.ConnectionError:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason="connection_error").inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch_noaa] Connection error, retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-        except Exception as e:
-            if attempt < max_retries - 1:
-                if _metrics_available and pipeline_fetch_retries:
-                    pipeline_fetch_retries.labels(source=source, reason=type(e).__name__).inc()
-                wait_time = backoff_factor ** attempt
-                print(f"[fetch_noaa] Error ({type(e).__name__}), retrying in {wait_time}s...")
-                time.sleep(wait_time)
-                continue
-            return None
-    
-    # All retries exhausted
-    if _metrics_available and pipeline_fetch_failures:
-        pipeline_fetch_failures.labels(source=source).inc()
-    return None
+
+from pipeline import raw_cache
+from pipeline.downloads import download_many
+from pipeline.grid_reader import (
+    open_grid,
+    find_var,
+    tile_shape,
+    region_windows,
+    read_window,
+    align_grids,
+    iter_ocean_tiles,
+    default_roi,
+)
 
 load_dotenv(Path(__file__).resolve().parents[1] / ".env")
 
@@ -84,49 +32,103 @@ def _candidate_dates(days_back=3):
     today = date.today()
     return [today - timedelta(days=i) for i in range(days_back)]
 
-def _download(url, path):
-    if os.path.exists(path):
-        return True
-    r = _retry_get(url, timeout=60, max_retries=3)
-    if r is not None:
-        try:
-            with open(path, "wb") as f:
-                f.write(r.content)
-            return True
-        except Exception as e:
-            print(f"[fetch_noaa] Error writing {path}: {e}")
-    return False
-
-def _download_latest(base_url, fname_tmpl, prefix):
+def _download_latest(base_url, fname_tmpl):
+    # Files land in the managed raw cache (see pipeline/raw_cache.py); an
+    # unchanged day is served locally or revalidated with a 304.
     for d in _candidate_dates():
         fname = fname_tmpl.format(date=d.strftime("%Y%m%d"))
         url = f"{base_url}/{d.year}/{fname}"
-        path = f"{prefix}_{d.strftime('%Y%m%d')}.nc"
-        if _download(url, path):
+        path = raw_cache.fetch(url, data_date=d, timeout=60, max_retries=3, source="noaa")
+        if path:
             return path, d
     return None, None
 
-def _find_col(df, candidates):
-    for c in candidates:
-        if c in df.columns:
-            return c
-    return None
-
-def fetch_noaa_crw():
-    """
-    Fetch NOAA CRW daily SST (CoralTemp) + DHW.
-    """
+def _download_sst():
     # SST (CoralTemp) file name format:
     # coraltemp_v3.1_YYYYMMDD.nc
-    sst_path, sst_date = _download_latest(
-        SST_BASE, "coraltemp_v3.1_{date}.nc", "NOAA_SST"
-    )
+    return _download_latest(SST_BASE, "coraltemp_v3.1_{date}.nc")
 
+def _download_dhw():
     # DHW file name format:
     # ct5km_dhw_v3.1_YYYYMMDD.nc
-    dhw_path, _ = _download_latest(
-        DHW_BASE, "ct5km_dhw_v3.1_{date}.nc", "NOAA_DHW"
-    )
+    return _download_latest(DHW_BASE, "ct5km_dhw_v3.1_{date}.nc")
+
+# Local pH file used when NOAA_PH_URL is not set
+PH_PATH = "NOAA_PH_FILE.nc"
+
+def _download_ph():
+    ph_url = os.getenv("NOAA_PH_URL", "")
+    if ph_url:
+        path = raw_cache.fetch(ph_url, ext=".nc", timeout=30, max_retries=3, source="noaa")
+        if path:
+            return path
+    return PH_PATH if os.path.exists(PH_PATH) else None
+
+def prefetch_noaa_inputs():
+    """
+    Download SST, DHW and pH concurrently so the later fetch_* calls find
+    them on disk. Returns {"sst": (path, date), "dhw": (path, date), "ph": path}.
+    """
+    return download_many({"sst": _download_sst, "dhw": _download_dhw, "ph": _download_ph})
+
+SST_VARS = ["sst", "analysed_sst", "sea_surface_temperature"]
+DHW_VARS = ["dhw", "degree_heating_week"]
+
+def iter_noaa_crw_tiles(sst_path, dhw_path=None, sst_date=None, tile_deg=None, bboxes=None, reef_mask=None):
+    """
+    Stream NOAA CRW SST (+ DHW) as per-tile DataFrames of ocean cells.
+    Columns: lat, lon, sst, dhw, date. One tile is decoded at a time;
+    ``bboxes`` / ``reef_mask`` limit the read to a region of interest.
+    """
+    ds_sst = open_grid(sst_path)
+    ds_dhw = open_grid(dhw_path) if dhw_path and os.path.exists(dhw_path) else None
+    try:
+        sst_var = find_var(ds_sst, SST_VARS)
+        if not sst_var:
+            raise RuntimeError("Could not find SST variable in NOAA SST dataset")
+        dhw_var = find_var(ds_dhw, DHW_VARS) if ds_dhw is not None else None
+
+        # SST and DHW share the CRW grid, so DHW is read from the same index
+        # window as SST; a mismatching grid is reported and index-mapped.
+        joins = ()
+        if dhw_var:
+            joins = ((ds_dhw, {"dhw": dhw_var}, align_grids(ds_sst, ds_dhw, name="DHW")),)
+
+        shape = tile_shape(ds_sst, sst_var, tile_deg)
+        for lat_sl, lon_sl, roi in region_windows(ds_sst, shape, bboxes, reef_mask):
+            df = read_window(ds_sst, {"sst": sst_var}, lat_sl, lon_sl, roi, joins=joins)
+            if df.empty:
+                continue
+            if not dhw_var:
+                df["dhw"] = 0.0
+            df["date"] = sst_date or date.today()
+            yield df
+    finally:
+        ds_sst.close()
+        if ds_dhw is not None:
+            ds_dhw.close()
+
+def fetch_noaa_crw(bboxes=None, reef_mask=None, files=None):
+    """
+    Fetch NOAA CRW daily SST (CoralTemp) + DHW.
+    Files are read tile by tile (see iter_noaa_crw_tiles); land and fill
+    cells never reach pandas. The ocean cells of every tile are returned
+    as one DataFrame, since the pipelines need them all at once (Allen tile
+    choice, anomaly scoring, forecast history), so memory grows with the
+    region of interest, not with the grid. Without an explicit ``bboxes`` /
+    ``reef_mask`` the region of interest comes from NOAA_ROI_BBOX /
+    NOAA_REEF_MASK.
+
+    ``files`` is the result of prefetch_noaa_inputs(); without it the SST
+    and DHW files are downloaded here.
+    """
+    if bboxes is None and reef_mask is None:
+        bboxes, reef_mask = default_roi()
+
+    if files is None:
+        files = download_many({"sst": _download_sst, "dhw": _download_dhw})
+    sst_path, sst_date = files.get("sst") or (None, None)
+    dhw_path, _ = files.get("dhw") or (None, None)
 
     if not sst_path or not os.path.exists(sst_path):
         # fallback demo data
@@ -140,50 +142,22 @@ def fetch_noaa_crw():
             }
         )
 
-    ds_sst = xr.open_dataset(sst_path, engine="h5netcdf")
-    df_sst = ds_sst.to_dataframe().reset_index()
+    tiles = list(iter_noaa_crw_tiles(sst_path, dhw_path, sst_date=sst_date, bboxes=bboxes, reef_mask=reef_mask))
+    if not tiles:
+        return pd.DataFrame(columns=["lat", "lon", "sst", "dhw", "date"])
+    return pd.concat(tiles, ignore_index=True)
 
-    # Find sst variable name safely
-    sst_col = _find_col(df_sst, ["sst", "analysed_sst", "sea_surface_temperature"])
-    if not sst_col:
-        raise RuntimeError("Could not find SST variable in NOAA SST dataset")
-
-    df_sst = df_sst[["lat", "lon", sst_col]].rename(columns={sst_col: "sst"})
-    df_sst["date"] = sst_date or date.today()
-
-    # DHW
-    if dhw_path and os.path.exists(dhw_path):
-        ds_dhw = xr.open_dataset(dhw_path,engine="h5netcdf")
-        df_dhw = ds_dhw.to_dataframe().reset_index()
-        dhw_col = _find_col(df_dhw, ["dhw", "degree_heating_week"])
-        if dhw_col:
-            df_dhw = df_dhw[["lat", "lon", dhw_col]].rename(columns={dhw_col: "dhw"})
-            df_sst = df_sst.merge(df_dhw, on=["lat", "lon"], how="left")
-
-    # Default if missing
-    if "dhw" not in df_sst.columns:
-        df_sst["dhw"] = 0.0
-
-    return df_sst
-
-def fetch_noaa_ph():
+def fetch_noaa_ph(bboxes=None, reef_mask=None, files=None):
     """
     Fetch pH data (optional; still fallback to demo if missing).
+    Region of interest and ``files`` work as in fetch_noaa_crw.
     """
-    ph_path = "NOAA_PH_FILE.nc"
-    ph_url = os.getenv("NOAA_PH_URL", "")
+    if bboxes is None and reef_mask is None:
+        bboxes, reef_mask = default_roi()
+
+    ph_path = files.get("ph") if files is not None else _download_ph()
 
-    if ph_url and not os.path.exists(ph_path):
-        r = _retry_get(ph_url, timeout=30, max_retries=3)
-        if r is not None:
-            try:
-                with open(ph_path, "wb") as f:
-                    f.write(r.content)
-            except Exception as e:
-                print(f"[fetch_noaa_ph] Error writing {ph_path}: {e}")
-                pass
-
-    if not os.path.exists(ph_path):
+    if not ph_path:
         return pd.DataFrame(
             {
                 "lat": [6.5, 6.6, 6.7],
@@ -193,8 +167,9 @@ def fetch_noaa_ph():
             }
         )
 
-    ph_ds = xr.open_dataset(ph_path,engine="h5netcdf")
-    ph_df = ph_ds.to_dataframe().reset_index()
-    ph_df = ph_df[["lat", "lon", "ph"]]
+    tiles = list(iter_ocean_tiles(ph_path, {"ph": ["ph"]}, bboxes=bboxes, reef_mask=reef_mask))
+    if not tiles:
+        return pd.DataFrame(columns=["lat", "lon", "ph", "date"])
+    ph_df = pd.concat(tiles, ignore_index=True)
     ph_df["date"] = date.today()
     return ph_df
@@ -0,0 +1,157 @@
+"""
+Incremental GeoJSON FeatureCollection parser.
+
+``json.loads`` on a large WFS response holds the raw text and the whole
+dict tree at once. Here the body is consumed chunk by chunk: each element of
+the ``features`` array is decoded as soon as it is complete, and features
+are turned into GeoDataFrames ``batch_size`` at a time, so peak memory is
+one batch plus one network chunk (plus the feature being read, when it
+spans chunks).
+
+Features wholly inside the buffer are decoded in place. One that runs
+past the end of a chunk is not retried on every chunk: its end is found by
+tracking brace depth outside strings, which carries over chunk boundaries,
+and it is decoded once complete, so the work stays linear however the body
+is chunked.
+"""
+import re
+import json
+import codecs
+import geopandas as gpd
+import shapely.geometry as geom
+
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+TOKENS = re.compile(r'[{}"\\]')
+BATCH_SIZE = 5000
+
+
+class GeoJSONStreamError(ValueError):
+    """Raised when the features array is malformed or the stream ends inside it."""
+
+
+def _scan(buf, i, depth, in_str, esc):
+    """
+    Track object depth over ``buf[i:]``, jumping between the only characters
+    that matter (braces, quotes, backslashes), so coordinates are skipped
+    by the regex engine. Returns (end, depth, in_str, esc): ``end`` is the
+    index just past the brace that closes the feature, or None when it is
+    still open at the end of ``buf``.
+    """
+    skip = i + 1 if esc else i
+    for m in TOKENS.finditer(buf, i):
+        j = m.start()
+        if j < skip:
+            continue
+        c = buf[j]
+        if in_str:
+            if c == "\\":
+                skip = j + 2
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return j + 1, 0, False, False
+    return None, depth, in_str, skip > len(buf)
+
+
+def iter_features(chunks):
+    """Yield feature dicts from an iterable of bytes (or str) chunks."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    in_array = False
+    # A feature split across chunks: its earlier pieces and the scan state
+    pending = []
+    depth, in_str, esc = 0, False, False
+
+    def more(chunk):
+        return utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    chunks = iter(chunks)
+    exhausted = False
+    while True:
+        if not in_array:
+            m = FEATURES_START.search(buf)
+            if m:
+                in_array = True
+                buf = buf[m.end():]
+                continue
+            # Keep a tail in case the key is split across chunks
+            buf = buf[-64:]
+        else:
+            pos = start = 0
+            while True:
+                if not depth:
+                    # Skip separators up to the next feature
+                    while pos < len(buf) and buf[pos] in " \t\r\n,":
+                        pos += 1
+                    if pos == len(buf):
+                        break
+                    if buf[pos] == "]":
+                        return
+                    if buf[pos] != "{":
+                        raise GeoJSONStreamError(f"Expected a feature object, got {buf[pos]!r}")
+                    start = pos
+                    # Common case: the whole feature is already in buf
+                    try:
+                        feature, end = decoder.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        pass
+                    else:
+                        yield feature
+                        pos = end
+                        continue
+                end, depth, in_str, esc = _scan(buf, pos, depth, in_str, esc)
+                if end is None:
+                    pending.append(buf[start:])
+                    break
+                text = "".join(pending) + buf[start:end]
+                pending = []
+                try:
+                    feature = json.loads(text)
+                except json.JSONDecodeError as e:
+                    raise GeoJSONStreamError(f"Malformed GeoJSON feature: {e}")
+                yield feature
+                pos = end
+            buf = ""
+
+        if exhausted:
+            if not in_array:
+                return
+            if depth:
+                raise GeoJSONStreamError("Truncated GeoJSON feature")
+            raise GeoJSONStreamError("GeoJSON stream ended inside the features array")
+        try:
+            buf += more(next(chunks))
+        except StopIteration:
+            buf += utf8.decode(b"", final=True)
+            exhausted = True
+
+
+def iter_feature_batches(features, batch_size=BATCH_SIZE, crs="EPSG:4326"):
+    """
+    Group features into GeoDataFrames of at most ``batch_size`` rows. The
+    WFS feature id is kept in an ``fid`` column.
+    """
+    geoms, props, fids = [], [], []
+    for f in features:
+        g = f.get("geometry")
+        geoms.append(geom.shape(g) if g else None)
+        props.append(f.get("properties") or {})
+        fids.append(f.get("id"))
+        if len(geoms) >= batch_size:
+            yield _batch(geoms, props, fids, crs)
+            geoms, props, fids = [], [], []
+    if geoms:
+        yield _batch(geoms, props, fids, crs)
+
+
+def _batch(geoms, props, fids, crs):
+    gdf = gpd.GeoDataFrame(props, geometry=geoms, crs=crs)
+    gdf["fid"] = fids
+    return gdf
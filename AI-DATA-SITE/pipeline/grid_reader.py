@@ -0,0 +1,410 @@
+"""
+Lazy, tiled reader for gridded NetCDF products (NOAA CRW 5 km).
+
+Calling ``to_dataframe()`` on a global 5 km file materializes every cell of
+every variable, land and fill values included. The helpers here keep the
+dataset lazy and pull one lat/lon tile at a time, dropping non-ocean cells
+before anything becomes a DataFrame, so only one tile of the grid is
+decoded at once. Callers that collect every tile still hold all the ocean
+cells of their region of interest.
+
+A region of interest (bbox list and/or a precomputed boolean reef mask) is
+resolved to index windows up front, so cells outside it are never decoded.
+
+Products on the same grid (CRW SST + DHW, pH) are combined by cell index,
+never by hashing float lat/lon pairs.
+"""
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Tile edge in degrees. Unset -> follow the file's on-disk chunking, which
+# avoids decompressing the same HDF5 chunk once per tile.
+TILE_DEG = os.getenv("NOAA_TILE_DEG", "").strip()
+DEFAULT_TILE_DEG = 10.0
+
+# CRW pixel flag array: 0 = valid-water, 1 = land, 2 = missing, 4 = ice
+WATER_FLAG = 0
+
+REEF_BUFFER_DEG = float(os.getenv("NOAA_REEF_BUFFER_DEG", "0.05"))
+
+# Grid origin for integer cell keys on DataFrames (CRW 5 km cells start at
+# the south-west corner of the globe)
+GRID_ORIGIN = (-90.0, -180.0)
+
+
+def open_grid(path, engine="h5netcdf"):
+    """Open a NetCDF file lazily (no variable data is read yet)."""
+    return xr.open_dataset(path, engine=engine)
+
+
+def find_var(ds, candidates):
+    for c in candidates:
+        if c in ds.data_vars:
+            return c
+    return None
+
+
+def _resolution(coord):
+    values = coord.values
+    if values.size < 2:
+        return None
+    return abs(float(values[1]) - float(values[0]))
+
+
+def tile_shape(ds, var_name, tile_deg=None):
+    """Return (lat_cells, lon_cells) per tile."""
+    if tile_deg is None and TILE_DEG:
+        tile_deg = float(TILE_DEG)
+
+    if tile_deg is None:
+        chunks = ds[var_name].encoding.get("preferred_chunks") or {}
+        if "lat" in chunks and "lon" in chunks:
+            return int(chunks["lat"]), int(chunks["lon"])
+        tile_deg = DEFAULT_TILE_DEG
+
+    shape = []
+    for dim in ("lat", "lon"):
+        res = _resolution(ds[dim])
+        shape.append(max(1, int(round(tile_deg / res))) if res else ds.sizes[dim])
+    return tuple(shape)
+
+
+def iter_windows(ds, shape, region=None):
+    """
+    Yield (lat_slice, lon_slice) index windows covering ``region`` (a pair of
+    index slices) or the whole grid.
+    """
+    lat_region, lon_region = region or (slice(0, ds.sizes["lat"]), slice(0, ds.sizes["lon"]))
+    step_lat, step_lon = shape
+    for i in range(lat_region.start, lat_region.stop, step_lat):
+        for j in range(lon_region.start, lon_region.stop, step_lon):
+            yield (
+                slice(i, min(i + step_lat, lat_region.stop)),
+                slice(j, min(j + step_lon, lon_region.stop)),
+            )
+
+
+# ===== REGION OF INTEREST =====
+def parse_bboxes(bbox_str):
+    """
+    Parse "minx,miny,maxx,maxy[;...]" into a list of bboxes. A box with
+    minx > maxx crosses the antimeridian and is split in two.
+    """
+    bboxes = []
+    for part in (bbox_str or "").split(";"):
+        try:
+            minx, miny, maxx, maxy = [float(x) for x in part.split(",")]
+        except ValueError:
+            continue
+        bboxes.extend(split_antimeridian([minx, miny, maxx, maxy]))
+    return bboxes
+
+
+def split_antimeridian(bbox):
+    """[bbox], or its two halves when minx > maxx (it crosses the antimeridian)."""
+    minx, miny, maxx, maxy = bbox
+    if minx > maxx:
+        return [[minx, miny, 180.0, maxy], [-180.0, miny, maxx, maxy]]
+    return [[minx, miny, maxx, maxy]]
+
+
+def _index_range(coord, lo, hi):
+    idx = np.nonzero((coord >= lo) & (coord <= hi))[0]
+    if not idx.size:
+        return None
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+
+def bbox_region(ds, bbox):
+    """
+    Index slices (lat, lon) of the cells inside ``bbox``, or None. A bbox
+    crossing the antimeridian is two regions: pass each half from
+    ``split_antimeridian``.
+    """
+    minx, miny, maxx, maxy = bbox
+    if minx > maxx:
+        raise ValueError(
+            f"bbox {list(bbox)} crosses the antimeridian (minx > maxx); split it with split_antimeridian()"
+        )
+    lat_sl = _index_range(ds["lat"].values, miny, maxy)
+    lon_sl = _index_range(ds["lon"].values, minx, maxx)
+    if lat_sl is None or lon_sl is None:
+        return None
+    return lat_sl, lon_sl
+
+
+def build_reef_mask(ds, reefs, buffer_deg=REEF_BUFFER_DEG):
+    """
+    Boolean (lat, lon) DataArray on the grid of ``ds``: True for cells within
+    ``buffer_deg`` of a reef geometry in the GeoDataFrame ``reefs``. Each
+    geometry is only tested against the cells of its own bounding box.
+    """
+    import shapely
+
+    lat = ds["lat"].values
+    lon = ds["lon"].values
+    mask = np.zeros((lat.size, lon.size), dtype=bool)
+
+    geoms = shapely.buffer(np.asarray(reefs.geometry.values), buffer_deg)
+    for g in geoms:
+        if g is None or g.is_empty:
+            continue
+        minx, miny, maxx, maxy = g.bounds
+        lat_sl = _index_range(lat, miny, maxy)
+        lon_sl = _index_range(lon, minx, maxx)
+        if lat_sl is None or lon_sl is None:
+            continue
+        yy, xx = np.meshgrid(lat[lat_sl], lon[lon_sl], indexing="ij")
+        mask[lat_sl, lon_sl] |= shapely.contains_xy(g, xx, yy)
+
+    return xr.DataArray(mask, coords={"lat": lat, "lon": lon}, dims=("lat", "lon"), name="reef_mask")
+
+
+def save_reef_mask(mask, path):
+    np.savez_compressed(path, lat=mask["lat"].values, lon=mask["lon"].values, mask=mask.values)
+
+
+def load_reef_mask(path):
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        return xr.DataArray(
+            f["mask"], coords={"lat": f["lat"], "lon": f["lon"]}, dims=("lat", "lon"), name="reef_mask"
+        )
+
+
+def _mask_on_grid(ds, reef_mask):
+    """Return ``reef_mask`` as a numpy array on the grid of ``ds``."""
+    lat = ds["lat"].values
+    lon = ds["lon"].values
+    if (
+        reef_mask.shape == (lat.size, lon.size)
+        and np.allclose(reef_mask["lat"].values, lat)
+        and np.allclose(reef_mask["lon"].values, lon)
+    ):
+        return reef_mask.values
+    # Different grid (e.g. pH product): nearest-cell lookup
+    return reef_mask.sel(lat=lat, lon=lon, method="nearest").values
+
+
+def region_windows(ds, shape, bboxes=None, reef_mask=None):
+    """
+    Yield (lat_slice, lon_slice, roi) windows restricted to the region of
+    interest. ``roi`` is the boolean mask of ROI cells in the window (in a
+    bbox and, with a reef mask, on it), or None when nothing restricts the
+    read. Overlapping bboxes are merged into one mask, so every cell is
+    yielded once. Windows without any ROI cell are never yielded.
+    """
+    if reef_mask is None and not bboxes:
+        for lat_sl, lon_sl in iter_windows(ds, shape):
+            yield lat_sl, lon_sl, None
+        return
+
+    mask = _mask_on_grid(ds, reef_mask) if reef_mask is not None else None
+    if bboxes:
+        in_bbox = np.zeros((ds.sizes["lat"], ds.sizes["lon"]), dtype=bool)
+        for b in bboxes:
+            for half in split_antimeridian(b):
+                region = bbox_region(ds, half)
+                if region is not None:
+                    in_bbox[region] = True
+        mask = in_bbox if mask is None else mask & in_bbox
+
+    rows = np.nonzero(mask.any(axis=1))[0]
+    cols = np.nonzero(mask.any(axis=0))[0]
+    if not rows.size:
+        return
+    region = (slice(int(rows[0]), int(rows[-1]) + 1), slice(int(cols[0]), int(cols[-1]) + 1))
+    for lat_sl, lon_sl in iter_windows(ds, shape, region):
+        roi = mask[lat_sl, lon_sl]
+        if roi.any():
+            yield lat_sl, lon_sl, roi
+
+
+def default_roi():
+    """
+    (bboxes, reef_mask) configured via NOAA_ROI_BBOX
+    ("minx,miny,maxx,maxy;...") and NOAA_REEF_MASK (an .npz written by
+    scripts/build_reef_mask.py). Read at call time so .env is honoured.
+    """
+    bboxes = parse_bboxes(os.getenv("NOAA_ROI_BBOX", "").strip())
+    return bboxes or None, load_reef_mask(os.getenv("NOAA_REEF_MASK", "").strip())
+
+
+def _as_2d(da):
+    if "time" in da.dims:
+        da = da.isel(time=0)
+    return da.transpose("lat", "lon").values
+
+
+# ===== GRID ALIGNMENT =====
+def grid_mismatch(ds, other):
+    """Describe how the lat/lon grid of ``other`` differs from ``ds`` (None if identical)."""
+    for dim in ("lat", "lon"):
+        a = ds[dim].values
+        b = other[dim].values
+        if a.shape != b.shape:
+            return f"{dim}: {a.size} vs {b.size} cells"
+        if not np.allclose(a, b, atol=1e-6):
+            return f"{dim}: coordinates differ by up to {np.abs(a - b).max():.4g}"
+    return None
+
+
+def align_index(src, dst, tol=None):
+    """
+    For each coordinate in ``src``, the index of the nearest cell in ``dst``,
+    or -1 when none lies within ``tol`` (default: half a ``dst`` grid step).
+    """
+    src = np.asarray(src, dtype=float)
+    dst = np.asarray(dst, dtype=float)
+    if tol is None:
+        tol = (abs(dst[1] - dst[0]) / 2) if dst.size > 1 else np.inf
+
+    order = np.argsort(dst)
+    ordered = dst[order]
+    pos = np.searchsorted(ordered, src).clip(1, max(ordered.size - 1, 1))
+    left = ordered[pos - 1]
+    right = ordered[np.minimum(pos, ordered.size - 1)]
+    nearest = np.where(np.abs(src - left) <= np.abs(src - right), pos - 1, pos)
+    idx = order[np.minimum(nearest, ordered.size - 1)]
+    idx[np.abs(dst[idx] - src) > tol] = -1
+    return idx
+
+
+def align_grids(ds, other, name="dataset"):
+    """
+    Prepare ``other`` to be read alongside ``ds``. Returns None when the
+    grids are identical (windows are shared as-is); otherwise a pair of
+    integer index arrays mapping each lat/lon of ``ds`` onto ``other``.
+    Mismatches are reported.
+    """
+    problem = grid_mismatch(ds, other)
+    if problem is None:
+        return None
+    print(f"[grid_reader] Grid mismatch for {name}: {problem}; aligning by nearest cell index")
+    return align_index(ds["lat"].values, other["lat"].values), align_index(ds["lon"].values, other["lon"].values)
+
+
+def _read_joined(other, var_map, alignment, lat_sl, lon_sl, ii, jj):
+    """Values of ``var_map`` in ``other`` at cells (ii, jj) of a primary window."""
+    if alignment is None:
+        sub = other.isel(lat=lat_sl, lon=lon_sl)
+        return {out: _as_2d(sub[name])[ii, jj] for out, name in var_map.items()}
+
+    lat_idx = alignment[0][lat_sl][ii]
+    lon_idx = alignment[1][lon_sl][jj]
+    valid = (lat_idx >= 0) & (lon_idx >= 0)
+    values = {out: np.full(ii.size, np.nan) for out in var_map}
+    if valid.any():
+        r0, r1 = lat_idx[valid].min(), lat_idx[valid].max() + 1
+        c0, c1 = lon_idx[valid].min(), lon_idx[valid].max() + 1
+        sub = other.isel(lat=slice(r0, r1), lon=slice(c0, c1))
+        for out, name in var_map.items():
+            values[out][valid] = _as_2d(sub[name])[lat_idx[valid] - r0, lon_idx[valid] - c0]
+    return values
+
+
+def read_window(ds, var_map, lat_sl, lon_sl, roi=None, joins=()):
+    """
+    Load one window of ``var_map`` ({output column: dataset variable}) and
+    return its ocean cells as a DataFrame with lat, lon and one column per
+    variable. A cell is kept when the first variable is finite, the pixel is
+    flagged as water (if the file carries a CRW ``mask``) and it lies inside
+    ``roi`` (if given).
+
+    ``joins`` is a sequence of (other_ds, var_map, alignment) whose variables
+    are added as columns for the kept cells (NaN where ``other`` has none);
+    ``alignment`` comes from align_grids.
+    """
+    sub = ds.isel(lat=lat_sl, lon=lon_sl)
+    lat = sub["lat"].values
+    lon = sub["lon"].values
+
+    arrays = {out: _as_2d(sub[name]) for out, name in var_map.items()}
+    keep = np.isfinite(next(iter(arrays.values())))
+    if "mask" in sub.data_vars:
+        keep &= _as_2d(sub["mask"]) == WATER_FLAG
+    if roi is not None:
+        keep &= roi
+
+    ii, jj = np.nonzero(keep)
+    data = {"lat": lat[ii], "lon": lon[jj]}
+    for out, arr in arrays.items():
+        data[out] = arr[ii, jj]
+    for other, other_vars, alignment in joins:
+        data.update(_read_joined(other, other_vars, alignment, lat_sl, lon_sl, ii, jj))
+    return pd.DataFrame(data)
+
+
+def infer_resolution(df):
+    """Smallest positive lat/lon step in ``df`` (None if it cannot be told)."""
+    steps = []
+    for col in ("lat", "lon"):
+        values = np.unique(df[col].to_numpy(dtype=float))
+        diffs = np.diff(values)
+        diffs = diffs[diffs > 1e-9]
+        if diffs.size:
+            steps.append(diffs.min())
+    return float(min(steps)) if steps else None
+
+
+def cell_keys(lat, lon, res, origin=GRID_ORIGIN):
+    """Integer cell id of each lat/lon on a regular ``res``-degree grid."""
+    # The epsilon keeps points sitting on a cell edge (6.6 / 0.1 -> 65.999...)
+    # in the same cell regardless of float representation error.
+    eps = 1e-6
+    n_cols = int(np.ceil(360.0 / res)) + 1
+    rows = np.floor((np.asarray(lat, dtype=float) - origin[0]) / res + eps).astype(np.int64)
+    cols = np.floor((np.asarray(lon, dtype=float) - origin[1]) / res + eps).astype(np.int64)
+    return rows * n_cols + cols
+
+
+def grid_join(left, right, value_cols, res=None, on=("date",)):
+    """
+    Left-join ``value_cols`` of ``right`` onto ``left`` by grid cell (plus
+    the ``on`` columns both frames carry). Both sides are reduced to integer
+    cell ids on a common grid -- the coarser of the two unless ``res`` is
+    given -- so float lat/lon are never used as join keys. ``right`` cells
+    are averaged when several fall into one cell.
+    """
+    if res is None:
+        res_left, res_right = infer_resolution(left), infer_resolution(right)
+        if res_left and res_right and not np.isclose(res_left, res_right):
+            print(f"[grid_reader] Grid mismatch: {res_left:.4g} vs {res_right:.4g} deg; joining on the coarser grid")
+        res = max([r for r in (res_left, res_right) if r] or [0.05])
+
+    keys = [c for c in on if c in left.columns and c in right.columns]
+    value_cols = [c for c in value_cols if c in right.columns]
+
+    right = right[keys + value_cols].assign(_cell=cell_keys(right["lat"], right["lon"], res))
+    right = right.groupby(["_cell"] + keys, sort=False)[value_cols].mean().reset_index()
+
+    out = left.drop(columns=[c for c in value_cols if c in left.columns])
+    out = out.assign(_cell=cell_keys(left["lat"], left["lon"], res))
+    out = out.merge(right, on=["_cell"] + keys, how="left")
+    return out.drop(columns="_cell")
+
+
+def iter_ocean_tiles(path, var_candidates, tile_deg=None, bboxes=None, reef_mask=None, engine="h5netcdf"):
+    """
+    Stream a gridded NetCDF file as per-tile DataFrames of ocean cells.
+
+    ``var_candidates`` maps output column -> candidate variable names, e.g.
+    ``{"sst": ["sst", "analysed_sst"]}``. ``bboxes`` / ``reef_mask`` restrict
+    the read to a region of interest. Empty tiles are skipped.
+    """
+    with open_grid(path, engine=engine) as ds:
+        var_map = {}
+        for out, candidates in var_candidates.items():
+            name = find_var(ds, candidates)
+            if not name:
+                raise RuntimeError(f"Could not find {out} variable in {path}")
+            var_map[out] = name
+
+        shape = tile_shape(ds, next(iter(var_map.values())), tile_deg)
+        for lat_sl, lon_sl, roi in region_windows(ds, shape, bboxes, reef_mask):
+            df = read_window(ds, var_map, lat_sl, lon_sl, roi)
+            if not df.empty:
+                yield df
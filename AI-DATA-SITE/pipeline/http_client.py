@@ -0,0 +1,289 @@
+"""
+Shared HTTP client for the fetch stage (NOAA, Allen WFS).
+
+- one pooled ``requests.Session`` (keep-alive) for the whole process
+- full-jitter exponential backoff, capped; ``Retry-After`` wins when sent
+- one per-host concurrency limit shared by threads and asyncio tasks
+- ``aget`` / ``gather`` let several sources and dates be in flight at once
+  without a new dependency: requests run on worker threads, backoff waits
+  with ``asyncio.sleep`` instead of blocking
+
+Every logical fetch feeds the pipeline_fetches_total /
+pipeline_fetch_retries / pipeline_fetch_failures counters.
+"""
+import os
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Try to import metrics; if not available, create no-op stubs
+try:
+    from monitoring.metrics import pipeline_fetches_total, pipeline_fetch_retries, pipeline_fetch_failures
+    _metrics_available = True
+except ImportError:
+    _metrics_available = False
+    pipeline_fetches_total = None
+    pipeline_fetch_retries = None
+    pipeline_fetch_failures = None
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "4"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", "60"))
+USER_AGENT = "AI-Ocean-Data-Site/1.0"
+
+# Statuses worth retrying; anything else non-2xx is final
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session (keep-alive across files and retries)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["User-Agent"] = USER_AGENT
+            _session = s
+        return _session
+
+
+# ===== METRICS =====
+def record_fetch(source):
+    if _metrics_available and pipeline_fetches_total:
+        pipeline_fetches_total.labels(source=source).inc()
+
+
+def record_retry(source, reason):
+    if _metrics_available and pipeline_fetch_retries:
+        pipeline_fetch_retries.labels(source=source, reason=reason).inc()
+
+
+def record_failure(source):
+    if _metrics_available and pipeline_fetch_failures:
+        pipeline_fetch_failures.labels(source=source).inc()
+
+
+# ===== RETRY POLICY =====
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None, base=None, cap=None):
+    """
+    Delay before retry number ``attempt`` (0-based): the server's
+    Retry-After when given (still capped), else full jitter over
+    ``base * 2**attempt``.
+    """
+    base = BACKOFF_BASE if base is None else base
+    cap = BACKOFF_CAP if cap is None else cap
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_reason(exc=None, status=None):
+    if status is not None:
+        return f"http_{status}"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return "connection_error"
+    return type(exc).__name__
+
+
+# ===== PER-HOST LIMITS =====
+_host_locks = {}
+_host_locks_guard = threading.Lock()
+_loop_semaphores = weakref.WeakKeyDictionary()
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def _host_semaphore(url):
+    with _host_locks_guard:
+        return _host_locks.setdefault(_host(url), threading.BoundedSemaphore(MAX_PER_HOST))
+
+
+def _loop_semaphore(loop, url):
+    sems = _loop_semaphores.setdefault(loop, {})
+    return sems.setdefault(_host(url), asyncio.Semaphore(MAX_PER_HOST))
+
+
+@contextmanager
+def host_slot(url):
+    """
+    Hold one of MAX_PER_HOST slots for the URL's host. Process-wide: every
+    request, threaded or from ``aget``, goes through it, so a host never
+    sees more than MAX_PER_HOST requests at once.
+    """
+    with _host_semaphore(url):
+        yield
+
+
+def _release_on_close(r, release):
+    """
+    Make ``r.close()`` (and so ``with r:``) also call ``release``, once.
+    A streamed body is still being read from the host after ``get``
+    returns, so its slot is held until the response is closed.
+    """
+    close = r.close
+    once = threading.Lock()
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if once.acquire(blocking=False):
+                release()
+
+    r.close = close_and_release
+    return r
+
+
+# ===== REQUESTS =====
+def _attempt(url, params, headers, timeout, stream):
+    sem = _host_semaphore(url)
+    sem.acquire()
+    try:
+        r = get_session().get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+    except BaseException:
+        sem.release()
+        raise
+    if not stream:
+        sem.release()
+        return r
+    return _release_on_close(r, sem.release)
+
+
+async def _aattempt(url, params, headers, timeout, stream):
+    """
+    ``_attempt`` on a worker thread. Tasks queue per host first, so tasks
+    waiting for ``host_slot`` never tie up the thread pool (nor the threads
+    that would read and close the streamed bodies holding it). A streamed
+    response keeps both slots until it is closed.
+    """
+    loop = asyncio.get_running_loop()
+    sem = _loop_semaphore(loop, url)
+    await sem.acquire()
+    try:
+        r = await asyncio.to_thread(_attempt, url, params, headers, timeout, stream)
+    except BaseException:
+        sem.release()
+        raise
+    if not stream:
+        sem.release()
+        return r
+
+    def release():
+        # Closed on whichever thread reads the body
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(sem.release)
+
+    return _release_on_close(r, release)
+
+
+def get(url, params=None, headers=None, timeout=60, max_retries=3, source="noaa", stream=False):
+    """
+    Blocking GET with the shared retry policy. Returns the 200 response,
+    or None on a final error status or once retries are exhausted. With
+    ``stream=True`` the body is left unread and the caller closes it,
+    which also frees the host slot the request holds.
+    """
+    record_fetch(source)
+    for attempt in range(max_retries):
+        retry_after = None
+        try:
+            r = _attempt(url, params, headers, timeout, stream)
+            if r.status_code == 200:
+                return r
+            r.close()
+            if r.status_code not in RETRY_STATUSES:
+                print(f"[http] {url}: HTTP {r.status_code}")
+                return None
+            reason = retry_reason(status=r.status_code)
+            retry_after = parse_retry_after(r.headers.get("Retry-After"))
+        except Exception as e:
+            reason = retry_reason(exc=e)
+
+        if attempt < max_retries - 1:
+            record_retry(source, reason)
+            wait_time = backoff_delay(attempt, retry_after)
+            print(f"[http] {reason}, retrying in {wait_time:.1f}s...")
+            time.sleep(wait_time)
+
+    record_failure(source)
+    return None
+
+
+async def aget(url, params=None, headers=None, timeout=60, max_retries=3, source="noaa", stream=False):
+    """asyncio version of ``get``: waits never block the event loop."""
+    record_fetch(source)
+    for attempt in range(max_retries):
+        retry_after = None
+        try:
+            r = await _aattempt(url, params, headers, timeout, stream)
+            if r.status_code == 200:
+                return r
+            r.close()
+            if r.status_code not in RETRY_STATUSES:
+                print(f"[http] {url}: HTTP {r.status_code}")
+                return None
+            reason = retry_reason(status=r.status_code)
+            retry_after = parse_retry_after(r.headers.get("Retry-After"))
+        except Exception as e:
+            reason = retry_reason(exc=e)
+
+        if attempt < max_retries - 1:
+            record_retry(source, reason)
+            wait_time = backoff_delay(attempt, retry_after)
+            print(f"[http] {reason}, retrying in {wait_time:.1f}s...")
+            await asyncio.sleep(wait_time)
+
+    record_failure(source)
+    return None
+
+
+async def gather(jobs):
+    """
+    Await ``jobs`` ({name: awaitable}) concurrently and return results keyed
+    the same way; a job that raises maps to None.
+    """
+    names = list(jobs)
+    results = await asyncio.gather(*(jobs[n] for n in names), return_exceptions=True)
+    out = {}
+    for name, res in zip(names, results):
+        if isinstance(res, Exception):
+            print(f"[http] {name} failed: {type(res).__name__}: {res}")
+            res = None
+        out[name] = res
+    return out
+
+
+def run(coro):
+    """Run a coroutine from synchronous pipeline code."""
+    return asyncio.run(coro)
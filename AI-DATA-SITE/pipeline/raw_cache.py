@@ -0,0 +1,234 @@
+"""
+Content-addressed local cache for raw input files (NOAA NetCDF).
+
+Files live under ``RAW_CACHE_DIR/objects/<sha256[:2]>/<sha256><ext>`` and
+``manifest.json`` maps each source URL to its object together with the data
+date, size, hash, HTTP validators (ETag / Last-Modified) and last access.
+
+- entries younger than ``RAW_CACHE_REVALIDATE_SECONDS`` are served as-is;
+  older ones are revalidated with If-None-Match / If-Modified-Since, so an
+  unchanged day costs one 304 instead of a re-download
+- after every insert, entries unused for ``RAW_CACHE_MAX_AGE_DAYS`` are
+  dropped, then least recently used ones until the cache fits in
+  ``RAW_CACHE_MAX_BYTES``
+"""
+import os
+import json
+import hashlib
+import shutil
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+
+from pipeline.downloads import download_file
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A relative RAW_CACHE_DIR (as in .env.example) is taken from the project
+# root, not the working directory, so the API, scheduler and scripts agree
+CACHE_DIR = os.path.join(BASE_DIR, os.getenv("RAW_CACHE_DIR", os.path.join("cache", "raw")))
+CACHE_MAX_BYTES = int(os.getenv("RAW_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+CACHE_MAX_AGE_DAYS = float(os.getenv("RAW_CACHE_MAX_AGE_DAYS", "30"))
+REVALIDATE_SECONDS = float(os.getenv("RAW_CACHE_REVALIDATE_SECONDS", "3600"))
+
+_lock = threading.Lock()
+
+
+def _manifest_path():
+    return os.path.join(CACHE_DIR, "manifest.json")
+
+
+def _load_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{_manifest_path()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, _manifest_path())
+
+
+def cache_key(url, params=None):
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+
+def _object_path(digest, ext):
+    return os.path.join(CACHE_DIR, "objects", digest[:2], f"{digest}{ext}")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _touch(key, **fields):
+    with _lock:
+        manifest = _load_manifest()
+        entry = manifest.get(key)
+        if entry is None:
+            return
+        entry.update(fields, last_access=time.time())
+        _save_manifest(manifest)
+
+
+def _store(key, url, tmp_path, ext, data_date, meta):
+    """Move a finished download into the object store and record it."""
+    digest = _sha256(tmp_path)
+    obj = _object_path(digest, ext)
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+    if os.path.exists(obj):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, obj)
+
+    now = time.time()
+    with _lock:
+        manifest = _load_manifest()
+        manifest[key] = {
+            "url": url,
+            "date": str(data_date) if data_date else None,
+            "path": os.path.relpath(obj, CACHE_DIR),
+            "size": os.path.getsize(obj),
+            "sha256": digest,
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+            "fetched_at": now,
+            "validated_at": now,
+            "last_access": now,
+        }
+        _save_manifest(manifest)
+    return obj
+
+
+def fetch(url, params=None, ext=None, data_date=None, revalidate=True,
+          revalidate_seconds=None, timeout=60, max_retries=3, source="noaa"):
+    """
+    Return a local path for ``url`` (+ query ``params``), downloading it
+    only when it is not cached or the server reports a change. ``ext`` is
+    the file suffix used in the object store (defaults to the URL's).
+    ``revalidate=False`` trusts any cached copy (immutable daily files);
+    ``revalidate_seconds`` overrides RAW_CACHE_REVALIDATE_SECONDS.
+    Returns None when the file is neither cached nor downloadable.
+    """
+    key = cache_key(url, params)
+    ext = ext if ext is not None else os.path.splitext(url.split("?", 1)[0])[1]
+
+    with _lock:
+        entry = _load_manifest().get(key)
+    cached = os.path.join(CACHE_DIR, entry["path"]) if entry else None
+    if cached and not os.path.exists(cached):
+        entry, cached = None, None
+
+    fresh_for = REVALIDATE_SECONDS if revalidate_seconds is None else revalidate_seconds
+    if entry and (not revalidate or time.time() - entry.get("validated_at", 0) < fresh_for):
+        _touch(key)
+        return cached
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    # Per-key temp name so an interrupted transfer resumes on the next run
+    tmp_dir = os.path.join(CACHE_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp = os.path.join(tmp_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    meta = {}
+    ok = download_file(url, tmp, timeout=timeout, max_retries=max_retries, source=source,
+                       params=params, headers=headers, meta=meta)
+    if not ok:
+        # Network trouble: a stale copy beats none
+        if cached:
+            _touch(key)
+        return cached
+    if meta.get("not_modified"):
+        _touch(key, validated_at=time.time())
+        return cached
+
+    obj = _store(key, url, tmp, ext, data_date, meta)
+    evict(keep=key)
+    return obj
+
+
+def lookup(url, params=None):
+    """Cached path for ``url`` without any network access (None if absent)."""
+    with _lock:
+        entry = _load_manifest().get(cache_key(url, params))
+    if not entry:
+        return None
+    path = os.path.join(CACHE_DIR, entry["path"])
+    return path if os.path.exists(path) else None
+
+
+def evict(max_bytes=None, max_age_days=None, keep=None):
+    """
+    Drop entries unused for ``max_age_days``, then least recently used ones
+    until the objects fit in ``max_bytes``. Objects shared by several URLs
+    are removed with their last reference; the ``keep`` key never is.
+    Returns bytes freed.
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age_days = CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    cutoff = time.time() - max_age_days * 86400
+
+    with _lock:
+        manifest = _load_manifest()
+        by_access = sorted(manifest.items(), key=lambda kv: kv[1].get("last_access", 0))
+
+        # object path -> size, counted once however many URLs point at it
+        sizes = {e["path"]: e["size"] for _, e in by_access}
+        total = sum(sizes.values())
+        refs = {}
+        for _, e in by_access:
+            refs[e["path"]] = refs.get(e["path"], 0) + 1
+
+        freed = 0
+        for key, e in by_access:
+            if e.get("last_access", 0) >= cutoff and total <= max_bytes:
+                break
+            if key == keep:
+                continue
+            del manifest[key]
+            refs[e["path"]] -= 1
+            if refs[e["path"]] == 0:
+                try:
+                    os.remove(os.path.join(CACHE_DIR, e["path"]))
+                except FileNotFoundError:
+                    pass
+                total -= sizes[e["path"]]
+                freed += sizes[e["path"]]
+
+        _save_manifest(manifest)
+    if freed:
+        print(f"[raw_cache] Evicted {freed / 1024 ** 2:.1f} MB")
+    return freed
+
+
+def stats():
+    with _lock:
+        manifest = _load_manifest()
+    sizes = {e["path"]: e["size"] for e in manifest.values()}
+    return {"entries": len(manifest), "objects": len(sizes), "bytes": sum(sizes.values())}
+
+
+def clear():
+    with _lock:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -9,25 +9,29 @@ if __name__ == "__main__" and __package__ is None:
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 # ------------------- Imports -------------------
-from pipeline.fetch_noaa import fetch_noaa_crw, fetch_noaa_ph
+from pipeline.fetch_noaa import fetch_noaa_crw, fetch_noaa_ph, prefetch_noaa_inputs
 from pipeline.fetch_allen import fetch_allen_coral_atlas
 from pipeline.clean_transform import clean_noaa, clean_allen
 from pipeline.merge_data import spatial_merge, integrate_ph
 
 from ml.model import (
-    health_score,
-    detect_anomaly,
-    train_lstm,
-    forecast_lstm,
+    health_scores,
+    load_location_history,
+    forecast_locations,
+    resolve_backend,
+    join_forecasts,
+    FORECAST_HISTORY_DAYS,
 )
+from ml.anomaly import detect_anomalies
 
 import backend.database as db
-from backend.models import OceanMetrics
-from sqlalchemy import insert
+from backend.bulk import upsert_ocean_metrics
+import pandas as pd
 
 # ------------------- Config -------------------
 FAST_MODE = True
 MAX_ROWS_FAST = 5000
+FORECAST_REGION = os.getenv("FORECAST_REGION", "global")
 
 # ------------------- Pipeline -------------------
 def run_daily_pipeline():
@@ -38,13 +42,14 @@ def run_daily_pipeline():
     3. Clean & Transform
     4. Spatial Merge (PostGIS)
     5. ML Predictions
-    6. Store to PostgreSQL (Core insert)
+    6. Store to the database (bulk upsert)
     """
 
     # Step 1: Fetch NOAA data
     print("Step 1: Fetching NOAA CRW data...")
-    noaa = fetch_noaa_crw()
-    ph = fetch_noaa_ph()
+    inputs = prefetch_noaa_inputs()
+    noaa = fetch_noaa_crw(files=inputs)
+    ph = fetch_noaa_ph(files=inputs)
 
     # Step 2: Fetch Allen Coral Atlas
     print("Step 2: Fetching Allen Coral Atlas...")
@@ -69,55 +74,33 @@ def run_daily_pipeline():
 
     # Step 6: ML predictions
     print("Step 6: Running ML predictions...")
-    merged["health_score"] = merged.apply(health_score, axis=1)
-    merged["anomaly"] = detect_anomaly(merged["sst"])
+    merged["health_score"] = health_scores(merged)
+    merged["anomaly"] = detect_anomalies(merged, engine=db.engine)
 
-    # Optional LSTM forecasting
+    # Forecasting: per-location pH history (DB + this run), one vectorized
+    # forecaster (FORECAST_BACKEND), forecasts joined back on exact lat/lon.
+    # FAST_MODE swaps the LSTM for FORECAST_FALLBACK_BACKEND, so the LSTM
+    # and its warm-start registry (ml/registry.py) only run with it off.
     merged["forecast_ph"] = None
-    if not FAST_MODE and merged["ph"].notna().sum() >= 30:
-        try:
-            model = train_lstm(merged["ph"].values)
-            forecast = forecast_lstm(
-                model,
-                merged["ph"].values,
-                steps_ahead=7
-            )
-            merged.loc[merged.index[-1], "forecast_ph"] = float(forecast[0])
-        except Exception as e:
-            print(f"LSTM forecast skipped: {e}")
-
-    # Step 7: Store to PostgreSQL (FAST, CORE INSERT)
-    print("Step 7: Storing to PostgreSQL...")
+    try:
+        backend = resolve_backend(allow_lstm=not FAST_MODE)
+        history = pd.concat([
+            load_location_history(db.engine, variable="ph", days=FORECAST_HISTORY_DAYS),
+            merged.loc[merged["ph"].notna(), ["date", "lat", "lon", "ph"]],
+        ], ignore_index=True)
+        forecasts = forecast_locations(history, variable="ph", window=30, horizon=1,
+                                       backend=backend, region=FORECAST_REGION)
+        if not forecasts.empty:
+            merged = join_forecasts(merged, forecasts, "forecast_ph")
+            print(f"Forecasted pH for {len(forecasts)} locations ({backend})")
+    except Exception as e:
+        print(f"Forecast skipped: {e}")
+
+    # Step 7: Store (bulk upsert: COPY + merge on Postgres)
+    print("Step 7: Storing to database...")
     db.init_db()
+    upsert_ocean_metrics(merged, engine=db.engine, label="pipeline")
 
-    records = merged[
-        [
-            "date",
-            "lat",
-            "lon",
-            "sst",
-            "dhw",
-            "ph",
-            "health_score",
-            "anomaly",
-            "forecast_ph",
-        ]
-    ].rename(
-        columns={
-            "lat": "latitude",
-            "lon": "longitude",
-        }
-    ).to_dict(orient="records")
-
-    print(f"Inserting {len(records)} rows into PostgreSQL...")
-
-    with db.engine.begin() as conn:
-        conn.execute(
-            insert(OceanMetrics),
-            records
-        )
-
-    print("PostgreSQL insert completed successfully")
     print("Pipeline completed successfully!")
 
 # ------------------- Entry -------------------
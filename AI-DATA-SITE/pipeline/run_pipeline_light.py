@@ -1,20 +1,27 @@
 import os
 import sys
-from datetime import date
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from pipeline.fetch_noaa import fetch_noaa_crw, fetch_noaa_ph
+from pipeline.fetch_noaa import fetch_noaa_crw, fetch_noaa_ph, prefetch_noaa_inputs
 from pipeline.fetch_allen import fetch_allen_coral_atlas
 from pipeline.clean_transform import clean_noaa, clean_allen
+from pipeline.grid_reader import grid_join
+from ml.scoring import health_scores
+from ml.anomaly import detect_anomalies
+from ml.model import (
+    load_location_history,
+    forecast_locations,
+    resolve_backend,
+    join_forecasts,
+    FORECAST_HISTORY_DAYS,
+)
 import geopandas as gpd
 import pandas as pd
 
 import backend.database as db
-from backend.models import OceanMetrics
-from sqlalchemy import inspect
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from backend.bulk import upsert_ocean_metrics
 
 # instrumentation
 try:
@@ -24,22 +31,15 @@ except Exception:
     last_pipeline_success = None
     pipeline_duration = None
 
-
-def health_score_row(row):
-    baseline = row.get("reef_health_baseline", 80)
-    dhw = row.get("dhw", 0)
-    score = baseline - (row.get("sst", 0) * 1.5 + dhw * 5)
-    return max(score, 0)
-
-
 def run_light_pipeline():
     print("[light pipeline] Fetching NOAA CRW data...")
     if pipeline_runs:
         pipeline_runs.inc()
     timer = pipeline_duration.time() if pipeline_duration else None
-    noaa = fetch_noaa_crw()
+    inputs = prefetch_noaa_inputs()
+    noaa = fetch_noaa_crw(files=inputs)
     print("[light pipeline] Fetching pH data (if available)...")
-    ph = fetch_noaa_ph()
+    ph = fetch_noaa_ph(files=inputs)
 
     print("[light pipeline] Fetching Allen Coral Atlas data (geo)...")
     allen = fetch_allen_coral_atlas(noaa_df=noaa)
@@ -50,7 +50,7 @@ def run_light_pipeline():
         allen = clean_allen(allen)
 
     print("[light pipeline] Integrating pH data...")
-    merged = noaa.merge(ph, on=["lat", "lon", "date"], how="left")
+    merged = grid_join(noaa, ph, value_cols=["ph"], on=("date",))
 
     # Spatial join with Allen if available
     try:
@@ -66,64 +66,37 @@ def run_light_pipeline():
     except Exception as e:
         print(f"[light pipeline] Spatial join skipped: {e}")
 
-    # Compute health score and simple anomaly flag
+    # Compute health score and anomaly flags (persisted IsolationForest)
     print("[light pipeline] Computing health score and anomalies...")
-    merged["health_score"] = merged.apply(health_score_row, axis=1)
-    merged["anomaly"] = False
-    merged["forecast_ph"] = None
-
-    # Prepare records for DB insert
-    records = merged.rename(columns={"lat": "latitude", "lon": "longitude"})
-    records = records[["date", "latitude", "longitude", "sst", "dhw", "ph", "health_score", "anomaly", "forecast_ph"]]
-    records = records.to_dict(orient="records")
+    merged["health_score"] = health_scores(merged)
+    try:
+        merged["anomaly"] = detect_anomalies(merged, engine=db.engine)
+    except Exception as e:
+        print(f"[light pipeline] Anomaly scoring skipped: {e}")
+        merged["anomaly"] = False
 
-    print(f"[light pipeline] Inserting {len(records)} rows into SQLite DB...")
-    db.init_db()
-    session = db.SessionLocal()
-    # detect if backing engine is Postgres to use upsert
-    dialect_name = None
+    # pH forecast with a NumPy backend (never TensorFlow in the light pipeline)
+    merged["forecast_ph"] = None
     try:
-        dialect_name = db.engine.dialect.name
-    except Exception:
-        pass
-    for rec in records:
-        # ensure date is date object
-        if isinstance(rec.get("date"), str):
-            try:
-                rec["date"] = pd.to_datetime(rec["date"]).date()
-            except Exception:
-                rec["date"] = date.today()
+        backend = resolve_backend(allow_lstm=False)
+        history = pd.concat([
+            load_location_history(db.engine, variable="ph", days=FORECAST_HISTORY_DAYS),
+            merged.loc[merged["ph"].notna(), ["date", "lat", "lon", "ph"]],
+        ], ignore_index=True)
+        forecasts = forecast_locations(history, variable="ph", horizon=1, backend=backend)
+        if not forecasts.empty:
+            merged = join_forecasts(merged, forecasts, "forecast_ph")
+            merged["forecast_ph"] = merged["forecast_ph"].astype(object).where(merged["forecast_ph"].notna(), None)
+            print(f"[light pipeline] Forecasted pH for {len(forecasts)} locations ({backend})")
+    except Exception as e:
+        print(f"[light pipeline] Forecast skipped: {e}")
 
-        payload = {
-            "date": rec.get("date"),
-            "latitude": float(rec.get("latitude", 0)),
-            "longitude": float(rec.get("longitude", 0)),
-            "sst": float(rec.get("sst", 0)),
-            "dhw": float(rec.get("dhw", 0)),
-            "ph": rec.get("ph"),
-            "health_score": float(rec.get("health_score", 0)),
-            "anomaly": bool(rec.get("anomaly", False)),
-            "forecast_ph": rec.get("forecast_ph", None),
-        }
-        if dialect_name == "postgresql":
-            # perform upsert using ON CONFLICT on (date, latitude, longitude)
-            table = OceanMetrics.__table__
-            stmt = pg_insert(table).values(**payload)
-            update_cols = {c.name: stmt.excluded[c.name] for c in table.c if c.name not in ("id",)}
-            stmt = stmt.on_conflict_do_update(index_elements=["date", "latitude", "longitude"],
-                                              set_=update_cols)
-            session.execute(stmt)
-        else:
-            om = OceanMetrics(**payload)
-            session.add(om)
+    print(f"[light pipeline] Upserting {len(merged)} rows...")
+    db.init_db()
     try:
-        session.commit()
-        print(f"[light pipeline] Inserted/updated {len(records)} rows")
+        upsert_ocean_metrics(merged, engine=db.engine, label="light pipeline")
     except Exception as e:
-        session.rollback()
-        print(f"[light pipeline] Error committing rows: {e}")
-    finally:
-        session.close()
+        print(f"[light pipeline] Error writing rows: {e}")
 
     print("[light pipeline] Completed successfully.")
     if timer:
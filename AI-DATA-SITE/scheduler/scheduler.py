@@ -13,48 +13,106 @@ formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-# Prefer lightweight pipeline when TensorFlow/Postgres not available
-try:
-    from pipeline.run_pipeline import run_daily_pipeline as pipeline
-    logger.info('Using full run_pipeline')
-except Exception:
-    try:
-        from pipeline.run_pipeline_light import run_light_pipeline as pipeline
-        logger.info('Using lightweight run_pipeline_light')
-    except Exception:
-        pipeline = None
-        logger.warning('No pipeline available to schedule')
+# Prefer lightweight pipeline when TensorFlow/Postgres not available.
+# Resolved on the first run rather than at import: the pipelines pull in
+# xarray/geopandas (and TensorFlow for forecasting), which an idle
+# scheduler process should not pay for. SCHED_PIPELINE=full|light forces one.
+_pipeline = None
+
+def resolve_pipeline():
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    choice = os.getenv("SCHED_PIPELINE", "auto")
+    if choice != "light":
+        try:
+            from ml.model import tensorflow_available
+            if choice == "full" or tensorflow_available():
+                from pipeline.run_pipeline import run_daily_pipeline
+                _pipeline = run_daily_pipeline
+                logger.info('Using full run_pipeline')
+                return _pipeline
+        except Exception:
+            if choice == "full":
+                raise
+    from pipeline.run_pipeline_light import run_light_pipeline
+    _pipeline = run_light_pipeline
+    logger.info('Using lightweight run_pipeline_light')
+    return _pipeline
 
 scheduler = BlockingScheduler(timezone=os.getenv("SCHED_TZ", "Asia/Kolkata"))
 
-if pipeline is not None:
-    def job_wrapper():
-        logger.info('Scheduler triggered pipeline')
-        try:
-            pipeline()
-            logger.info('Pipeline completed')
-        except Exception as e:
-            logger.exception('Pipeline failed: %s', e)
-
-    # Run every hour for live data updates (can set SCHED_MODE=daily for daily at 6 AM)
-    sched_mode = os.getenv("SCHED_MODE", "hourly")
-    
-    if sched_mode == "daily":
-        logger.info(f"Scheduling pipeline daily at {os.getenv('SCHED_HOUR', '6')}:{os.getenv('SCHED_MIN', '0')}")
-        scheduler.add_job(
-            job_wrapper,
-            trigger="cron",
-            hour=int(os.getenv("SCHED_HOUR", "6")),
-            minute=int(os.getenv("SCHED_MIN", "0")),
-        )
-    else:  # hourly (default for live)
-        logger.info("Scheduling pipeline every hour for live data updates")
-        scheduler.add_job(
-            job_wrapper,
-            trigger="interval",
-            hours=1,
-            start_date="2026-02-07 00:00:00"
-        )
+def job_wrapper():
+    logger.info('Scheduler triggered pipeline')
+    try:
+        pipeline = resolve_pipeline()
+    except Exception as e:
+        logger.exception('No pipeline available to run: %s', e)
+        return
+    try:
+        pipeline()
+        logger.info('Pipeline completed')
+    except Exception as e:
+        logger.exception('Pipeline failed: %s', e)
+
+# Run every hour for live data updates (can set SCHED_MODE=daily for daily at 6 AM)
+sched_mode = os.getenv("SCHED_MODE", "hourly")
+
+if sched_mode == "daily":
+    logger.info(f"Scheduling pipeline daily at {os.getenv('SCHED_HOUR', '6')}:{os.getenv('SCHED_MIN', '0')}")
+    scheduler.add_job(
+        job_wrapper,
+        trigger="cron",
+        hour=int(os.getenv("SCHED_HOUR", "6")),
+        minute=int(os.getenv("SCHED_MIN", "0")),
+    )
+else:  # hourly (default for live)
+    logger.info("Scheduling pipeline every hour for live data updates")
+    scheduler.add_job(
+        job_wrapper,
+        trigger="interval",
+        hours=1,
+        start_date="2026-02-07 00:00:00"
+    )
+
+# Re-fit the persisted anomaly model only when recent data has drifted
+def anomaly_refit_job():
+    try:
+        import backend.database as db
+        from ml.anomaly import refit_if_drifted
+        version = refit_if_drifted(db.engine)
+        if version:
+            logger.info('Anomaly model refit: v%s', version)
+        else:
+            logger.info('Anomaly model unchanged (no drift)')
+    except Exception as e:
+        logger.exception('Anomaly refit check failed: %s', e)
+
+scheduler.add_job(
+    anomaly_refit_job,
+    trigger="cron",
+    hour=int(os.getenv("ANOMALY_REFIT_HOUR", "3")),
+    minute=0,
+)
+
+# Keep monthly ocean_metrics partitions created ahead (Postgres only)
+def partition_maintenance_job():
+    try:
+        import backend.database as db
+        from backend.partitions import ensure_partitions
+        with db.engine.begin() as conn:
+            created = ensure_partitions(conn)
+        if created:
+            logger.info('Created partitions: %s', ', '.join(created))
+    except Exception as e:
+        logger.exception('Partition maintenance failed: %s', e)
+
+scheduler.add_job(
+    partition_maintenance_job,
+    trigger="cron",
+    hour=int(os.getenv("PARTITION_MAINTENANCE_HOUR", "2")),
+    minute=0,
+)
 
 if __name__ == "__main__":
     logger.info('Scheduler starting')
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for long-running entry points.
+
+Each module is imported in a fresh interpreter (nothing warm in
+sys.modules) and the script reports wall time, peak RSS and which heavy
+frameworks got pulled in. Exits non-zero when a module exceeds the budget
+or loads a forbidden framework, so it can run in CI.
+
+backend.main cannot go much below FastAPI + SQLAlchemy themselves, about
+0.8-0.9 s median on a small VM, so it runs close to the default 1 s
+budget; the ml modules and the scheduler import in ~0.1 s.
+
+Usage:
+  python3 scripts/bench_import_time.py
+  python3 scripts/bench_import_time.py --budget 0.5 --repeat 5
+  python3 scripts/bench_import_time.py --modules scheduler.scheduler backend.main
+"""
+import sys
+import os
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_MODULES = ["scheduler.scheduler", "backend.main", "ml.model", "ml.anomaly"]
+# Frameworks none of the default modules may load at import time
+HEAVY = ["tensorflow", "keras", "sklearn", "joblib", "xarray", "geopandas", "pandas"]
+
+PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe(module):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=ROOT),
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else f"exit {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of entry-point modules")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--budget", type=float, default=1.0, help="Max median seconds per module")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<24} {'median s':>9} {'max s':>7} {'RSS MB':>7}  heavy imports")
+    for module in args.modules:
+        try:
+            runs = [probe(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:<24} ERROR: {e}")
+            failed = True
+            continue
+        times = [r["seconds"] for r in runs]
+        median = statistics.median(times)
+        loaded = runs[-1]["loaded"]
+        ok = median <= args.budget and not loaded
+        failed |= not ok
+        print(f"{module:<24} {median:>9.3f} {max(times):>7.3f} {runs[-1]['rss_mb']:>7.0f}  "
+              f"{', '.join(loaded) or '-'}{'' if ok else '  <-- FAIL'}")
+
+    print(f"\nBudget: {args.budget:.2f}s median, no {', '.join(HEAVY)} at import")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Read-path benchmark for the backend endpoint queries.
+
+Seeds ocean_metrics with a synthetic grid (default ~2M rows), then for each
+endpoint query prints the plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN
+ANALYZE on Postgres) and the median latency -- first without the read-path
+indexes, then after running the migrations.
+
+Usage:
+  # throwaway SQLite file, 2M rows
+  python3 scripts/bench_queries.py
+
+  # existing Postgres (rows are upserted into ocean_metrics!)
+  python3 scripts/bench_queries.py --url postgresql://user:pw@localhost/ocean --rows 5000000
+
+  # reuse already-seeded data
+  python3 scripts/bench_queries.py --url sqlite:////tmp/bench.db --no-seed
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from backend.models import Base
+from backend.bulk import upsert_ocean_metrics
+from backend.migrations import MIGRATIONS, MIGRATIONS_TABLE, migrate
+
+# The SQL issued by the endpoints in backend/main.py
+QUERIES = {
+    "/data/latest": (
+        "SELECT * FROM ocean_metrics ORDER BY date DESC LIMIT 1",
+        {},
+    ),
+    "/data/timeseries?days=7": (
+        "SELECT date, latitude, longitude, sst, ph, health_score, anomaly "
+        "FROM ocean_metrics WHERE date >= :cutoff ORDER BY date DESC LIMIT 2000",
+        {"cutoff": None},
+    ),
+    "/data/anomalies": (
+        "SELECT date, latitude, longitude, sst, health_score FROM ocean_metrics "
+        "WHERE anomaly = :flag ORDER BY date DESC LIMIT 50",
+        {"flag": True},
+    ),
+}
+
+INDEXES = ["ix_ocean_metrics_date_desc", "ix_ocean_metrics_anomaly_date", "ix_ocean_metrics_timeseries"]
+
+
+def seed(engine, rows, days):
+    """Upsert a days x cells grid of synthetic rows (anomaly rate ~1%)."""
+    cells = max(rows // days, 1)
+    side = int(np.ceil(np.sqrt(cells)))
+    lat = np.round(np.repeat(np.linspace(-30, 30, side), side)[:cells], 3)
+    lon = np.round(np.tile(np.linspace(-180, 180, side), side)[:cells], 3)
+    rng = np.random.default_rng(0)
+    end = date.today()
+    for d in range(days):
+        day = end - timedelta(days=days - 1 - d)
+        sst = rng.normal(28, 1.5, cells)
+        upsert_ocean_metrics(pd.DataFrame({
+            "date": day, "lat": lat, "lon": lon, "sst": sst,
+            "dhw": np.clip(sst - 29, 0, None), "ph": rng.normal(8.1, 0.02, cells),
+            "health_score": np.clip(80 - sst * 1.5, 0, None), "anomaly": rng.random(cells) < 0.01,
+            "forecast_ph": None,
+        }), engine=engine, label=f"seed {day}")
+
+
+def explain(conn, dialect, sql, params):
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN (ANALYZE, BUFFERS) "
+    rows = conn.execute(text(prefix + sql), params).fetchall()
+    return [str(r[-1]) for r in rows]
+
+
+def time_query(conn, sql, params, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def run_suite(engine, label, repeat):
+    dialect = engine.dialect.name
+    results = {}
+    print(f"\n=== {label} ===")
+    with engine.connect() as conn:
+        for name, (sql, params) in QUERIES.items():
+            params = dict(params)
+            if "cutoff" in params:
+                params["cutoff"] = date.today() - timedelta(days=7)
+            plan = explain(conn, dialect, sql, params)
+            results[name] = time_query(conn, sql, params, repeat)
+            print(f"\n{name}: {results[name] * 1000:.1f} ms (median of {repeat})")
+            for line in plan:
+                print(f"    {line}")
+    return results
+
+
+def drop_indexes(engine):
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (version VARCHAR(128) PRIMARY KEY, description TEXT, applied_at VARCHAR(40))"))
+        conn.execute(text(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = :v"), {"v": MIGRATIONS[0]["version"]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN and time the endpoint queries")
+    parser.add_argument("--url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+
+    if not args.no_seed:
+        t0 = time.perf_counter()
+        seed(engine, args.rows, args.days)
+        print(f"Seeded ~{args.rows:,} rows in {time.perf_counter() - t0:.1f}s")
+
+    drop_indexes(engine)
+    before = run_suite(engine, "without read-path indexes", args.repeat)
+    t0 = time.perf_counter()
+    migrate(engine)
+    print(f"\nMigrations applied in {time.perf_counter() - t0:.1f}s")
+    after = run_suite(engine, "with read-path indexes", args.repeat)
+
+    print(f"\n{'query':<26} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in QUERIES:
+        b, a = before[name] * 1000, after[name] * 1000
+        print(f"{name:<26} {b:>10.1f} {a:>10.1f} {b / a if a else float('inf'):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the spatial queries (backend/spatial.py) against full scans.
+
+Seeds ocean_metrics with the same synthetic grid as bench_queries.py, runs
+the migrations (which add and index ``cell``), then for each case times
+the cell-index path and the equivalent query without it:
+
+- bbox:    cell ranges + exact lat/lon  vs  lat/lon BETWEEN over every row in range
+- radius:  cell ranges around the circle + haversine  vs  haversine over every row in range
+- nearest: rings of cells outward  vs  distance to every location in range
+
+Both sides must return the same rows; the script checks this.
+
+Usage:
+  python3 scripts/bench_spatial.py
+  python3 scripts/bench_spatial.py --rows 5000000 --days 30
+  python3 scripts/bench_spatial.py --url sqlite:////tmp/bench.db --no-seed
+"""
+import sys
+import os
+import time
+import argparse
+import statistics
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, text
+
+from backend import spatial
+from backend.models import Base
+from backend.migrations import migrate
+from backend.timeseries import bbox_sql
+from scripts.bench_queries import seed, explain
+
+COLS = ", ".join(spatial.COLUMNS)
+
+# (name, kind, args)
+CASES = [
+    ("bbox 2x2 deg (reef)", "bbox", (142.0, -11.0, 144.0, -9.0)),
+    ("bbox 20x20 deg", "bbox", (100.0, -10.0, 120.0, 10.0)),
+    ("bbox across antimeridian", "bbox", (175.0, -5.0, -175.0, 5.0)),
+    ("radius 50 km", "radius", (-18.3, 147.7, 50.0)),
+    ("radius 500 km", "radius", (-18.3, 147.7, 500.0)),
+    ("nearest k=1", "nearest", (-18.3, 147.7, 1)),
+    ("nearest k=25", "nearest", (-18.3, 147.7, 25)),
+]
+
+
+PG_INDEX_SETTINGS = ("enable_indexscan", "enable_indexonlyscan", "enable_bitmapscan")
+
+
+@contextmanager
+def no_index(conn):
+    """Postgres: disable index scans for the block (SQLite uses NOT INDEXED instead)."""
+    if conn.dialect.name != "postgresql":
+        yield
+        return
+    for setting in PG_INDEX_SETTINGS:
+        conn.execute(text(f"SET {setting} = off"))
+    try:
+        yield
+    finally:
+        for setting in PG_INDEX_SETTINGS:
+            conn.execute(text(f"RESET {setting}"))
+
+
+def scan_sql(dialect, cutoff, bbox=None):
+    params = {"cutoff": cutoff}
+    table = "ocean_metrics NOT INDEXED" if dialect == "sqlite" else "ocean_metrics"
+    return f"SELECT {COLS} FROM {table} WHERE date >= :cutoff{bbox_sql(bbox, params)}", params
+
+
+def index_sql(conn, cutoff, bbox):
+    params = {"cutoff": cutoff}
+    ranges = spatial.cell_ranges(bbox)
+    return (f"SELECT {COLS} FROM {spatial._from_clause(conn, ranges)} "
+            f"WHERE {spatial._cells_sql(ranges, params)} AND date >= :cutoff{bbox_sql(bbox, params)}"), params
+
+
+def _scan(conn, cutoff, bbox=None):
+    """Rows in range (and bbox) from a sequential scan, no index."""
+    sql, params = scan_sql(conn.dialect.name, cutoff, bbox)
+    with no_index(conn):
+        return spatial._frame(conn.execute(text(sql), params).all())
+
+
+def indexed(conn, kind, args, cutoff):
+    if kind == "bbox":
+        return spatial.in_bbox(conn, args, cutoff, limit=None)
+    if kind == "radius":
+        lat, lon, radius_km = args
+        return spatial.within_radius(conn, lat, lon, radius_km, cutoff, limit=None)
+    lat, lon, k = args
+    return spatial.nearest(conn, lat, lon, cutoff, k=k)
+
+
+def full_scan(conn, kind, args, cutoff):
+    if kind == "bbox":
+        return _scan(conn, cutoff, args)
+    df = _scan(conn, cutoff)
+    lat, lon = args[0], args[1]
+    df["distance_km"] = spatial.haversine_km(df["latitude"], df["longitude"], lat, lon)
+    df = df.sort_values(["distance_km", "date"], ascending=[True, False], kind="stable")
+    if kind == "radius":
+        return df[df["distance_km"] <= args[2]]
+    return df.drop_duplicates(subset=["latitude", "longitude"], keep="first").head(args[2])
+
+
+def median_time(fn, repeat):
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time spatial queries with and without the cell index")
+    parser.add_argument("--url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--window", type=int, default=7, help="Days queried")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    migrate(engine)
+
+    if not args.no_seed:
+        t0 = time.perf_counter()
+        seed(engine, args.rows, args.days)
+        print(f"Seeded ~{args.rows:,} rows in {time.perf_counter() - t0:.1f}s")
+
+    cutoff = date.today() - timedelta(days=args.window)
+    print(f"\nCell size {spatial.CELL_DEG} deg, querying the last {args.window} days")
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE ocean_metrics"))
+        box = CASES[0][2]
+        dialect = engine.dialect.name
+        print(f"\nPlan for '{CASES[0][0]}' with the cell index:")
+        for line in explain(conn, dialect, *index_sql(conn, cutoff, box)):
+            print(f"    {line}")
+        print("and as a full scan:")
+        with no_index(conn):
+            for line in explain(conn, dialect, *scan_sql(dialect, cutoff, box)):
+                print(f"    {line}")
+
+        print(f"\n{'case':<26} {'rows':>7} {'index ms':>9} {'scan ms':>9} {'speedup':>8}")
+        for name, kind, case_args in CASES:
+            t_index, got = median_time(lambda: indexed(conn, kind, case_args, cutoff), args.repeat)
+            t_scan, expected = median_time(lambda: full_scan(conn, kind, case_args, cutoff), args.repeat)
+            key = ["date", "latitude", "longitude"]
+            same = set(got[key].itertuples(index=False)) == set(expected[key].itertuples(index=False))
+            print(f"{name:<26} {len(got):>7} {t_index * 1000:>9.1f} {t_scan * 1000:>9.1f} "
+                  f"{t_scan / t_index if t_index else float('inf'):>7.1f}x{'' if same else '  MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
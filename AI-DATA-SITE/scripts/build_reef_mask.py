@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Build a boolean reef mask on the NOAA CRW 5 km grid from Allen Coral Atlas
+polygons. Point NOAA_REEF_MASK at the output so fetch_noaa_crw /
+fetch_noaa_ph only decode cells near reefs.
+
+Usage:
+  # Grid from a downloaded CRW file, polygons from ALLEN_WFS_* settings
+  python3 scripts/build_reef_mask.py --grid NOAA_DHW_20260206.nc --out reef_mask.npz
+
+  # Wider halo around each reef (degrees)
+  python3 scripts/build_reef_mask.py --grid NOAA_DHW_20260206.nc --buffer 0.1
+"""
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pipeline.fetch_allen import fetch_allen_coral_atlas
+from pipeline.grid_reader import open_grid, build_reef_mask, save_reef_mask, REEF_BUFFER_DEG
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute a reef mask for NOAA grid reads")
+    parser.add_argument("--grid", required=True, help="NetCDF file whose lat/lon grid the mask is built on")
+    parser.add_argument("--out", default="reef_mask.npz", help="Output .npz path (default: reef_mask.npz)")
+    parser.add_argument(
+        "--buffer",
+        type=float,
+        default=REEF_BUFFER_DEG,
+        help=f"Halo around each reef in degrees (default: {REEF_BUFFER_DEG})"
+    )
+    args = parser.parse_args()
+
+    reefs = fetch_allen_coral_atlas()
+    print(f"Loaded {len(reefs)} reef geometries")
+
+    with open_grid(args.grid) as ds:
+        mask = build_reef_mask(ds, reefs, buffer_deg=args.buffer)
+
+    save_reef_mask(mask, args.out)
+    cells = int(mask.values.sum())
+    print(f"✓ Reef mask: {cells:,} of {mask.size:,} cells ({cells / mask.size:.4%}) -> {args.out}")
+    print(f"  Set NOAA_REEF_MASK={os.path.abspath(args.out)} to enable it")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ import argparse
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import backend.database as db
+from backend import partitions, rollups, data_version
 from sqlalchemy import text
 import pandas as pd
 
@@ -40,17 +41,49 @@ def get_db_age_stats():
         return {"oldest": oldest, "newest": newest, "total": total}
 
 
+def drop_expired_partitions(cutoff_date, archive_path=None):
+    """
+    On a partitioned Postgres table, detach and drop every monthly partition
+    that lies entirely before `cutoff_date` (archiving it to CSV first when
+    `archive_path` is given). Returns the number of rows removed; 0 on
+    SQLite or an unpartitioned table.
+    """
+    removed = 0
+    with db.engine.connect() as conn:
+        expired = partitions.expired_partitions(conn, cutoff_date)
+    for name, start, end in expired:
+        with db.engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+        if archive_path is not None and rows:
+            archive_file = archive_path / f"{name}.csv.gz"
+            for i, chunk in enumerate(pd.read_sql(f"SELECT * FROM {name} ORDER BY date", db.engine, chunksize=100_000)):
+                chunk.to_csv(archive_file, index=False, header=(i == 0), mode="w" if i == 0 else "a", compression="gzip")
+            print(f"✓ Archived {rows} records from {name} to {archive_file}")
+        with db.engine.begin() as conn:
+            partitions.drop_partition(conn, name)
+            rollups.drop_before(conn, end)
+            data_version.bump(conn)
+        print(f"✓ Dropped partition {name} ({start} to {end}, {rows} records)")
+        removed += rows
+    return removed
+
+
 def delete_old_records(days_back):
     """Delete records older than `days_back` days."""
     cutoff_date = datetime.now().date() - timedelta(days=days_back)
     print(f"Deleting records older than {cutoff_date}...")
 
+    # Whole months go by DETACH/DROP; only the boundary month needs DELETE
+    dropped = drop_expired_partitions(cutoff_date)
+
     with db.engine.connect() as conn:
         result = conn.execute(text("""
             DELETE FROM ocean_metrics WHERE date < :cutoff
         """), {"cutoff": cutoff_date})
+        rollups.drop_before(conn, cutoff_date)
+        data_version.bump(conn)
         conn.commit()
-        deleted = result.rowcount
+        deleted = result.rowcount + dropped
         print(f"✓ Deleted {deleted} records")
         return deleted
 
@@ -63,6 +96,9 @@ def archive_old_records(days_back, archive_dir):
 
     print(f"Archiving records older than {cutoff_date} to {archive_path}...")
 
+    # Whole expired months: archive per partition, then DETACH/DROP
+    archived = drop_expired_partitions(cutoff_date, archive_path)
+
     df = pd.read_sql(
         "SELECT * FROM ocean_metrics WHERE date < :cutoff ORDER BY date",
         db.engine,
@@ -70,8 +106,9 @@ def archive_old_records(days_back, archive_dir):
     )
 
     if df.empty:
-        print("✓ No records to archive")
-        return 0
+        if not archived:
+            print("✓ No records to archive")
+        return archived
 
     archive_file = archive_path / f"ocean_metrics_{cutoff_date}.csv.gz"
     df.to_csv(archive_file, index=False, compression="gzip")
@@ -82,11 +119,13 @@ def archive_old_records(days_back, archive_dir):
         result = conn.execute(text("""
             DELETE FROM ocean_metrics WHERE date < :cutoff
         """), {"cutoff": cutoff_date})
+        rollups.drop_before(conn, cutoff_date)
+        data_version.bump(conn)
         conn.commit()
         deleted = result.rowcount
         print(f"✓ Deleted {deleted} archived records from DB")
 
-    return len(df)
+    return len(df) + archived
 
 
 def show_status():
@@ -107,6 +146,11 @@ def show_status():
             avg_per_day = stats['total'] / span_days
             print(f"Avg records/day: {avg_per_day:.1f}")
 
+    with db.engine.connect() as conn:
+        parts = partitions.list_partitions(conn)
+    if parts:
+        print(f"Partitions: {len(parts)} monthly ({parts[0][1]} to {parts[-1][2]})")
+
     print("\nRETENTION POLICY:")
     print("  - Keep recent: Last 90 days (active)")
     print("  - Archive: 90+ days old (optional)")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Concurrency load test for the FastAPI backend.
+
+Fires a fixed number of requests per endpoint at increasing concurrency and
+reports throughput and latency percentiles. With non-blocking endpoints,
+requests/sec should rise with concurrency until the database (or pool)
+saturates. A blocking endpoint stays flat, because every request
+serializes on the event loop.
+
+By default the app is served in-process through httpx's ASGI transport
+(no server needed). Pass --url to hit a running uvicorn instead.
+
+Usage:
+  python3 scripts/load_test_api.py
+  python3 scripts/load_test_api.py --url http://localhost:8000 --concurrency 1 8 32 128 --requests 2000
+  python3 scripts/load_test_api.py --endpoints /stats /data/anomalies
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+DEFAULT_ENDPOINTS = ["/data/latest", "/data/anomalies", "/stats", "/data/timeseries?days=1"]
+
+
+async def _worker(client, path, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(path)
+            if r.status_code != 200:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run_level(client, path, concurrency, n_requests):
+    queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(i)
+    latencies, errors = [], []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker(client, path, queue, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rps": n_requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "errors": len(errors),
+    }
+
+
+def _client(args):
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+    from backend.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=60)
+
+
+async def main_async(args):
+    if not args.url:
+        from backend.database import init_db
+        init_db(run_migrations=True)
+    async with _client(args) as client:
+        for path in args.endpoints:
+            await client.get(path)  # warm up pools / caches
+            print(f"\n{path}")
+            print(f"  {'concurrency':>11} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+            base = None
+            for c in args.concurrency:
+                res = await run_level(client, path, c, args.requests)
+                base = base or res["rps"]
+                print(f"  {c:>11} {res['rps']:>9.0f} {res['p50']:>8.1f} {res['p95']:>8.1f} {res['errors']:>7}"
+                      f"   x{res['rps'] / base:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API at increasing concurrency")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process ASGI)")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint per level")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
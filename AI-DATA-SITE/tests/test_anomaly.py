@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from backend import migrations
+from backend.bulk import upsert_ocean_metrics
+from backend.models import Base
+from ml import anomaly, registry
+
+TODAY = date.today()
+
+
+@pytest.fixture(autouse=True)
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(anomaly, "MODEL_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(anomaly, "MIN_TRAIN_ROWS", 50)
+    monkeypatch.setattr(anomaly, "N_JOBS", 1)
+
+
+def _write(engine, days, sst, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = [TODAY - timedelta(days=d) for d in days for _ in range(20)]
+    upsert_ocean_metrics(pd.DataFrame({
+        "date": dates, "lat": np.tile(np.arange(20) * 0.5, len(days)), "lon": 150.0,
+        "sst": rng.normal(sst, 0.5, len(dates)), "dhw": 1.0, "ph": 8.0, "health_score": 70.0,
+        "anomaly": False, "forecast_ph": np.nan,
+    }), engine=engine, label="test")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine, verbose=False)
+    _write(engine, range(30), sst=28.0)
+    return engine
+
+
+def test_save_load_round_trip():
+    X = np.random.default_rng(1).normal(28.0, 0.5, (300, 1))
+    fitted = anomaly.fit_model(X, ["sst"], source="test")
+    loaded = anomaly.load_model()
+
+    assert loaded["meta"] == fitted["meta"]
+    assert loaded["meta"]["version"] == 1
+    assert (loaded["model"].predict(X) == fitted["model"].predict(X)).all()
+    assert anomaly.load_model(version=2) is None
+
+
+def test_old_versions_are_pruned(monkeypatch):
+    monkeypatch.setattr(anomaly, "KEEP_VERSIONS", 2)
+    X = np.random.default_rng(1).normal(28.0, 0.5, (100, 1))
+    for _ in range(4):
+        anomaly.fit_model(X, ["sst"], source="test")
+
+    assert registry.list_versions(anomaly.MODEL_DIR, anomaly.PREFIX) == [3, 4]
+    assert anomaly.load_model()["meta"]["version"] == 4
+
+
+def test_population_stability():
+    rng = np.random.default_rng(2)
+    train = rng.normal(28.0, 0.5, 5000)
+    hist = anomaly._histograms(train[:, None], ["sst"])["sst"]
+
+    same = anomaly.population_stability(hist["props"], hist["edges"], rng.normal(28.0, 0.5, 2000))
+    shifted = anomaly.population_stability(hist["props"], hist["edges"], rng.normal(29.5, 0.5, 2000))
+    assert same < 0.05
+    assert shifted > anomaly.DRIFT_PSI
+
+
+def test_refit_only_on_drift(engine):
+    # No model yet: trained from history
+    assert anomaly.refit_if_drifted(engine) == 1
+    # Same distribution: kept
+    assert anomaly.refit_if_drifted(engine) is None
+    assert anomaly.load_model()["meta"]["version"] == 1
+
+    # The last week runs 3 degrees warmer: PSI trips, the model is refitted
+    _write(engine, range(anomaly.DRIFT_DAYS), sst=31.0, seed=1)
+    assert anomaly.refit_if_drifted(engine) == 2
+    assert anomaly.load_model()["meta"]["source"] == f"ocean_metrics:{anomaly.TRAIN_DAYS}d"
+
+
+def test_batch_model_is_replaced_from_history(engine):
+    anomaly.fit_model(np.random.default_rng(3).normal(28.0, 0.5, (10, 1)), ["sst"], source="batch")
+
+    assert anomaly.refit_if_drifted(engine) == 2
+    assert anomaly.load_model()["meta"]["rows"] == 600
+
+
+@pytest.mark.parametrize("features", [["sst", "1; DROP TABLE ocean_metrics"], ["latitude"], []])
+def test_history_features_must_be_ocean_metrics_columns(engine, features):
+    with pytest.raises(ValueError):
+        anomaly.load_history(engine, 30, features)
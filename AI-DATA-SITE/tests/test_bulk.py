@@ -0,0 +1,46 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend import bulk, data_version, rollups
+from backend.models import Base
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _frame():
+    return pd.DataFrame({
+        "date": [date(2026, 1, 1)] * 3, "lat": [1.0, 2.0, 3.0], "lon": [4.0, 5.0, 6.0],
+        "sst": 25.0, "dhw": 0.5, "ph": 8.0, "health_score": 70.0, "anomaly": [False, True, False],
+    })
+
+
+def _counts(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT COUNT(*) FROM ocean_metrics")).scalar()
+        rollup_rows = conn.execute(text(f"SELECT COALESCE(SUM(row_count), 0) FROM {rollups.TABLE}")).scalar()
+        return rows, rollup_rows, data_version.read(conn)
+
+
+def test_rows_rollups_and_stamp_are_written_together(engine):
+    bulk.upsert_ocean_metrics(_frame(), engine=engine, label="test")
+
+    assert _counts(engine) == (3, 3, 1)
+
+
+def test_failed_rollup_refresh_rolls_back_the_rows(engine, monkeypatch):
+    def fail(conn, dates=None):
+        raise RuntimeError("rollup failed")
+
+    monkeypatch.setattr(rollups, "refresh", fail)
+    with pytest.raises(RuntimeError):
+        bulk.upsert_ocean_metrics(_frame(), engine=engine, label="test")
+
+    assert _counts(engine) == (0, 0, 0)
@@ -0,0 +1,131 @@
+import json
+
+from pipeline import downloads
+
+
+class FakeResponse:
+    def __init__(self, status, body=b"", headers=None):
+        self.status_code = status
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size=1):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeServer:
+    """Serves ``body`` with ``etag``, honouring Range only when If-Range matches."""
+
+    def __init__(self, body, etag):
+        self.body, self.etag = body, etag
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers)
+        validators = {"ETag": self.etag, "Content-Length": str(len(self.body))}
+        if "Range" in headers and headers.get("If-Range") == self.etag:
+            start = int(headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(self.body):
+                return FakeResponse(416, headers={"Content-Range": f"bytes */{len(self.body)}"})
+            return FakeResponse(206, self.body[start:], {
+                "ETag": self.etag, "Content-Range": f"bytes {start}-{len(self.body) - 1}/{len(self.body)}",
+            })
+        return FakeResponse(200, self.body, validators)
+
+
+def _serve(monkeypatch, server):
+    monkeypatch.setattr(downloads, "get_session", lambda: server)
+
+
+def _partial(path, data, etag):
+    part = f"{path}.part"
+    with open(part, "wb") as f:
+        f.write(data)
+    with open(f"{part}.json", "w") as f:
+        json.dump({"etag": etag, "last_modified": None}, f)
+
+
+def test_resume_sends_if_range_with_the_saved_etag(tmp_path, monkeypatch):
+    path = tmp_path / "sst.nc"
+    server = FakeServer(b"0123456789", '"v1"')
+    _serve(monkeypatch, server)
+    _partial(path, b"01234", '"v1"')
+
+    assert downloads.download_file("https://example.test/sst.nc", str(path))
+
+    assert server.requests == [{"Range": "bytes=5-", "If-Range": '"v1"'}]
+    assert path.read_bytes() == b"0123456789"
+    assert not (tmp_path / "sst.nc.part.json").exists()
+
+
+def test_changed_file_restarts_from_zero(tmp_path, monkeypatch):
+    path = tmp_path / "sst.nc"
+    server = FakeServer(b"abcdefghijkl", '"v2"')
+    _serve(monkeypatch, server)
+    _partial(path, b"01234", '"v1"')
+
+    assert downloads.download_file("https://example.test/sst.nc", str(path))
+
+    assert server.requests[0]["If-Range"] == '"v1"'
+    assert path.read_bytes() == b"abcdefghijkl"
+
+
+def test_part_without_validators_is_not_resumed(tmp_path, monkeypatch):
+    path = tmp_path / "sst.nc"
+    server = FakeServer(b"0123456789", '"v1"')
+    _serve(monkeypatch, server)
+    (tmp_path / "sst.nc.part").write_bytes(b"XXXXX")
+
+    assert downloads.download_file("https://example.test/sst.nc", str(path))
+
+    assert "Range" not in server.requests[0]
+    assert path.read_bytes() == b"0123456789"
+
+
+def test_weak_etag_falls_back_to_last_modified():
+    assert downloads._if_range({"etag": 'W/"v1"', "last_modified": "Tue, 01 Sep 2026 00:00:00 GMT"}) == \
+        "Tue, 01 Sep 2026 00:00:00 GMT"
+
+
+def test_part_at_or_past_the_remote_size_restarts(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloads, "backoff_delay", lambda *a, **k: 0)
+    path = tmp_path / "sst.nc"
+    server = FakeServer(b"0123456789", '"v1"')
+    _serve(monkeypatch, server)
+    _partial(path, b"0123456789XYZ", '"v1"')
+
+    # No expected_size: the 416's Content-Range total is what shows the .part is too long
+    assert downloads.download_file("https://example.test/sst.nc", str(path))
+
+    assert server.requests[0]["Range"] == "bytes=13-"
+    assert "Range" not in server.requests[1]
+    assert path.read_bytes() == b"0123456789"
+
+
+class OverrunServer(FakeServer):
+    """Resumed bodies overrun the size announced in Content-Range."""
+
+    def get(self, url, headers=None, **kwargs):
+        response = super().get(url, headers=headers, **kwargs)
+        if response.status_code == 206:
+            response.body += b"!!"
+        return response
+
+
+def test_part_longer_than_the_server_total_is_discarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloads, "backoff_delay", lambda *a, **k: 0)
+    path = tmp_path / "sst.nc"
+    server = OverrunServer(b"0123456789", '"v1"')
+    _serve(monkeypatch, server)
+    _partial(path, b"01234", '"v1"')
+
+    assert downloads.download_file("https://example.test/sst.nc", str(path))
+
+    assert path.read_bytes() == b"0123456789"
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import fetch_allen
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body.encode()
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _page(start, n, with_ids=True):
+    features = [
+        {"type": "Feature", **({"id": f"reef.{i}"} if with_ids else {}),
+         "geometry": {"type": "Point", "coordinates": [140.0 + i * 1e-3, -10.0]}, "properties": {"n": i}}
+        for i in range(start, start + n)
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features})
+
+
+def _serve(monkeypatch, page_for):
+    calls = []
+
+    async def aget(url, params=None, **kwargs):
+        calls.append(dict(params))
+        return FakeResponse(page_for(params.get("startIndex", 0)))
+
+    monkeypatch.setattr(fetch_allen.http_client, "aget", aget)
+    return calls
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(fetch_allen, "ALLEN_PAGE_SIZE", 5)
+
+
+def test_pages_until_a_short_page(monkeypatch):
+    calls = _serve(monkeypatch, lambda start: _page(start, 5 if start < 10 else 2))
+
+    gdf = asyncio.run(fetch_allen._afetch_tile("http://wfs", "reefs", (140, -11, 141, -10)))
+
+    assert len(calls) == 3
+    assert len(gdf) == 12
+
+
+def test_stops_when_the_server_repeats_a_page_without_ids(monkeypatch):
+    # Server ignores startIndex and features carry no id to compare
+    calls = _serve(monkeypatch, lambda start: _page(0, 5, with_ids=False))
+
+    gdf = asyncio.run(fetch_allen._afetch_tile("http://wfs", "reefs", (140, -11, 141, -10)))
+
+    assert len(calls) == 2
+    assert len(gdf) == 5
+
+
+def test_stops_after_max_pages(monkeypatch):
+    monkeypatch.setattr(fetch_allen, "ALLEN_MAX_PAGES", 4)
+    calls = _serve(monkeypatch, lambda start: _page(start, 5))
+
+    gdf = asyncio.run(fetch_allen._afetch_tile("http://wfs", "reefs", (140, -11, 141, -10)))
+
+    assert len(calls) == 4
+    assert len(gdf) == 20
+
+
+def test_pages_are_sorted_when_configured(monkeypatch):
+    monkeypatch.setattr(fetch_allen, "ALLEN_SORT_BY", "fid")
+    calls = _serve(monkeypatch, lambda start: _page(start, 2))
+
+    asyncio.run(fetch_allen._afetch_tile("http://wfs", "reefs", (140, -11, 141, -10)))
+
+    assert calls[0]["sortBy"] == "fid"
+
+
+def test_coarser_tiles_match_a_fresh_plan(monkeypatch):
+    rng = np.random.default_rng(0)
+    noaa = pd.DataFrame({"lon": rng.uniform(-180, 180, 500), "lat": rng.uniform(-40, 40, 500)})
+    noaa = pd.concat([noaa] * 3, ignore_index=True)   # one row per cell and day
+    monkeypatch.setattr(fetch_allen, "ALLEN_MAX_TILES", 64)
+
+    tiles, tile_deg = fetch_allen.plan_tiles(noaa_df=noaa)
+
+    assert tile_deg > fetch_allen.ALLEN_TILE_DEG
+    assert len(tiles) <= 64
+    assert tiles == sorted(fetch_allen._tiles_for_points(noaa, tile_deg, 0.1))
+
+
+def test_cached_tile_skips_the_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_allen, "ALLEN_CACHE_DIR", str(tmp_path))
+    calls = _serve(monkeypatch, lambda start: _page(start, 2))
+
+    first = asyncio.run(fetch_allen._aload_tile("http://wfs", "reefs", (140, -11), 1.0))
+    again = asyncio.run(fetch_allen._aload_tile("http://wfs", "reefs", (140, -11), 1.0))
+
+    assert len(calls) == 1
+    assert len(again) == len(first) == 2
@@ -0,0 +1,23 @@
+from pipeline import fetch_noaa
+
+
+def _no_download(*args, **kwargs):
+    raise AssertionError("inputs were already prefetched")
+
+
+def test_prefetched_inputs_are_not_downloaded_again(monkeypatch):
+    monkeypatch.setattr(fetch_noaa, "download_many", _no_download)
+    monkeypatch.setattr(fetch_noaa, "_download_ph", _no_download)
+    files = {"sst": None, "dhw": None, "ph": None}
+
+    # Nothing found upstream: the demo frames, without a second round of probes
+    assert len(fetch_noaa.fetch_noaa_crw(bboxes=[], files=files)) == 3
+    assert len(fetch_noaa.fetch_noaa_ph(bboxes=[], files=files)) == 3
+
+
+def test_without_prefetch_the_files_are_downloaded(monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetch_noaa, "download_many", lambda jobs: calls.append(sorted(jobs)) or dict.fromkeys(jobs))
+
+    fetch_noaa.fetch_noaa_crw(bboxes=[])
+    assert calls == [["dhw", "sst"]]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from ml.model import join_forecasts
+
+
+def _grid(n=40, res=0.05, lat0=-18.0, lon0=146.0):
+    lat, lon = np.meshgrid(lat0 + res * np.arange(n), lon0 + res * np.arange(n), indexing="ij")
+    return pd.DataFrame({"date": pd.Timestamp("2026-01-01"), "lat": lat.ravel(), "lon": lon.ravel(),
+                         "ph": 8.05, "forecast_ph": None})
+
+
+def _forecasts(batch, idx):
+    picked = batch.iloc[idx]
+    return pd.DataFrame({"lat": picked["lat"].to_numpy(), "lon": picked["lon"].to_numpy(),
+                         "forecast_ph": [8.01, 8.02, 8.03]})
+
+
+def test_only_forecast_locations_get_a_forecast():
+    batch = _grid()
+    forecasts = _forecasts(batch, [0, 41, 1599])
+
+    out = join_forecasts(batch, forecasts, "forecast_ph")
+
+    assert len(out) == len(batch)
+    got = out[out["forecast_ph"].notna()].sort_values(["lat", "lon"])
+    assert len(got) == 3
+    np.testing.assert_allclose(got["lat"], forecasts.sort_values(["lat", "lon"])["lat"])
+    np.testing.assert_allclose(got["forecast_ph"], [8.01, 8.02, 8.03])
+
+
+def test_forecasts_for_locations_outside_the_batch_are_dropped():
+    batch = _grid(n=4)
+    forecasts = pd.DataFrame({"lat": [50.0], "lon": [0.0], "forecast_ph": [8.0]})
+
+    out = join_forecasts(batch, forecasts, "forecast_ph")
+
+    assert len(out) == len(batch)
+    assert out["forecast_ph"].isna().all()
+
+
+def test_light_pipeline_null_conversion_keeps_only_forecast_locations():
+    # run_pipeline_light converts NaN to None for the upsert after the join
+    batch = _grid()
+    forecasts = _forecasts(batch, [5, 800, 1234])
+
+    out = join_forecasts(batch, forecasts, "forecast_ph")
+    out["forecast_ph"] = out["forecast_ph"].astype(object).where(out["forecast_ph"].notna(), None)
+
+    filled = out[out["forecast_ph"].map(lambda v: v is not None)]
+    assert len(filled) == 3
+    assert set(zip(filled["lat"], filled["lon"])) == set(zip(forecasts["lat"], forecasts["lon"]))
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml import model
+
+NUMPY_BACKENDS = ["naive", "seasonal_naive", "holt", "ar"]
+
+
+def _series(n_locations=4, days=90, seed=0):
+    """Weekly cycle + slow trend + noise, one row per location."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    base = 8.0 + 0.002 * t + 0.02 * np.sin(2 * np.pi * t / 7)
+    return base + rng.normal(0, 0.002, (n_locations, days)) + np.arange(n_locations)[:, None] * 0.01
+
+
+@pytest.mark.parametrize("backend", NUMPY_BACKENDS)
+@pytest.mark.parametrize("horizon", [1, 5])
+def test_shape_and_holdout_accuracy(backend, horizon):
+    matrix = _series()
+    train, test = matrix[:, :-horizon], matrix[:, -horizon:]
+
+    out = model.FORECASTERS[backend](train, horizon)
+
+    assert out.shape == (len(matrix), horizon)
+    assert np.isfinite(out).all()
+    # Within the weekly swing (0.04) of the truth
+    assert np.abs(out - test).max() < 0.05
+
+
+def test_exact_on_the_series_each_backend_models():
+    t = np.arange(60, dtype=float)
+    constant = np.full((2, 60), 8.1)
+    weekly = np.stack([np.sin(2 * np.pi * t / 7)] * 2)
+
+    np.testing.assert_allclose(model.naive_forecast(constant, 3), 8.1)
+    np.testing.assert_allclose(model.seasonal_naive_forecast(weekly[:, :-7], 7), weekly[:, -7:], atol=1e-9)
+    np.testing.assert_allclose(model.holt_forecast(constant, 3), 8.1)
+    np.testing.assert_allclose(model.ar_forecast(weekly[:, :-7], 7), weekly[:, -7:], atol=1e-2)
+
+
+def test_holt_follows_a_trend_and_skips_gaps():
+    line = np.tile(8.0 + 0.01 * np.arange(40), (1, 1))
+    gappy = line.copy()
+    gappy[0, 20:25] = np.nan
+
+    for m in (line, gappy):
+        out = model.holt_forecast(m, 3)
+        assert out[0, 0] == pytest.approx(8.4, abs=0.01)
+        assert np.all(np.diff(out[0]) > 0)
+
+
+def test_too_short_history_is_nan_for_ar():
+    out = model.ar_forecast(_series(days=10), 2, order=7)
+    assert out.shape == (4, 2) and np.isnan(out).all()
+    # seasonal_naive falls back to naive below one season
+    short = _series(days=5)
+    np.testing.assert_allclose(model.seasonal_naive_forecast(short, 2, season=7), short[:, [-1, -1]])
+
+
+def _long(days, locations=((-18.0, 147.0), (-17.0, 148.0)), start="2026-01-01"):
+    dates = pd.date_range(start, periods=days, freq="D")
+    return pd.DataFrame([
+        {"date": d, "lat": lat, "lon": lon, "ph": 8.0 + 0.001 * i}
+        for i, d in enumerate(dates) for lat, lon in locations
+    ])
+
+
+def test_location_matrix_keeps_only_the_newest_days():
+    history = _long(400)
+    matrix, locations = model.location_matrix(history, "ph", max_days=30)
+
+    assert matrix.shape == (2, 30)
+    assert matrix[0, -1] == pytest.approx(8.399)
+    assert list(zip(locations["lat"], locations["lon"])) == [(-18.0, 147.0), (-17.0, 148.0)]
+
+
+def test_location_matrix_fills_short_gaps_only():
+    history = _long(20)
+    history = history[~history["date"].between("2026-01-05", "2026-01-06")]
+    history = history[~history["date"].between("2026-01-10", "2026-01-14") | (history["lat"] != -18.0)]
+    matrix, _ = model.location_matrix(history, "ph", max_days=None)
+
+    assert matrix.shape == (2, 20)
+    assert not np.isnan(matrix[:, 4:6]).any()
+    # Five missing days: the first three are filled, the rest stay NaN
+    assert np.isnan(matrix[0, 9:14]).tolist() == [False, False, False, True, True]
+
+
+def test_forecast_locations_returns_one_row_per_location():
+    out = model.forecast_locations(_long(60), "ph", horizon=1, backend="naive")
+
+    assert list(out.columns) == ["lat", "lon", "forecast_ph"]
+    assert len(out) == 2
+    np.testing.assert_allclose(out["forecast_ph"], 8.059, atol=1e-5)
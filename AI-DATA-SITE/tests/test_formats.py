@@ -0,0 +1,95 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pytest
+from starlette.requests import Request
+
+from backend import formats
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+COLUMNS = ["date", "latitude", "longitude", "sst", "anomaly"]
+# As SQLite hands them back to text() queries: dates as text, booleans as 0/1
+ROWS = [("2026-01-01", -17.5, 147.5, 25.0, 1), ("2026-01-02", -17.0, 148.0, None, None)]
+
+
+def _request(accept=None, query=b""):
+    headers = [(b"accept", accept.encode())] if accept is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query, "headers": headers})
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, formats.JSON),
+    ("*/*", formats.JSON),
+    ("application/vnd.apache.arrow.stream", formats.ARROW),
+    ("application/x-parquet", formats.PARQUET),
+    ("application/json;q=0.5, application/vnd.apache.parquet", formats.PARQUET),
+    ("application/vnd.apache.arrow.stream;q=0.9, application/json", formats.JSON),
+    # Equal q: the first listed wins; q=0 means "not this one"
+    ("application/vnd.apache.parquet, application/vnd.apache.arrow.stream", formats.PARQUET),
+    ("application/vnd.apache.arrow.stream;q=0", formats.JSON),
+    ("application/vnd.apache.arrow.stream;q=oops", formats.JSON),
+])
+def test_accept_negotiation(accept, expected):
+    assert formats.negotiate(_request(accept)) == expected
+
+
+def test_format_parameter_overrides_accept():
+    request = _request("application/vnd.apache.parquet", query=b"format=arrow")
+    assert formats.negotiate(request) == formats.ARROW
+    # An unknown ?format= falls back to Accept
+    assert formats.negotiate(_request("application/vnd.apache.parquet", query=b"format=xml")) == formats.PARQUET
+
+
+def _expected_table():
+    return pa.table({
+        "date": pa.array([date(2026, 1, 1), date(2026, 1, 2)], pa.date32()),
+        "latitude": [-17.5, -17.0],
+        "longitude": [147.5, 148.0],
+        "sst": pa.array([25.0, None], pa.float64()),
+        "anomaly": pa.array([True, None], pa.bool_()),
+    })
+
+
+@pytest.mark.parametrize("fmt", [formats.ARROW, formats.PARQUET])
+def test_rows_round_trip_with_fixed_types(fmt):
+    body = formats.encode(formats.table_from_rows(COLUMNS, ROWS), fmt)
+
+    if fmt == formats.ARROW:
+        table = pa.ipc.open_stream(body).read_all()
+    else:
+        table = pq.read_table(io.BytesIO(body))
+    assert table.equals(_expected_table())
+
+
+def test_empty_rows_keep_the_schema():
+    table = formats.table_from_rows(COLUMNS, [])
+
+    assert table.num_rows == 0
+    assert table.schema == formats.schema(COLUMNS)
+
+
+@pytest.mark.parametrize("fmt", [formats.ARROW, formats.PARQUET])
+def test_chunk_writer_streams_one_batch_per_write(fmt):
+    writer = formats.ChunkWriter(COLUMNS, fmt)
+    body = writer.write(ROWS[:1]) + writer.write(ROWS[1:]) + writer.close()
+
+    if fmt == formats.ARROW:
+        batches = list(pa.ipc.open_stream(body))
+        assert [b.num_rows for b in batches] == [1, 1]
+        table = pa.Table.from_batches(batches)
+    else:
+        parquet = pq.ParquetFile(io.BytesIO(body))
+        assert parquet.metadata.num_row_groups == 2
+        table = parquet.read()
+    assert table.equals(_expected_table())
+
+
+def test_frame_columns_are_coerced_to_their_types():
+    df = pd.DataFrame({"date": [date(2026, 1, 1)], "n": [3.0], "sst": [25]})
+
+    table = formats.table_from_frame(df)
+
+    assert table.schema == formats.schema(["date", "n", "sst"])
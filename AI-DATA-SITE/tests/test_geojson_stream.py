@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from pipeline.geojson_stream import GeoJSONStreamError, iter_feature_batches, iter_features
+
+FEATURES = [
+    {"type": "Feature", "id": "reef.1", "properties": {"name": "Récif d'Opunohu 珊瑚 🐠"},
+     "geometry": {"type": "Point", "coordinates": [149.8, -17.5]}},
+    {"type": "Feature", "id": "reef.2", "properties": {"note": "braces } { and \"quotes\\\" in text"},
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}},
+    {"type": "Feature", "id": "reef.3", "properties": {}, "geometry": None},
+]
+
+
+def _body(features=FEATURES):
+    return json.dumps({"type": "FeatureCollection", "features": features}, ensure_ascii=False).encode()
+
+
+def _chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+def test_features_split_across_chunks(size):
+    # size 1-3 also splits every multibyte UTF-8 character across chunks
+    assert list(iter_features(_chunked(_body(), size))) == FEATURES
+
+
+def test_multibyte_character_split_at_chunk_boundary():
+    body = _body()
+    cut = body.index("珊".encode()) + 1
+    assert list(iter_features([body[:cut], body[cut:]])) == FEATURES
+
+
+@pytest.mark.parametrize("body", [b'{"type": "FeatureCollection", "features": []}',
+                                  b'{"type":"FeatureCollection","features" : [ \n ],"totalFeatures":0}'])
+def test_empty_features_array(body):
+    assert list(iter_features(_chunked(body, 5))) == []
+    assert list(iter_feature_batches(iter_features([body]))) == []
+
+
+def test_no_features_key_yields_nothing():
+    assert list(iter_features([b'{"type": "FeatureCollection"}'])) == []
+
+
+def test_truncated_stream_raises():
+    body = _body()
+    with pytest.raises(GeoJSONStreamError):
+        list(iter_features(_chunked(body[:len(body) // 2], 16)))
+    with pytest.raises(GeoJSONStreamError):
+        list(iter_features([body[:-2]]))
+
+
+def test_large_feature_in_small_chunks_is_parsed_once():
+    big = {"type": "Feature", "id": "big", "properties": {},
+           "geometry": {"type": "LineString", "coordinates": [[i * 0.001, -i * 0.001] for i in range(20000)]}}
+    features = list(iter_features(_chunked(_body([big] + FEATURES), 64)))
+
+    assert features[0] == big
+    assert features[1:] == FEATURES
+    (batch,) = iter_feature_batches(features)
+    assert list(batch["fid"]) == ["big", "reef.1", "reef.2", "reef.3"]
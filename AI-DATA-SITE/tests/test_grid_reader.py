@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from pipeline.grid_reader import bbox_region, read_window, region_windows
+
+
+def _grid(res=1.0):
+    lat = np.arange(-89.5, 90.0, res)
+    lon = np.arange(-179.5, 180.0, res)
+    sst = np.full((lat.size, lon.size), 25.0)
+    return xr.Dataset({"sst": (("lat", "lon"), sst)}, coords={"lat": lat, "lon": lon})
+
+
+def _cells(ds, bboxes, reef_mask=None, shape=(7, 7)):
+    frames = [
+        read_window(ds, {"sst": "sst"}, lat_sl, lon_sl, roi)
+        for lat_sl, lon_sl, roi in region_windows(ds, shape, bboxes, reef_mask)
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _expected(ds, bboxes):
+    lat, lon = np.meshgrid(ds["lat"].values, ds["lon"].values, indexing="ij")
+    inside = np.zeros(lat.shape, dtype=bool)
+    for minx, miny, maxx, maxy in bboxes:
+        in_lon = (lon >= minx) & (lon <= maxx) if minx <= maxx else (lon >= minx) | (lon <= maxx)
+        inside |= in_lon & (lat >= miny) & (lat <= maxy)
+    return set(zip(lat[inside], lon[inside]))
+
+
+def test_overlapping_bboxes_yield_each_cell_once():
+    ds = _grid()
+    bboxes = [[140.0, -25.0, 155.0, -10.0], [150.0, -20.0, 160.0, -5.0], [145.0, -15.0, 150.0, -12.0]]
+
+    df = _cells(ds, bboxes)
+
+    assert not df.duplicated(subset=["lat", "lon"]).any()
+    assert set(zip(df["lat"], df["lon"])) == _expected(ds, bboxes)
+
+
+def test_antimeridian_bbox_covers_both_sides():
+    ds = _grid()
+    bbox = [175.0, -5.0, -175.0, 5.0]
+
+    df = _cells(ds, [bbox])
+
+    assert set(zip(df["lat"], df["lon"])) == _expected(ds, [bbox])
+    assert (df["lon"] > 0).any() and (df["lon"] < 0).any()
+
+
+def test_bboxes_with_reef_mask():
+    ds = _grid()
+    mask = xr.DataArray(np.zeros((ds.sizes["lat"], ds.sizes["lon"]), dtype=bool),
+                        coords={"lat": ds["lat"], "lon": ds["lon"]}, dims=("lat", "lon"))
+    mask.loc[dict(lat=slice(-20, -10), lon=slice(145, 155))] = True
+    bboxes = [[140.0, -25.0, 150.0, -10.0], [148.0, -18.0, 160.0, -5.0]]
+
+    df = _cells(ds, bboxes, reef_mask=mask)
+
+    on_mask = {(la, lo) for la, lo in _expected(ds, bboxes) if -20 <= la <= -10 and 145 <= lo <= 155}
+    assert not df.duplicated(subset=["lat", "lon"]).any()
+    assert set(zip(df["lat"], df["lon"])) == on_mask
+
+
+def test_bbox_region_rejects_unsplit_antimeridian_bbox():
+    with pytest.raises(ValueError, match="antimeridian"):
+        bbox_region(_grid(), [175.0, -5.0, -175.0, 5.0])
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import http_client
+
+
+class FakeSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return FakeResponse()
+
+
+class FakeResponse:
+    status_code = 200
+
+    def close(self):
+        pass
+
+
+def test_threads_and_tasks_share_one_limit_per_host(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    monkeypatch.setattr(http_client, "MAX_PER_HOST", 3)
+    monkeypatch.setattr(http_client, "_host_locks", {})
+    url = "https://example.test/data"
+
+    async def tasks():
+        await asyncio.gather(*(http_client.aget(url) for _ in range(12)))
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        threaded = [pool.submit(http_client.get, url) for _ in range(12)]
+        asyncio.run(tasks())
+        for f in threaded:
+            assert f.result() is not None
+
+    assert session.peak == 3
+
+
+class StreamingSession:
+    """Counts responses whose body is still open, from get() until close()."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.peak = 0
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+        return StreamingResponse(self)
+
+
+class StreamingResponse:
+    status_code = 200
+
+    def __init__(self, session):
+        self.session = session
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for _ in range(3):
+            time.sleep(0.01)
+            yield b"x"
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            with self.session.lock:
+                self.session.open -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _consume(r):
+    with r:
+        return b"".join(r.iter_content())
+
+
+def test_streamed_body_holds_the_host_slot_until_closed(monkeypatch):
+    session = StreamingSession()
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    monkeypatch.setattr(http_client, "MAX_PER_HOST", 2)
+    monkeypatch.setattr(http_client, "_host_locks", {})
+    url = "https://example.test/data"
+
+    async def task():
+        r = await http_client.aget(url, stream=True)
+        return await asyncio.to_thread(_consume, r)
+
+    async def tasks():
+        return await asyncio.gather(*(task() for _ in range(8)))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        threaded = [pool.submit(lambda: _consume(http_client.get(url, stream=True))) for _ in range(8)]
+        bodies = asyncio.run(tasks())
+        bodies += [f.result() for f in threaded]
+
+    assert bodies == [b"xxx"] * 16
+    assert session.peak == 2
+    # Every slot came back: closing twice does not release twice
+    r = http_client.get(url, stream=True)
+    r.close()
+    r.close()
+    assert http_client._host_semaphore(url)._value == 2
@@ -0,0 +1,64 @@
+from sqlalchemy import create_engine, text
+
+from backend import migrations
+from backend.models import Base
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def test_migrate_applies_pending_once(tmp_path):
+    engine = _engine(tmp_path)
+
+    first = migrations.migrate(engine, verbose=False)
+    second = migrations.migrate(engine, verbose=False)
+
+    assert first
+    assert second == []
+    assert all(applied for _, applied, _, _ in migrations.status(engine))
+
+
+def _with_rebuild(monkeypatch):
+    """0002's manual rule on a step that runs on SQLite too."""
+    partitioning = next(m for m in migrations.MIGRATIONS if m["version"] == "0002_partition_by_month")
+    assert partitioning["manual"] is migrations.ocean_metrics_has_rows
+    rebuild = dict(partitioning, version="9999_rebuild", sql={"*": ["CREATE TABLE rebuild_ran (id INTEGER)"]})
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [rebuild])
+
+
+def test_partitioning_runs_at_once_on_an_empty_table(tmp_path, monkeypatch):
+    _with_rebuild(monkeypatch)
+    engine = _engine(tmp_path)
+
+    assert "9999_rebuild" in migrations.migrate(engine, verbose=False)
+
+
+def test_partitioning_a_populated_table_is_manual(tmp_path, monkeypatch):
+    _with_rebuild(monkeypatch)
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO ocean_metrics (date, latitude, longitude) VALUES ('2026-01-01', 0, 0)"))
+
+    assert "9999_rebuild" not in migrations.migrate(engine, verbose=False)
+    assert ("9999_rebuild", False, True) == migrations.status(engine)[-1][:3]
+    assert migrations.migrate(engine, verbose=False, include_manual=True) == ["9999_rebuild"]
+
+
+def test_manual_migrations_only_run_when_included(tmp_path, monkeypatch):
+    engine = _engine(tmp_path)
+    manual = {
+        "version": "9999_manual",
+        "description": "test",
+        "manual": True,
+        "sql": {"*": ["CREATE TABLE manual_ran (id INTEGER)"]},
+    }
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [manual])
+
+    applied = migrations.migrate(engine, verbose=False)
+    assert "9999_manual" not in applied
+    assert ("9999_manual", False, True, "test") in migrations.status(engine)
+
+    assert migrations.migrate(engine, verbose=False, include_manual=True) == ["9999_manual"]
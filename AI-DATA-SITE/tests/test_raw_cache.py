@@ -0,0 +1,103 @@
+import importlib
+import os
+import time
+
+import pytest
+
+from pipeline import raw_cache
+
+URL = "https://noaa.example/sst_20260101.nc"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Fake download_file: serves ``state["body"]`` or a 304 when the validators match."""
+    monkeypatch.setattr(raw_cache, "CACHE_DIR", str(tmp_path / "raw"))
+    state = {"body": b"v1", "etag": '"v1"', "calls": []}
+
+    def download_file(url, path, headers=None, meta=None, **kwargs):
+        state["calls"].append(dict(headers or {}))
+        if headers and headers.get("If-None-Match") == state["etag"]:
+            meta["not_modified"] = True
+            return True
+        with open(path, "wb") as f:
+            f.write(state["body"])
+        meta.update(etag=state["etag"], last_modified="Thu, 01 Jan 2026 00:00:00 GMT")
+        return True
+
+    monkeypatch.setattr(raw_cache, "download_file", download_file)
+    return state
+
+
+def _age(key, seconds, field):
+    manifest = raw_cache._load_manifest()
+    manifest[key][field] = time.time() - seconds
+    raw_cache._save_manifest(manifest)
+
+
+def test_relative_dir_is_taken_from_the_project_root(monkeypatch):
+    # .env.example's RAW_CACHE_DIR=./cache/raw is the built-in default
+    monkeypatch.setenv("RAW_CACHE_DIR", "./cache/raw")
+    monkeypatch.chdir("/")
+    try:
+        importlib.reload(raw_cache)
+        assert os.path.normpath(raw_cache.CACHE_DIR) == os.path.join(raw_cache.BASE_DIR, "cache", "raw")
+    finally:
+        monkeypatch.undo()
+        importlib.reload(raw_cache)
+
+
+def test_fresh_entry_is_served_without_a_request(server):
+    path = raw_cache.fetch(URL)
+    assert raw_cache.fetch(URL) == path
+    assert len(server["calls"]) == 1
+
+
+def test_stale_entry_is_revalidated_with_its_validators(server):
+    path = raw_cache.fetch(URL)
+    _age(URL, 2 * raw_cache.REVALIDATE_SECONDS, "validated_at")
+
+    assert raw_cache.fetch(URL) == path
+    assert server["calls"][-1] == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Thu, 01 Jan 2026 00:00:00 GMT",
+    }
+    # The 304 renews the entry: the next call stays offline
+    assert time.time() - raw_cache._load_manifest()[URL]["validated_at"] < 60
+    raw_cache.fetch(URL)
+    assert len(server["calls"]) == 2
+
+
+def test_changed_file_replaces_the_entry(server):
+    old = raw_cache.fetch(URL)
+    server.update(body=b"v2", etag='"v2"')
+
+    new = raw_cache.fetch(URL, revalidate_seconds=0)
+
+    assert new != old
+    assert open(new, "rb").read() == b"v2"
+
+
+def test_unused_entries_are_evicted_by_age(server):
+    raw_cache.fetch(URL)
+    raw_cache.fetch(URL + "?b")
+    _age(URL, 2 * raw_cache.CACHE_MAX_AGE_DAYS * 86400, "last_access")
+
+    raw_cache.evict()
+
+    assert raw_cache.lookup(URL) is None
+    assert raw_cache.lookup(URL + "?b") is not None
+
+
+def test_least_recently_used_entries_go_first_when_over_size(server):
+    for i in range(3):
+        server["body"] = f"body {i}".encode()
+        raw_cache.fetch(f"{URL}?{i}")
+        _age(f"{URL}?{i}", 100 - i, "last_access")
+    raw_cache.fetch(f"{URL}?0")   # touch: now the most recently used
+
+    freed = raw_cache.evict(max_bytes=2 * len(b"body 0"))
+
+    assert freed == len(b"body 1")
+    assert raw_cache.lookup(f"{URL}?1") is None
+    assert raw_cache.lookup(f"{URL}?0") and raw_cache.lookup(f"{URL}?2")
+    assert raw_cache.stats()["entries"] == 2
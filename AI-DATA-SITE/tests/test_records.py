@@ -0,0 +1,105 @@
+import asyncio
+import base64
+import io
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend import migrations, records
+from backend.bulk import upsert_ocean_metrics
+from backend.models import Base
+from backend.timeseries import TimeseriesQueryError
+
+CUTOFF = date(2026, 1, 1)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "ocean.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine, verbose=False)
+    # Five rows share each date: pages must break inside a date
+    for day in (date(2026, 1, 1), date(2026, 1, 2)):
+        upsert_ocean_metrics(pd.DataFrame({
+            "date": day, "lat": np.arange(5.0), "lon": 147.0, "sst": 25.0, "dhw": 1.0,
+            "ph": 8.0, "health_score": 70.0, "anomaly": [True, False, False, False, True],
+            "forecast_ph": np.nan,
+        }), engine=engine, label="test")
+    return path
+
+
+def _all_pages(conn, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = records.page_rows(conn, CUTOFF, cursor=cursor, limit=limit)
+        pages.append([r.id for r in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    cursor = records.encode_cursor(date(2026, 1, 2), 42)
+    assert records.decode_cursor(cursor) == (date(2026, 1, 2), 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"2026-01-02").decode(),           # no id
+    base64.urlsafe_b64encode(b"2026-13-40|1").decode(),         # no such date
+    base64.urlsafe_b64encode(b"2026-01-02|x").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),           # not UTF-8
+])
+def test_malformed_cursor_is_a_query_error(cursor):
+    with pytest.raises(TimeseriesQueryError):
+        records.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 10])
+def test_pages_split_equal_dates_without_gaps_or_repeats(db_path, limit):
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.connect() as conn:
+        pages = _all_pages(conn, limit)
+        everything, last = records.page_rows(conn, CUTOFF, limit=100)
+
+    ids = [i for page in pages for i in page]
+    assert ids == [r.id for r in everything]
+    assert len(ids) == 10 and last is None
+    assert all(len(p) == limit for p in pages[:-1])
+
+
+def _export(db_path, fmt):
+    async def collect():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+        try:
+            return [c async for c in records.stream(engine, CUTOFF, fmt=fmt, chunk_rows=4)]
+        finally:
+            await engine.dispose()
+    return b"".join(asyncio.run(collect()))
+
+
+def test_ndjson_export(db_path):
+    lines = _export(db_path, "ndjson").decode().splitlines()
+    assert len(lines) == 10
+    assert set(json.loads(lines[0])) == set(records.COLUMNS)
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_columnar_export_round_trips(db_path, fmt):
+    pytest.importorskip("pyarrow")
+    body = _export(db_path, fmt)
+
+    if fmt == "arrow":
+        import pyarrow as pa
+        df = pa.ipc.open_stream(body).read_pandas()
+    else:
+        df = pd.read_parquet(io.BytesIO(body))
+    assert list(df.columns) == records.COLUMNS
+    assert len(df) == 10
+    assert df["anomaly"].tolist() == [True, False, False, False, True] * 2
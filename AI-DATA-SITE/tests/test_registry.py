@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from ml import model, registry
+
+
+class FakeLSTM:
+    """Keras-like stand-in: records weight loads and training steps."""
+
+    def __init__(self, input_shape=(30, 1)):
+        self.loaded = None
+        self.batches = 0
+
+    def load_weights(self, path):
+        with open(path) as f:
+            self.loaded = f.read()
+
+    def save_weights(self, path):
+        with open(path, "w") as f:
+            f.write(path)
+
+    def train_on_batch(self, X, y):
+        self.batches += 1
+
+    def predict(self, X, batch_size=None, verbose=0):
+        return X[:, -1, :1]
+
+
+@pytest.fixture(autouse=True)
+def fake_lstm(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "REGISTRY_DIR", str(tmp_path / "forecast"))
+    built = []
+    monkeypatch.setattr(model, "build_lstm", lambda input_shape: built.append(FakeLSTM(input_shape)) or built[-1])
+    return built
+
+
+def _matrix(days=60, offset=0.0):
+    t = np.arange(days, dtype="float32")
+    return np.stack([8.0 + offset + 0.01 * np.sin(t + i) for i in range(5)]).astype("float32")
+
+
+def test_warm_start_from_latest_version(fake_lstm, monkeypatch):
+    key = registry.model_key("ph", "global", 30)
+    model.lstm_forecast(_matrix(), horizon=1, epochs=3)
+    first = registry.latest(key)
+    assert (first["version"], first["mode"], first["parent"]) == (1, "full", None)
+
+    # Stale: warm-started from v1 and fine-tuned, keeping v1's scaling
+    monkeypatch.setattr(model, "FORECAST_MODEL_MAX_AGE_HOURS", 0)
+    out = model.lstm_forecast(_matrix(offset=0.5), horizon=2, epochs=3)
+    second = registry.latest(key)
+    assert fake_lstm[-1].loaded == registry._weights_path(key, 1)
+    assert (second["version"], second["mode"], second["parent"]) == (2, "finetune", 1)
+    assert (second["mean"], second["std"]) == (first["mean"], first["std"])
+    assert second["epochs"] == model.FORECAST_FINETUNE_EPOCHS
+    assert out.shape == (5, 2) and not np.isnan(out).any()
+
+    # Fresh: inference only, nothing saved
+    monkeypatch.setattr(model, "FORECAST_MODEL_MAX_AGE_HOURS", 24)
+    model.lstm_forecast(_matrix(), horizon=1)
+    assert fake_lstm[-1].loaded == registry._weights_path(key, 2)
+    assert fake_lstm[-1].batches == 0
+    assert registry.versions(key) == [1, 2]
+
+
+def test_old_versions_are_pruned(monkeypatch):
+    monkeypatch.setattr(registry, "KEEP_VERSIONS", 3)
+    key = registry.model_key("ph", "reef/1", 14)
+    for i in range(6):
+        assert registry.save(key, FakeLSTM(), {"run": i}) == i + 1
+
+    assert registry.versions(key) == [4, 5, 6]
+    assert registry.load_meta(key, 3) is None
+    assert registry.latest(key)["run"] == 5
+    # Region names never escape the registry directory
+    assert key == os.path.join("ph", "reef_1", "w14")
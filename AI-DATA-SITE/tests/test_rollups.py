@@ -0,0 +1,119 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend import bulk, migrations, rollups
+from backend.models import Base
+
+DAY1, DAY2 = date(2026, 1, 1), date(2026, 1, 2)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine, verbose=False)
+    return engine
+
+
+def _frame(day, sst, lat=(-17.5, 12.0), lon=(147.5, -60.0)):
+    return pd.DataFrame({
+        "date": day, "lat": list(lat), "lon": list(lon), "sst": sst,
+        "dhw": 0.5, "ph": 8.0, "health_score": 70.0, "anomaly": [True, False],
+    })
+
+
+def _rollup(conn):
+    rows = conn.execute(text(
+        f"SELECT date, lat_band, lon_band, row_count, anomaly_count, sst_n, sst_sum, sst_min, sst_max "
+        f"FROM {rollups.TABLE} ORDER BY date, lat_band, lon_band"
+    ))
+    return [tuple(r) for r in rows]
+
+
+def _rebuilt(conn):
+    """The rollup a full refresh would produce, without keeping it."""
+    with conn.begin_nested() as savepoint:
+        rollups.refresh(conn)
+        rows = _rollup(conn)
+        savepoint.rollback()
+    return rows
+
+
+def test_write_refreshes_only_the_dates_it_touched(engine, monkeypatch):
+    bulk.upsert_ocean_metrics(_frame(DAY1, 25.0), engine=engine, label="test")
+
+    seen = []
+    refresh = rollups.refresh
+
+    def spy(conn, dates=None):
+        # Same transaction as the rows: they are visible, nothing committed yet
+        assert conn.in_transaction()
+        seen.append((set(dates), conn.execute(text("SELECT COUNT(*) FROM ocean_metrics")).scalar()))
+        refresh(conn, dates)
+
+    monkeypatch.setattr(rollups, "refresh", spy)
+    bulk.upsert_ocean_metrics(_frame(DAY2, 26.0), engine=engine, label="test")
+
+    assert seen == [({DAY2}, 4)]
+    with engine.connect() as conn:
+        assert [str(r[0]) for r in _rollup(conn)] == [str(DAY1)] * 2 + [str(DAY2)] * 2
+
+
+def test_rewriting_a_date_recomputes_instead_of_adding(engine):
+    bulk.upsert_ocean_metrics(_frame(DAY1, 25.0), engine=engine, label="test")
+    bulk.upsert_ocean_metrics(_frame(DAY2, 25.0), engine=engine, label="test")
+    bulk.upsert_ocean_metrics(_frame(DAY1, 30.0), engine=engine, label="test")
+
+    with engine.connect() as conn:
+        rows = _rollup(conn)
+        assert rows == _rebuilt(conn)
+        day1 = rollups.summary(conn, DAY1, DAY1)
+    assert day1["row_count"] == 2
+    assert day1["anomaly_count"] == 1
+    assert day1["sst"]["mean"] == pytest.approx(30.0)
+
+
+def test_bands_floor_negative_coordinates(engine):
+    bulk.upsert_ocean_metrics(_frame(DAY1, 25.0), engine=engine, label="test")
+
+    with engine.connect() as conn:
+        bands = [(r[1], r[2]) for r in _rollup(conn)]
+    for (lat_band, lon_band), lat, lon in zip(sorted(bands), (-17.5, 12.0), (147.5, -60.0)):
+        min_lon, min_lat, max_lon, max_lat = rollups.region_bounds(lat_band, lon_band)
+        assert min_lat <= lat < max_lat
+        assert min_lon <= lon < max_lon
+
+
+def test_backfill_migration_rolls_up_existing_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # Rows written before rollups existed
+        conn.execute(text(
+            "INSERT INTO ocean_metrics (date, latitude, longitude, sst, anomaly) VALUES "
+            "('2026-01-01', -17.5, 147.5, 25.0, 1), ('2026-01-01', -17.4, 147.6, 27.0, 0), "
+            "('2026-01-02', 12.0, -60.0, 28.0, 0)"
+        ))
+
+    assert "0003_daily_rollups" in migrations.migrate(engine, verbose=False)
+
+    with engine.connect() as conn:
+        assert len(_rollup(conn)) == 2
+        total = rollups.summary(conn)
+    assert total["row_count"] == 3
+    assert total["sst"]["max"] == 28.0
+
+
+def test_band_rebuild_migration_replaces_stale_rows(engine):
+    bulk.upsert_ocean_metrics(_frame(DAY1, 25.0), engine=engine, label="test")
+    rebuild = next(m for m in migrations.MIGRATIONS if m["version"] == "0005_rebuild_rollup_bands")
+
+    with engine.begin() as conn:
+        expected = _rollup(conn)
+        # Bands as Postgres' rounding CAST left them: one off
+        conn.execute(text(f"UPDATE {rollups.TABLE} SET lat_band = lat_band + 1"))
+        migrations._run(conn, migrations._statements(rebuild, "postgresql"))
+        assert _rollup(conn) == expected
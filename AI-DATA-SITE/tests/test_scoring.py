@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.model import health_score
+from ml.scoring import health_scores
+
+
+def _frame(seed, n=500, baseline=False):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "sst": rng.uniform(-2.0, 40.0, n),
+        "ph": rng.uniform(7.6, 8.3, n),
+        "dhw": rng.uniform(0.0, 20.0, n),
+    })
+    if baseline:
+        df["reef_health_baseline"] = rng.uniform(40.0, 100.0, n)
+    # NaNs in every input
+    for col in df.columns:
+        df.loc[rng.choice(n, 25, replace=False), col] = np.nan
+    # Boundaries: score exactly 0, just above / below it, zero inputs
+    edges = pd.DataFrame({
+        "sst": [40.0, 40.0, 40.0, 0.0, 0.0, 53.3333333333],
+        "ph": [8.1, 8.1, np.nan, 8.1, 8.1, 8.1],
+        "dhw": [4.0, 3.9999999, 4.0000001, 0.0, 16.0, 0.0],
+    })
+    if baseline:
+        edges["reef_health_baseline"] = 80.0
+    return pd.concat([df, edges], ignore_index=True)
+
+
+@pytest.mark.parametrize("baseline", [False, True])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_vectorized_matches_row_wise(seed, baseline):
+    df = _frame(seed, baseline=baseline)
+
+    expected = np.array([health_score(row) for row in df.to_dict(orient="records")], dtype=float)
+    got = health_scores(df).to_numpy()
+
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-12, equal_nan=True)
+
+
+def test_missing_columns_use_defaults():
+    df = pd.DataFrame({"sst": [10.0, np.nan, 60.0]})
+
+    expected = [health_score(row) for row in df.to_dict(orient="records")]
+
+    np.testing.assert_allclose(health_scores(df).to_numpy(), expected, equal_nan=True)
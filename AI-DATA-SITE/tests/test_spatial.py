@@ -0,0 +1,114 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from backend import migrations, spatial
+from backend.bulk import upsert_ocean_metrics
+from backend.models import Base
+from backend.timeseries import TimeseriesQueryError
+
+TODAY = date.today()
+CUTOFF = TODAY - timedelta(days=5)
+
+
+def _engine(tmp_path, lat, lon, days=2):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocean.db'}")
+    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine, verbose=False)
+    for d in range(days):
+        upsert_ocean_metrics(pd.DataFrame({
+            "date": TODAY - timedelta(days=d), "lat": lat, "lon": lon,
+            "sst": 25.0 + d, "dhw": 1.0, "ph": 8.0, "health_score": 70.0, "anomaly": False, "forecast_ph": np.nan,
+        }), engine=engine, label="test")
+    return engine
+
+
+def _brute_force(lat, lon, points, k):
+    d = spatial.haversine_km(points[:, 0], points[:, 1], lat, lon)
+    return np.sort(d)[:k]
+
+
+@pytest.fixture
+def scattered(tmp_path):
+    rng = np.random.default_rng(7)
+    points = np.column_stack([rng.uniform(-60, 60, 3000), rng.uniform(-180, 180, 3000)]).round(4)
+    return _engine(tmp_path, points[:, 0], points[:, 1]), points
+
+
+@pytest.mark.parametrize("lat, lon, k", [(0.0, 0.0, 1), (-18.3, 147.7, 25), (10.0, 179.9, 8), (85.0, -30.0, 3)])
+def test_nearest_matches_brute_force(scattered, lat, lon, k):
+    engine, points = scattered
+    with engine.connect() as conn:
+        got = spatial.nearest(conn, lat, lon, CUTOFF, k=k)
+
+    assert len(got) == k
+    np.testing.assert_allclose(got["distance_km"], _brute_force(lat, lon, points, k))
+    # Latest row of each location
+    assert (got["date"] == TODAY).all()
+    assert not got.duplicated(subset=["latitude", "longitude"]).any()
+
+
+def test_nearest_statements_are_bounded(scattered):
+    engine, _ = scattered
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    with engine.connect() as conn:
+        spatial.nearest(conn, 1.0, 2.0, CUTOFF, k=5)
+
+    reads = [s for s in statements if "ocean_metrics" in s and s.lstrip().startswith("SELECT")]
+    assert len(reads) <= spatial.NEAREST_MAX_STEPS + 1
+    assert all("LIMIT" in s for s in reads if "GROUP BY" in s)
+
+
+def test_nearest_stops_after_max_steps(tmp_path, monkeypatch):
+    engine = _engine(tmp_path, np.array([0.5, 40.5]), np.array([0.5, 100.5]), days=1)
+    monkeypatch.setattr(spatial, "NEAREST_MAX_STEPS", 3)
+    with engine.connect() as conn:
+        got = spatial.nearest(conn, 0.2, 0.2, CUTOFF, k=2)
+
+    # Only the location proven nearest within the searched rings
+    assert list(zip(got["latitude"], got["longitude"])) == [(0.5, 0.5)]
+
+
+def test_nearest_row_cap_keeps_results_exact(scattered, monkeypatch):
+    engine, points = scattered
+    monkeypatch.setattr(spatial, "MAX_ROWS", 40)
+    with engine.connect() as conn:
+        got = spatial.nearest(conn, 0.0, 0.0, CUTOFF, k=10)
+
+    assert 0 < len(got) <= 10
+    np.testing.assert_allclose(got["distance_km"], _brute_force(0.0, 0.0, points, 10)[:len(got)])
+
+
+def test_within_radius_rejects_more_than_max_rows(scattered, monkeypatch):
+    engine, _ = scattered
+    monkeypatch.setattr(spatial, "MAX_ROWS", 50)
+    with engine.connect() as conn, pytest.raises(TimeseriesQueryError):
+        spatial.within_radius(conn, 0.0, 0.0, 5000.0, CUTOFF)
+
+
+@pytest.mark.parametrize("lat, lon, d", [(0.0, 0.0, 0), (-18.3, 147.7, 3), (10.0, 179.9, 2), (-89.5, 0.0, 4)])
+def test_outside_km_is_a_lower_bound(lat, lon, d):
+    square = spatial.cell_square(lat, lon, d)
+    min_lon, min_lat, max_lon, max_lat = square
+    rng = np.random.default_rng(d)
+    plat, plon = rng.uniform(-90, 90, 20000), rng.uniform(-180, 180, 20000)
+    in_lon = (plon >= min_lon) & (plon <= max_lon) if min_lon <= max_lon else (plon >= min_lon) | (plon <= max_lon)
+    outside = ~((plat >= min_lat) & (plat <= max_lat) & in_lon)
+
+    assert spatial.haversine_km(plat[outside], plon[outside], lat, lon).min() >= spatial.outside_km(lat, lon, square)
+
+
+def test_unscored_anomaly_stays_null(tmp_path):
+    engine = _engine(tmp_path, [-17.0, -18.0], [147.0, 148.0], days=1)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE ocean_metrics SET anomaly = NULL WHERE latitude = -18.0"))
+        df = spatial.in_bbox(conn, (146.0, -19.0, 149.0, -16.0), CUTOFF, limit=10)
+
+    flags = df.set_index("latitude")["anomaly"]
+    assert str(flags.dtype) == "boolean"
+    assert not flags[-17.0]
+    assert pd.isna(flags[-18.0])
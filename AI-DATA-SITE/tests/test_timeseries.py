@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend import database, migrations, response_cache, timeseries
+from backend.bulk import upsert_ocean_metrics
+from backend.main import app
+from backend.models import Base
+from backend.timeseries import TimeseriesQueryError
+
+TODAY = date.today()
+RAW_KEYS = {"date", "latitude", "longitude", "sst", "ph", "health_score", "anomaly"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = tmp_path / "ocean.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    migrations.migrate(engine, verbose=False)
+    for d in range(3):
+        upsert_ocean_metrics(pd.DataFrame({
+            "date": TODAY - timedelta(days=d), "lat": [-18.0, -17.0], "lon": [147.0, 148.0],
+            "sst": [25.0 + d, 26.0 + d], "dhw": 1.0, "ph": 8.0, "health_score": 70.0,
+            "anomaly": False, "forecast_ph": np.nan,
+        }), engine=engine, label="test")
+
+    # A fresh loop per TestClient request: no pooled aiosqlite connections
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    monkeypatch.setattr(database, "_async_engine", async_engine)
+    monkeypatch.setattr(database, "_async_sessionmaker", async_sessionmaker(async_engine, expire_on_commit=False))
+    monkeypatch.setattr(response_cache, "_version", {"value": None, "checked": 0.0})
+    response_cache.cache.clear()
+    return TestClient(app)
+
+
+def test_timeseries_defaults_to_per_row_payload(client):
+    res = client.get("/data/timeseries", params={"days": 7})
+
+    assert res.status_code == 200
+    body = res.json()
+    assert len(body) == 6
+    assert all(set(r) == RAW_KEYS for r in body)
+    assert [r["date"] for r in body] == sorted(r["date"] for r in body)
+
+
+def test_timeseries_default_is_capped_by_max_points(client):
+    body = client.get("/data/timeseries", params={"days": 7, "max_points": 4}).json()
+
+    # The newest rows, still in date order
+    assert len(body) == 4
+    assert min(r["date"] for r in body) == str(TODAY - timedelta(days=1))
+
+
+def test_timeseries_aggregation_is_opt_in(client):
+    body = client.get("/data/timeseries", params={"days": 7, "resolution": "day"}).json()
+
+    assert len(body) == 3
+    assert "latitude" not in body[0]
+    assert body[-1]["sst"] == pytest.approx(25.5)
+
+
+def test_bbox_is_lon_first(client):
+    # Same order as NOAA_ROI_BBOX / ALLEN_WFS_BBOX: min_lon,min_lat,max_lon,max_lat
+    for path in ("/data/timeseries", "/data/spatial/bbox"):
+        body = client.get(path, params={"days": 7, "bbox": "147.5,-18.5,148.5,-16.5"}).json()
+        assert {(r["latitude"], r["longitude"]) for r in body} == {(-17.0, 148.0)}
+
+    items = client.get("/data/records", params={"days": 7, "bbox": "146.5,-18.5,147.5,-17.5"}).json()["items"]
+    assert {(r["latitude"], r["longitude"]) for r in items} == {(-18.0, 147.0)}
+
+
+def test_parse_bbox_rejects_inverted_latitudes():
+    with pytest.raises(TimeseriesQueryError):
+        timeseries.parse_bbox("140,-10,150,-20")
+    # Inverted longitudes cross the antimeridian instead
+    assert timeseries.parse_bbox("175,-5,-175,5") == (175.0, -5.0, -175.0, 5.0)
+
+
+def test_p90_without_percentile_aggregate_is_bounded(client, monkeypatch):
+    params = {"days": 7, "resolution": "day", "agg": "p90"}
+    assert len(client.get("/data/timeseries", params=params).json()) == 3
+
+    monkeypatch.setattr(timeseries, "P90_MAX_ROWS", 5)
+    response_cache.cache.clear()
+    res = client.get("/data/timeseries", params=params)
+    assert res.status_code == 400